@@ -1,20 +1,28 @@
 import logging
+from functools import partial
+from typing import Dict
+
 from utils import StoreRuntime, send_manifest, send_post_request
-from test_resources_utils import create_test_files
+from fixtures import FixtureRegistry
+from teardown import TeardownManager
+from trials import TrialResults, run_trials
 
 logger = logging.getLogger("test upload annotations parameter")
 
 
 def execute_submission_comparison(
     dataset_id: str, asset_view_id: str, file_path_manifest: str, num_time: int
-) -> None:
+) -> Dict[bool, TrialResults]:
     """for this use case, only interested in if file_annotations_upload_lst is set to True or False
 
     Args:
         dataset_id (str): dataset id on synapse
         asset_view_id (str): asset view id on synapse
         file_path_manifests (Path): path of test manifest for submission
-        num_time (int): number of times that submission function runs
+        num_time (int): maximum number of times that submission function runs, after one discarded warmup run.
+            Submissions stop early once the mean run time is known within +/- 5%.
+    Returns:
+        Dict[bool, TrialResults]: results of the trials for every value of file_annotations_upload
     """
     srt = StoreRuntime()
     token = srt.get_access_token()
@@ -31,36 +39,46 @@ def execute_submission_comparison(
         "data_model_labels": "class_label",
     }
 
+    results = {}
     for i in file_annotations_upload_lst:
-        submission_duration = []
-        params["file_annotations_upload"] = i
+        # copy the parameters, so that every option keeps its own value
+        option_params = {**params, "file_annotations_upload": i}
 
-        # try submitting x amount of time and calculate average
-        for count in range(num_time):
-            _, time_diff, all_status_code = send_post_request(
-                base_url, params, 1, send_manifest, file_path_manifest, headers
+        # try submitting up to x amount of time and estimate the mean with a confidence interval
+        results[i] = run_trials(
+            partial(
+                send_post_request,
+                base_url,
+                option_params,
+                1,
+                send_manifest,
+                file_path_manifest,
+                headers,
+            ),
+            trials=num_time,
+            target_relative_ci=0.05,
+        )
+        if results[i].failed_trials:
+            logger.error(
+                f"encountered an error when submitting the manifest in {results[i].failed_trials} runs"
             )
-            if all_status_code["200"] != 1:
-                print("encountered an error when submitting the manifest")
-            else:
-                submission_duration.append(time_diff)
-        average_submission_time = sum(submission_duration) / len(submission_duration)
         logger.info(
-            f"average time of submitting a manifest when upload_file_annotations set to {i} is: {average_submission_time}"
+            f"time of submitting a manifest when upload_file_annotations set to {i} (ms): {results[i].summary()}"
         )
+    return results
 
 
-test_folder_dir = (
-    "/Users/lpeng/Documents/schematic_profiler/schematic_profiler/test_files_folder"
-)
-dataset_id, project_id, asset_view_id = create_test_files(
-    num_file=10,
-    project_name="API test project random",
-    test_folder_path=test_folder_dir,
-)
-file_path_manifest = "/Users/lpeng/Downloads/test_bulkrna-seq.csv"
-
-# dataset_id = "syn57430952"
-# project_id = "syn57429449"
-# asset_view_id = "syn57429597"
-execute_submission_comparison(dataset_id, asset_view_id, file_path_manifest, 10)
+if __name__ == "__main__":
+    # delete what a fixture build leaves behind if it fails, registered fixtures are kept
+    with TeardownManager():
+        ids = FixtureRegistry().ensure(
+            {
+                "type": "files",
+                "project_name": "API test project random",
+                "num_files": 10,
+            }
+        )
+        file_path_manifest = "/Users/lpeng/Downloads/test_bulkrna-seq.csv"
+        execute_submission_comparison(
+            ids["dataset_id"], ids["view_id"], file_path_manifest, 10
+        )
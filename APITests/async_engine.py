@@ -0,0 +1,838 @@
+import asyncio
+import logging
+import socket
+import ssl
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+
+import certifi
+from requests.exceptions import InvalidSchema
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+from latency_stats import (
+    CONNECTION_ERROR,
+    NS_PER_S,
+    TIMEOUT,
+    TLS_ERROR,
+    ConcurrencyTracker,
+    LatencyHistogram,
+    RunStats,
+    is_success,
+)
+from utils import (
+    CONNECTION_MODES,
+    DEFAULT_TIMEOUT_S,
+    STREAM_CHUNK_SIZE,
+    WARM_POOLED,
+    load_manifest_payload,
+    return_time_now,
+)
+
+logger = logging.getLogger("async-engine")
+
+USER_AGENT = "schematic-profiler"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# statuses that never have a response body
+NO_BODY_STATUSES = (204, 304)
+
+
+class ProtocolError(ConnectionError):
+    """the server sent a response that is not valid HTTP, for example a truncated status line"""
+
+
+def _parse_int(value: Union[str, bytes], what: str, base: int = 10) -> int:
+    # numbers of the response head, a malformed one fails the request like a broken connection
+    try:
+        return int(value, base)
+    except ValueError:
+        raise ProtocolError(f"malformed {what}: {value!r}") from None
+
+
+@dataclass
+class AsyncResponse:
+    """
+    Response of a request sent by AsyncHTTPClient
+
+    Attributes:
+        status_code (int): status code of the response
+        headers (Dict[str, str]): response headers, with lower case names
+        content (bytes): response body as received, compressed if the server compressed it. Empty if the response was streamed.
+        size (int): number of bytes of the response body
+        timings (Dict[str, int]): duration of every phase of the request in nanoseconds: "dns", "connect" and "tls"
+            when a new connection was opened, "ttfb" (from sending the request to receiving the response headers) and "body" (downloading the body)
+    """
+
+    status_code: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    content: bytes = b""
+    size: int = 0
+    timings: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class _Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    reused: bool = False
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def _encode_params(params: Optional[dict]) -> str:
+    """
+    Encode query parameters the same way requests does: parameters set to None are dropped
+    Args:
+        params (dict): query parameters
+    Returns:
+        str: url encoded query string
+    """
+    if not params:
+        return ""
+    return urlencode(
+        {key: value for key, value in params.items() if value is not None},
+        doseq=True,
+    )
+
+
+class AsyncHTTPClient:
+    """
+    Minimal HTTP/1.1 client running on asyncio. Every request only costs a coroutine instead of a thread,
+    so a single process can keep thousands of requests in flight.
+    """
+
+    def __init__(self, connection_mode: str = WARM_POOLED, pool_size: int = 1):
+        """
+        Args:
+            connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+            pool_size (int): maximum number of idle connections kept per host. Defaults to 1.
+        """
+        if connection_mode not in CONNECTION_MODES:
+            raise ValueError(
+                f"Unknown connection mode {connection_mode}. Please use one of {CONNECTION_MODES}"
+            )
+        self.connection_mode = connection_mode
+        self.pool_size = pool_size
+        self._idle: Dict[Tuple[str, str, int], List[_Connection]] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.connection_mode == WARM_POOLED
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+        return self._ssl_context
+
+    async def _get_connection(
+        self, scheme: str, host: str, port: int, timings: Dict[str, int]
+    ) -> _Connection:
+        """
+        Get an idle connection from the pool, or open a new one
+        Args:
+            scheme (str): http or https
+            host (str): host name
+            port (int): port
+            timings (Dict[str, int]): if a new connection is opened, the time spent on DNS resolution, TCP connect and TLS handshake is added to it
+        Returns:
+            _Connection: the connection
+        """
+        idle = self._idle.get((scheme, host, port))
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                connection.reused = True
+                return connection
+            connection.close()
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter_ns()
+        addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        timings["dns"] = time.perf_counter_ns() - start
+
+        start = time.perf_counter_ns()
+        sock = await self._connect_socket(loop, addresses)
+        timings["connect"] = time.perf_counter_ns() - start
+
+        ssl_context = self._get_ssl_context() if scheme == "https" else None
+        start = time.perf_counter_ns()
+        try:
+            reader, writer = await asyncio.open_connection(
+                sock=sock,
+                ssl=ssl_context,
+                server_hostname=host if ssl_context else None,
+                limit=2**20,
+            )
+        except BaseException:
+            sock.close()
+            raise
+        if ssl_context:
+            timings["tls"] = time.perf_counter_ns() - start
+        return _Connection(reader, writer)
+
+    @staticmethod
+    async def _connect_socket(
+        loop: asyncio.AbstractEventLoop, addresses: list
+    ) -> socket.socket:
+        """
+        Open a TCP connection to the first address that accepts it
+        Args:
+            loop (asyncio.AbstractEventLoop): running event loop
+            addresses (list): addresses returned by getaddrinfo
+        Returns:
+            socket.socket: the connected socket
+        """
+        last_error = None
+        for family, sock_type, proto, _, address in addresses:
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, address)
+                return sock
+            except OSError as err:
+                sock.close()
+                last_error = err
+            except BaseException:
+                sock.close()
+                raise
+        raise last_error or OSError("could not resolve any address")
+
+    def _release_connection(
+        self, key: Tuple[str, str, int], connection: _Connection, reusable: bool
+    ) -> None:
+        idle = self._idle.setdefault(key, [])
+        if reusable and self.keep_alive and len(idle) < self.pool_size:
+            idle.append(connection)
+        else:
+            connection.close()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        headers: dict = None,
+        body: bytes = None,
+        stream: bool = False,
+    ) -> AsyncResponse:
+        """
+        Send a request
+        Args:
+            method (str): http method, for example GET or POST
+            url (str): the url to run a given api request
+            params (dict): query parameters of the request
+            headers (dict): headers used for API requests. For example, authorization headers.
+            body (bytes): body of the request
+            stream (bool): if True, the response body is read in chunks and discarded instead of being kept in memory. Defaults to False.
+        Returns:
+            AsyncResponse: the response
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS:
+            raise InvalidSchema(f"No connection adapters were found for {url}")
+        host = parts.hostname
+        port = parts.port or DEFAULT_PORTS[parts.scheme]
+        key = (parts.scheme, host, port)
+
+        target = parts.path or "/"
+        query = "&".join(q for q in (parts.query, _encode_params(params)) if q)
+        if query:
+            target = f"{target}?{query}"
+
+        request_headers = {
+            "Host": parts.netloc,
+            "User-Agent": USER_AGENT,
+            "Accept": "*/*",
+            # the encodings the requests engine accepts, so that both engines download the same bodies
+            "Accept-Encoding": DEFAULT_ACCEPT_ENCODING,
+            "Connection": "keep-alive" if self.keep_alive else "close",
+        }
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            request_headers["Content-Length"] = str(len(body or b""))
+        request_headers.update(headers or {})
+        head_lines = [f"{method} {target} HTTP/1.1"] + [
+            f"{name}: {value}" for name, value in request_headers.items()
+        ]
+        head = ("\r\n".join(head_lines) + "\r\n\r\n").encode("latin-1")
+
+        timings = {}
+        connection = await self._get_connection(*key, timings)
+        try:
+            try:
+                response, reusable = await self._send(
+                    connection, head, body, method, timings, stream
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not connection.reused:
+                    raise
+                # the server closed an idle keep-alive connection, retry once on a new connection
+                connection.close()
+                connection = await self._get_connection(*key, timings)
+                response, reusable = await self._send(
+                    connection, head, body, method, timings, stream
+                )
+        except BaseException:
+            connection.close()
+            raise
+        self._release_connection(key, connection, reusable)
+        return response
+
+    async def _send(
+        self,
+        connection: _Connection,
+        head: bytes,
+        body: Optional[bytes],
+        method: str,
+        timings: Dict[str, int],
+        stream: bool,
+    ) -> Tuple[AsyncResponse, bool]:
+        """
+        Write a request on a connection and read the response
+        Returns:
+            Tuple[AsyncResponse, bool]: the response and whether the connection can be reused
+        """
+        start = time.perf_counter_ns()
+        # write the body as it is, without concatenating it to the head, so that a shared body is not copied
+        connection.writer.writelines([head, body] if body else [head])
+        await connection.writer.drain()
+        reader = connection.reader
+
+        # skip informational responses such as 100 Continue
+        while True:
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("server closed the connection")
+            version, _, status = status_line.decode("latin-1").partition(" ")
+            status_code = _parse_int(status.split(" ", 1)[0], "status line")
+            headers = await self._read_headers(reader)
+            if not 100 <= status_code < 200:
+                break
+        headers_received = time.perf_counter_ns()
+        timings["ttfb"] = headers_received - start
+
+        reusable = version == "HTTP/1.1" and headers.get("connection") != "close"
+        chunks = None if stream else []
+        if method == "HEAD" or status_code in NO_BODY_STATUSES:
+            size = 0
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            size = await self._read_chunked(reader, chunks)
+        elif "content-length" in headers:
+            size = await self._read_body(
+                reader, _parse_int(headers["content-length"], "content length"), chunks
+            )
+        else:
+            # the body ends when the server closes the connection
+            size = await self._read_body(reader, None, chunks)
+            reusable = False
+        timings["body"] = time.perf_counter_ns() - headers_received
+        content = b"".join(chunks) if chunks else b""
+        return AsyncResponse(status_code, headers, content, size, timings), reusable
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _read_body(
+        reader: asyncio.StreamReader, length: Optional[int], chunks: Optional[list]
+    ) -> int:
+        """
+        Read a body in chunks of at most STREAM_CHUNK_SIZE bytes
+        Args:
+            reader (asyncio.StreamReader): reader of the connection
+            length (Optional[int]): number of bytes to read. If None, read until the server closes the connection.
+            chunks (Optional[list]): list to add the chunks to. If None, the chunks are discarded.
+        Returns:
+            int: number of bytes read
+        """
+        size = 0
+        while length is None or size < length:
+            to_read = (
+                STREAM_CHUNK_SIZE
+                if length is None
+                else min(STREAM_CHUNK_SIZE, length - size)
+            )
+            chunk = await reader.read(to_read)
+            if not chunk:
+                if length is None:
+                    break
+                raise asyncio.IncompleteReadError(b"", length - size)
+            size += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+        return size
+
+    @classmethod
+    async def _read_chunked(
+        cls, reader: asyncio.StreamReader, chunks: Optional[list]
+    ) -> int:
+        size = 0
+        while True:
+            chunk_size = _parse_int(
+                (await reader.readline()).split(b";")[0].strip(), "chunk size", 16
+            )
+            if chunk_size == 0:
+                # skip trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return size
+            size += await cls._read_body(reader, chunk_size, chunks)
+            await reader.readexactly(2)
+
+    async def aclose(self) -> None:
+        """close all idle connections"""
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle.clear()
+
+
+def _raise_open_file_limit(num_connections: int) -> None:
+    """
+    Every connection in flight needs a file descriptor. Raise the soft limit of open files if it is too low.
+    Args:
+        num_connections (int): number of connections that will be opened at the same time
+    """
+    try:
+        import resource
+    except ImportError:  # not available on windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = num_connections + 256
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        new_soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+        if new_soft < needed:
+            logger.warning(
+                f"the limit of open files ({new_soft}) is lower than the number of concurrent requests"
+            )
+
+
+Sender = Callable[[AsyncHTTPClient], Awaitable[AsyncResponse]]
+
+
+def get_sender(
+    url: str, params: dict, headers: dict = None, stream: bool = False
+) -> Sender:
+    """
+    Build a coroutine function that sends a get request with a given client
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        headers (dict): headers used for API requests. For example, authorization headers.
+        stream (bool): if True, response bodies are read in chunks and discarded. Defaults to False.
+    Returns:
+        Sender: coroutine function that sends one request
+    """
+
+    async def send(client: AsyncHTTPClient) -> AsyncResponse:
+        return await client.request(
+            "GET", url, params=params, headers=headers, stream=stream
+        )
+
+    return send
+
+
+def manifest_sender(
+    url: str, params: dict, file_path_manifest: str, headers: dict = None
+) -> Sender:
+    """
+    Build a coroutine function that uploads a manifest with a given client.
+    The manifest is sent as the "file_name" field of a multipart form, like send_manifest does.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        file_path_manifest (str): file path of the manifest to upload
+        headers (dict): headers used for API requests. For example, authorization headers.
+    Returns:
+        Sender: coroutine function that sends one request
+    """
+    payload = load_manifest_payload(file_path_manifest)
+    request_headers = {**(headers or {}), "Content-Type": payload.content_type}
+
+    async def send(client: AsyncHTTPClient) -> AsyncResponse:
+        return await client.request(
+            "POST", url, params=params, headers=request_headers, body=payload.body
+        )
+
+    return send
+
+
+def _classify_error(err: Exception) -> str:
+    """
+    Get the outcome of a request that failed without a response
+    Args:
+        err (Exception): the error raised while sending the request
+    Returns:
+        str: "timeout", "tls_error" or "connection_error"
+    """
+    # check timeouts first, asyncio.TimeoutError is an OSError since python 3.11
+    if isinstance(err, asyncio.TimeoutError):
+        return TIMEOUT
+    if isinstance(err, ssl.SSLError):
+        return TLS_ERROR
+    # a malformed response (ProtocolError) counts as a connection error
+    if isinstance(err, (OSError, asyncio.IncompleteReadError)):
+        return CONNECTION_ERROR
+    raise err
+
+
+async def _send_or_fail(
+    send: Sender, client: AsyncHTTPClient, timeout: float
+) -> Union[AsyncResponse, str]:
+    """
+    Send a request within a deadline. If the request fails without a response, return its outcome instead of raising.
+    Args:
+        send (Sender): coroutine function that sends one request with the given client
+        client (AsyncHTTPClient): client to send the request with
+        timeout (float): deadline of the request, in seconds
+    Returns:
+        Union[AsyncResponse, str]: the response, or "timeout", "tls_error" or "connection_error"
+    """
+    try:
+        return await asyncio.wait_for(send(client), timeout)
+    except InvalidSchema:
+        raise
+    except Exception as err:
+        return _classify_error(err)
+
+
+def _record_results(
+    results: List[Tuple[Union[AsyncResponse, str], int]],
+    run_stats: RunStats,
+    url: str,
+    params: dict,
+) -> None:
+    """
+    Record the outcome and latency of every request
+    Args:
+        results (List[Tuple[Union[AsyncResponse, str], int]]): responses (or outcomes of requests that failed without a response) and their latency in nanoseconds
+        run_stats (RunStats): statistics of the run to record the results in
+        url (str): the url that users want to access (for logging purposes)
+        params (dict): the parameters used for the request (for logging purposes)
+    """
+    for result, elapsed_ns in results:
+        if isinstance(result, str):
+            run_stats.record_outcome(result, elapsed_ns)
+            logger.error(f"{result} running: {url} with using params {params}")
+            continue
+        if not run_stats.record_outcome(str(result.status_code), elapsed_ns):
+            logger.error(
+                f"{result.status_code} error running: {url} with using params {params}"
+            )
+        run_stats.record_phases(result.timings)
+        run_stats.record_transfer(result.size, elapsed_ns)
+
+
+async def _run_concurrent_requests(
+    send: Sender,
+    url: str,
+    params: dict,
+    concurrent_requests: int,
+    connection_mode: str,
+    duration_s: float = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    Keep a given number of requests in flight and record the latency of each of them
+    Args:
+        send (Sender): coroutine function that sends one request with the given client
+        url (str): the url that users want to access (for logging purposes)
+        params (dict): the parameters used for the request (for logging purposes)
+        concurrent_requests (int): number of requests to send at the same time
+        connection_mode (str): "warm" or "cold"
+        duration_s (float, optional): if provided, every one of the concurrent workers sends a new request as soon as
+            its previous one returns, until the duration (in seconds) has elapsed. Otherwise each worker sends a single request.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
+    """
+    _raise_open_file_limit(concurrent_requests)
+    client = AsyncHTTPClient(connection_mode, pool_size=concurrent_requests)
+    tracker = ConcurrencyTracker()
+    run_stats = RunStats(connection_mode=connection_mode)
+
+    async def timed_send() -> Tuple[Union[AsyncResponse, str], int]:
+        with tracker:
+            start = time.perf_counter_ns()
+            result = await _send_or_fail(send, client, timeout)
+            return result, time.perf_counter_ns() - start
+
+    async def worker(
+        deadline: Optional[int],
+    ) -> List[Tuple[Union[AsyncResponse, str], int]]:
+        worker_results = [await timed_send()]
+        while deadline is not None and time.perf_counter_ns() < deadline:
+            worker_results.append(await timed_send())
+        return worker_results
+
+    start_time = time.perf_counter_ns()
+    dt_string = return_time_now()
+    deadline = None if duration_s is None else start_time + int(duration_s * NS_PER_S)
+    try:
+        worker_results = await asyncio.gather(
+            *(worker(deadline) for _ in range(concurrent_requests))
+        )
+        results = [result for results in worker_results for result in results]
+    finally:
+        await client.aclose()
+    run_stats.wall_time_ns = time.perf_counter_ns() - start_time
+    run_stats.achieved_concurrency = tracker.peak
+    _record_results(results, run_stats, url, params)
+
+    time_diff = round(run_stats.wall_time_ns / NS_PER_S, 2)
+    logger.info(
+        f"duration time of running {url}: {time_diff}, {run_stats.achieved_concurrency} requests in flight, per request latency (ms): {run_stats.latency.summary()}, "
+        f"p50/p95/p99 of every phase (ms): {run_stats.phase_summary()}, outcomes: {run_stats.outcomes}"
+    )
+    return dt_string, time_diff, run_stats.status_code_dict(), run_stats
+
+
+async def _run_open_loop(
+    send: Sender,
+    url: str,
+    params: dict,
+    arrival_rate: float,
+    duration_s: float,
+    connection_mode: str,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    Send requests on a fixed schedule, whether or not earlier requests have returned.
+    The latency of a request is measured from the time it was scheduled to be sent, so that
+    time spent waiting behind a slow server or a busy client is not left out of the results (coordinated omission).
+    Args:
+        send (Sender): coroutine function that sends one request with the given client
+        url (str): the url that users want to access (for logging purposes)
+        params (dict): the parameters used for the request (for logging purposes)
+        arrival_rate (float): number of requests to send per second
+        duration_s (float): how long to keep sending requests, in seconds
+        connection_mode (str): "warm" or "cold"
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency measured from the intended send time, service time and throughput of the run.
+    """
+    if arrival_rate <= 0 or duration_s <= 0:
+        raise ValueError("arrival_rate and duration_s must be positive")
+    num_requests = max(int(arrival_rate * duration_s), 1)
+    interval_ns = NS_PER_S / arrival_rate
+    _raise_open_file_limit(num_requests)
+    # connections in the pool never outnumber requests in flight, so do not cap the pool
+    client = AsyncHTTPClient(connection_mode, pool_size=num_requests)
+    tracker = ConcurrencyTracker()
+    run_stats = RunStats(
+        connection_mode=connection_mode,
+        service_time=LatencyHistogram(),
+        arrival_rate=arrival_rate,
+    )
+
+    async def scheduled_send(
+        intended_start: int,
+    ) -> Tuple[Union[AsyncResponse, str], int]:
+        with tracker:
+            start = time.perf_counter_ns()
+            result = await _send_or_fail(send, client, timeout)
+            end = time.perf_counter_ns()
+            if not isinstance(result, str) and is_success(str(result.status_code)):
+                run_stats.service_time.record(end - start)
+            return result, end - intended_start
+
+    dt_string = return_time_now()
+    start_time = time.perf_counter_ns()
+    tasks = []
+    try:
+        for i in range(num_requests):
+            intended_start = start_time + int(i * interval_ns)
+            delay_ns = intended_start - time.perf_counter_ns()
+            if delay_ns > 0:
+                await asyncio.sleep(delay_ns / NS_PER_S)
+            tasks.append(asyncio.create_task(scheduled_send(intended_start)))
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await client.aclose()
+    run_stats.wall_time_ns = time.perf_counter_ns() - start_time
+    run_stats.achieved_concurrency = tracker.peak
+    _record_results(results, run_stats, url, params)
+
+    time_diff = round(run_stats.wall_time_ns / NS_PER_S, 2)
+    logger.info(
+        f"duration time of running {url} at {arrival_rate} requests per second: {time_diff}, up to {run_stats.achieved_concurrency} requests in flight, "
+        f"latency from intended send time (ms): {run_stats.latency.summary()}, service time (ms): {run_stats.service_time.summary()}, outcomes: {run_stats.outcomes}"
+    )
+    return dt_string, time_diff, run_stats.status_code_dict(), run_stats
+
+
+def cal_time_api_call_async(
+    url: str,
+    params: dict,
+    concurrent_requests: int,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    duration_s: float = None,
+    stream: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by sending get requests from an asyncio event loop.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        concurrent_requests (int): number of requests to keep in flight at the same time
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        duration_s (float, optional): if provided, keep the requests in flight for this many seconds instead of sending a single batch.
+        stream (bool): if True, response bodies are read in chunks and discarded instead of being kept in memory. Defaults to False.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
+    """
+    return asyncio.run(
+        _run_concurrent_requests(
+            get_sender(url, params, headers, stream),
+            url,
+            params,
+            concurrent_requests,
+            connection_mode,
+            duration_s,
+            timeout,
+        )
+    )
+
+
+def cal_time_api_call_post_request_async(
+    url: str,
+    params: dict,
+    concurrent_requests: int,
+    file_path_manifest: str,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    duration_s: float = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by uploading a manifest from an asyncio event loop.
+    The manifest is sent as the "file_name" field of a multipart form, like send_manifest does.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        concurrent_requests (int): number of requests to keep in flight at the same time
+        file_path_manifest (str): file path of the manifest to upload
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        duration_s (float, optional): if provided, keep the requests in flight for this many seconds instead of sending a single batch.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
+    """
+    return asyncio.run(
+        _run_concurrent_requests(
+            manifest_sender(url, params, file_path_manifest, headers),
+            url,
+            params,
+            concurrent_requests,
+            connection_mode,
+            duration_s,
+            timeout,
+        )
+    )
+
+
+def cal_time_api_call_open_loop(
+    url: str,
+    params: dict,
+    arrival_rate: float,
+    duration_s: float,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by sending get requests at a constant arrival rate.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        arrival_rate (float): number of requests to send per second
+        duration_s (float): how long to keep sending requests, in seconds
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency measured from the intended send time, service time and throughput of the run.
+    """
+    return asyncio.run(
+        _run_open_loop(
+            get_sender(url, params, headers),
+            url,
+            params,
+            arrival_rate,
+            duration_s,
+            connection_mode,
+            timeout,
+        )
+    )
+
+
+def cal_time_api_call_post_request_open_loop(
+    url: str,
+    params: dict,
+    arrival_rate: float,
+    duration_s: float,
+    file_path_manifest: str,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by uploading a manifest at a constant arrival rate.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        arrival_rate (float): number of requests to send per second
+        duration_s (float): how long to keep sending requests, in seconds
+        file_path_manifest (str): file path of the manifest to upload
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        timeout (float): deadline of every request, in seconds. Requests that take longer are cancelled and counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency measured from the intended send time, service time and throughput of the run.
+    """
+    return asyncio.run(
+        _run_open_loop(
+            manifest_sender(url, params, file_path_manifest, headers),
+            url,
+            params,
+            arrival_rate,
+            duration_s,
+            connection_mode,
+            timeout,
+        )
+    )
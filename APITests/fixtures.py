@@ -0,0 +1,293 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from test_resources_utils import CreateTestFiles, CreateTestFolders
+from utils import get_synapse_client
+
+logger = logging.getLogger("fixtures")
+
+DEFAULT_FIXTURE_REGISTRY_FILE = "fixtures.json"
+# local test files of every fixture are written to a directory of this one, named after the fixture
+FIXTURE_FILES_DIR = "fixture_files"
+# number of hex digits of the sha256 of a spec used as its key
+KEY_LENGTH = 12
+# format of the build time in project names. Synapse names can not contain colons.
+BUILD_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+@dataclass
+class Fixture:
+    """
+    Synapse resources built for a fixture specification
+
+    Attributes:
+        key (str): key of the specification (see fixture_key)
+        spec (dict): the specification
+        ids (Dict[str, str]): synapse ids of the resources, for example project_id and view_id
+        created_at (str): time the resources were built, in ISO format
+    """
+
+    key: str
+    spec: dict
+    ids: Dict[str, str] = field(default_factory=dict)
+    created_at: str = ""
+
+
+def fixture_key(spec: dict) -> str:
+    """
+    Hash a fixture specification, so that the same topology always maps to the same fixture and any change maps to a new one
+    Args:
+        spec (dict): the specification
+    Returns:
+        str: the first KEY_LENGTH hex digits of the sha256 of the specification, serialized with sorted keys
+    """
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:KEY_LENGTH]
+
+
+def project_name(spec: dict, key: str, built_at: datetime) -> str:
+    """
+    Name the project of a fixture build. Every build gets its own project, so that a rebuild does not collide with the project of an earlier build.
+    Args:
+        spec (dict): the specification
+        key (str): key of the specification
+        built_at (datetime): start time of the build
+    Returns:
+        str: the project name of the specification, followed by the key and the build time
+    """
+    return f"{spec['project_name']} ({key} {built_at.strftime(BUILD_TIME_FORMAT)})"
+
+
+def build_folders(spec: dict, key: str, built_at: datetime) -> Dict[str, str]:
+    """
+    Build a project with a hierarchy of folders, for a specification like
+    {"type": "folders", "project_name": "folder structure", "fan_out": [50, 1, 1, 1], "max_folders": 200, "files_per_folder": 10}
+    Files are attached to every folder below the first level. fan_out, max_folders and annotations work as in CreateTestFolders.create_test_folder_tree.
+    Args:
+        spec (dict): the specification
+        key (str): key of the specification, names the directory of the local test files
+        built_at (datetime): start time of the build (see project_name)
+    Returns:
+        Dict[str, str]: ids of the project and its entity view
+    """
+    folders = CreateTestFolders(
+        max_depth=len(spec["fan_out"]),
+        test_folder_path=os.path.join(FIXTURE_FILES_DIR, key),
+    )
+    project_id, view_id = folders.create_test_folder_tree(
+        project_name(spec, key, built_at),
+        spec["fan_out"],
+        max_folders=spec.get("max_folders"),
+        num_files=spec.get("files_per_folder", 0),
+        annotations=spec.get("annotations"),
+    )
+    return {"project_id": project_id, "view_id": view_id}
+
+
+def build_files(spec: dict, key: str, built_at: datetime) -> Dict[str, str]:
+    """
+    Build a project with one dataset folder of test files, for a specification like
+    {"type": "files", "project_name": "manifest generate", "num_files": 100, "annotations": {"FileFormat": "txt"}}
+    Args:
+        spec (dict): the specification. text is the content of every file and folder_name the name of the dataset folder.
+        key (str): key of the specification, names the directory of the local test files
+        built_at (datetime): start time of the build (see project_name)
+    Returns:
+        Dict[str, str]: ids of the dataset folder, the project and its entity view
+    """
+    dataset_id, project_id, view_id = CreateTestFiles.create_test_files(
+        num_file=spec["num_files"],
+        project_name=project_name(spec, key, built_at),
+        test_folder_path=os.path.join(FIXTURE_FILES_DIR, key),
+        text_to_write=spec.get("text", "writing test files"),
+        folder_name=spec.get("folder_name", "test files"),
+        annotations=spec.get("annotations"),
+    )
+    return {"dataset_id": dataset_id, "project_id": project_id, "view_id": view_id}
+
+
+# builder of every fixture type
+FIXTURE_BUILDERS: Dict[str, Callable[[dict, str, datetime], Dict[str, str]]] = {
+    "folders": build_folders,
+    "files": build_files,
+}
+
+
+def entity_exists(entity_id: str) -> bool:
+    """
+    Check that an entity still exists on synapse and has not been moved to the trash can
+    Args:
+        entity_id (str): synapse id
+    Returns:
+        bool: False if synapse does not find the entity or denies access to it
+    """
+    from synapseclient.core.exceptions import SynapseHTTPError
+
+    try:
+        get_synapse_client().restGET(f"/entity/{entity_id}")
+    except SynapseHTTPError as err:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+        if status in (403, 404):
+            return False
+        raise
+    return True
+
+
+class FixtureRegistry:
+    """
+    Persisted map from fixture specifications to the synapse resources built for them.
+    Benchmarks ask for a fixture by its specification: existing resources are reused as long as they still exist,
+    and resources are only built for new or changed specifications.
+    Usage:
+        ids = FixtureRegistry().ensure({"type": "folders", "project_name": "folder structure", "fan_out": [5, 5]})
+    """
+
+    def __init__(self, path: str = DEFAULT_FIXTURE_REGISTRY_FILE):
+        """
+        Args:
+            path (str): file path of the json registry. Defaults to fixtures.json.
+        """
+        self.path = path
+        self._fixtures: Dict[str, Fixture] = {}
+        if os.path.exists(path):
+            with open(path) as registry_file:
+                self._fixtures = {
+                    key: Fixture(**fixture)
+                    for key, fixture in json.load(registry_file).items()
+                }
+
+    def save(self) -> None:
+        """write the registry to its file, replacing it at once so that an interrupted write does not lose fixtures"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as registry_file:
+            json.dump(
+                {key: asdict(fixture) for key, fixture in self._fixtures.items()},
+                registry_file,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(temp_path, self.path)
+
+    def fixtures(self) -> List[Fixture]:
+        """
+        List the registered fixtures
+        Returns:
+            List[Fixture]: the fixtures, oldest first
+        """
+        return sorted(self._fixtures.values(), key=lambda fixture: fixture.created_at)
+
+    def get(self, spec: dict) -> Optional[Fixture]:
+        """
+        Look up the fixture of a specification, without checking synapse
+        Args:
+            spec (dict): the specification
+        Returns:
+            Optional[Fixture]: the fixture, or None if it was never built
+        """
+        return self._fixtures.get(fixture_key(spec))
+
+    def is_alive(self, fixture: Fixture) -> bool:
+        """
+        Check that all resources of a fixture still exist on synapse
+        Args:
+            fixture (Fixture): the fixture
+        Returns:
+            bool: True if every resource exists
+        """
+        return all(entity_exists(entity_id) for entity_id in fixture.ids.values())
+
+    def ensure(self, spec: dict, rebuild: bool = False) -> Dict[str, str]:
+        """
+        Get the resources of a fixture, building them if they were never built or no longer exist
+        Args:
+            spec (dict): the specification. Its "type" is one of FIXTURE_BUILDERS.
+            rebuild (bool): build new resources even if the registered ones still exist. Defaults to False.
+        Returns:
+            Dict[str, str]: synapse ids of the resources
+        """
+        if spec.get("type") not in FIXTURE_BUILDERS:
+            raise ValueError(
+                f"Unknown fixture type {spec.get('type')}. Please use one of {list(FIXTURE_BUILDERS)}"
+            )
+        key = fixture_key(spec)
+        fixture = self._fixtures.get(key)
+        if fixture is not None and not rebuild:
+            if self.is_alive(fixture):
+                logger.info(f"reusing fixture {key}: {fixture.ids}")
+                return fixture.ids
+            logger.warning(f"resources of fixture {key} are missing, rebuilding it")
+        logger.info(f"building fixture {key}: {spec}")
+        built_at = datetime.now()
+        ids = FIXTURE_BUILDERS[spec["type"]](spec, key, built_at)
+        self._fixtures[key] = Fixture(
+            key=key, spec=spec, ids=ids, created_at=built_at.isoformat()
+        )
+        self.save()
+        if fixture is not None:
+            self._retire(fixture, built_at)
+        return ids
+
+    def _retire(self, fixture: Fixture, built_at: datetime) -> None:
+        # record the resources of a replaced build in a teardown ledger. Its name ends with the process id like the ledgers
+        # of runs, so that a sweep deletes them once this process, which may still use them, has exited.
+        from teardown import DEFAULT_LEDGER_DIR, Ledger
+
+        os.makedirs(DEFAULT_LEDGER_DIR, exist_ok=True)
+        ledger = Ledger(
+            os.path.join(
+                DEFAULT_LEDGER_DIR,
+                f"fixture-{fixture.key}-{built_at.strftime(BUILD_TIME_FORMAT)}-{os.getpid()}.jsonl",
+            )
+        )
+        project_id = fixture.ids.get("project_id")
+        for entity_id in fixture.ids.values():
+            ledger.record(entity_id, None if entity_id == project_id else project_id)
+        logger.warning(
+            f"the resources {fixture.ids} of the previous build of fixture {fixture.key} will be deleted by the next sweep"
+        )
+
+    def forget(self, key: str) -> None:
+        """
+        Remove a fixture from the registry. Its resources are left on synapse.
+        Args:
+            key (str): key of the fixture
+        """
+        self._fixtures.pop(key, None)
+        self.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List, check and forget the registered synapse fixtures"
+    )
+    parser.add_argument(
+        "command",
+        choices=["list", "check", "forget"],
+        help="list: print the registered fixtures. check: also check that their resources still exist. forget: remove fixtures from the registry.",
+    )
+    parser.add_argument("keys", nargs="*", help="keys of the fixtures to forget")
+    parser.add_argument(
+        "--registry",
+        default=DEFAULT_FIXTURE_REGISTRY_FILE,
+        help="json file of the registry",
+    )
+    args = parser.parse_args()
+
+    registry = FixtureRegistry(args.registry)
+    if args.command == "forget":
+        for key in args.keys:
+            registry.forget(key)
+    else:
+        for fixture in registry.fixtures():
+            status = ""
+            if args.command == "check":
+                status = " alive" if registry.is_alive(fixture) else " MISSING"
+            print(
+                f"{fixture.key}{status} {fixture.created_at} {json.dumps(fixture.spec)} -> {fixture.ids}"
+            )
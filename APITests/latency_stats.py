@@ -0,0 +1,375 @@
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+BYTES_PER_MB = 1_000_000
+
+# percentiles reported for every run
+REPORTED_PERCENTILES = (50, 90, 95, 99)
+# phases of a request, in the order they happen
+# dns, connect and tls only happen when a new connection is opened
+REQUEST_PHASES = ("dns", "connect", "tls", "ttfb", "body")
+# percentiles reported for every phase
+PHASE_PERCENTILES = (50, 95, 99)
+# outcomes of requests that failed without a response. Requests that got a response are counted by status code.
+TIMEOUT = "timeout"
+CONNECTION_ERROR = "connection_error"
+TLS_ERROR = "tls_error"
+# status codes that always get their own column in the result rows
+REPORTED_STATUS_CODES = ("200", "500", "503", "504")
+
+
+def is_success(outcome: str) -> bool:
+    """
+    Check if the outcome of a request counts as a success
+    Args:
+        outcome (str): status code of the response, or one of TIMEOUT, CONNECTION_ERROR and TLS_ERROR
+    Returns:
+        bool: True for 2xx and 3xx status codes
+    """
+    return outcome.isdigit() and 200 <= int(outcome) < 400
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram. Values (in nanoseconds) are recorded into log-linear buckets,
+    so that the relative error of any reported value is bounded by the number of significant figures,
+    no matter how large the recorded value is. Two histograms with the same precision can be merged
+    without losing any information, which makes it possible to combine results of different threads,
+    workers or runs.
+    """
+
+    def __init__(self, significant_figures: int = 3):
+        """
+        Args:
+            significant_figures (int): number of significant decimal digits to keep for each recorded value. Defaults to 3.
+        """
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+        self.significant_figures = significant_figures
+        # number of bits needed to represent 2 * 10^significant_figures distinct values
+        self._sub_bucket_bits = math.ceil(math.log2(2 * 10**significant_figures))
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _bucket_index(self, value: int) -> int:
+        """
+        Get the index of the bucket a value falls into
+        Args:
+            value (int): a non-negative value
+        Returns:
+            int: index of the bucket
+        """
+        shift = max(value.bit_length() - self._sub_bucket_bits, 0)
+        return (shift << self._sub_bucket_bits) + (value >> shift)
+
+    def _bucket_range(self, index: int) -> Tuple[int, int]:
+        """
+        Get the lowest and highest value covered by a bucket
+        Args:
+            index (int): index of the bucket
+        Returns:
+            Tuple[int, int]: lowest and highest value of the bucket
+        """
+        shift = index >> self._sub_bucket_bits
+        sub_bucket = index & ((1 << self._sub_bucket_bits) - 1)
+        lowest = sub_bucket << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, value: int, count: int = 1) -> None:
+        """
+        Record a value
+        Args:
+            value (int): value to record, in nanoseconds
+            count (int): number of times the value was observed. Defaults to 1.
+        """
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"can not record a negative value: {value}")
+        index = self._bucket_index(value)
+        self._counts[index] = self._counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """
+        Add all values recorded by another histogram to this histogram
+        Args:
+            other (LatencyHistogram): histogram to merge. It must have the same precision.
+        Returns:
+            LatencyHistogram: this histogram
+        """
+        if other.significant_figures != self.significant_figures:
+            raise ValueError(
+                "can not merge histograms with different significant figures"
+            )
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> Optional[float]:
+        """mean of all recorded values"""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percentile: float) -> Optional[int]:
+        """
+        Get the value at a given percentile
+        Args:
+            percentile (float): percentile between 0 and 100
+        Returns:
+            Optional[int]: the highest value equivalent to the bucket that contains the given percentile, or None if nothing was recorded
+        """
+        if not self.count:
+            return None
+        if not 0 <= percentile <= 100:
+            raise ValueError(f"percentile must be between 0 and 100, got {percentile}")
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                _, highest = self._bucket_range(index)
+                return min(max(highest, self.min), self.max)
+        return self.max
+
+    def iter_values(self) -> Iterator[Tuple[int, int]]:
+        """
+        Iterate over the recorded buckets
+        Returns:
+            Iterator[Tuple[int, int]]: the middle value of each bucket and its count, sorted by value
+        """
+        for index in sorted(self._counts):
+            lowest, highest = self._bucket_range(index)
+            middle = min(max((lowest + highest) // 2, self.min), self.max)
+            yield middle, self._counts[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """
+        Summarize the histogram in milliseconds
+        Returns:
+            Dict[str, Optional[float]]: min, mean, percentiles and max of the recorded values in milliseconds
+        """
+
+        def to_ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value / NS_PER_MS, 2)
+
+        summary = {"min": to_ms(self.min), "mean": to_ms(self.mean)}
+        for p in REPORTED_PERCENTILES:
+            summary[f"p{p}"] = to_ms(self.percentile(p))
+        summary["max"] = to_ms(self.max)
+        return summary
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __repr__(self) -> str:
+        return f"LatencyHistogram(count={self.count}, summary={self.summary()})"
+
+
+@dataclass
+class RunStats:
+    """
+    Statistics of running a batch of requests against an endpoint
+
+    Attributes:
+        latency (LatencyHistogram): latency of each successful request (see is_success)
+        wall_time_ns (int): time it took to finish the whole batch, in nanoseconds
+        connection_mode (str): whether requests were sent over new ("cold") or pooled keep-alive ("warm") connections
+        achieved_concurrency (int): highest number of requests that were in flight at the same time
+        service_time (LatencyHistogram): in open-loop runs, time from actually sending each request to receiving its response.
+            The latency of open-loop runs is measured from the time each request was scheduled to be sent.
+        arrival_rate (float): in open-loop runs, number of requests scheduled per second
+        phases (Dict[str, LatencyHistogram]): duration of every phase of the requests (see REQUEST_PHASES)
+        response_size (LatencyHistogram): size of every response body, in bytes
+        transfer_rate (LatencyHistogram): transfer rate of every response (body size divided by request latency), in bytes per second
+        failure_time (LatencyHistogram): time to failure of every failed request: error responses, timeouts, connection and TLS errors.
+            Failures are kept out of the latency histogram, so that fast failing requests do not make the endpoint look faster.
+        outcomes (Dict[str, int]): number of requests of every outcome (status code, timeout, connection_error or tls_error)
+    """
+
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    wall_time_ns: int = 0
+    connection_mode: Optional[str] = None
+    achieved_concurrency: int = 0
+    service_time: Optional[LatencyHistogram] = None
+    arrival_rate: Optional[float] = None
+    phases: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    response_size: LatencyHistogram = field(default_factory=LatencyHistogram)
+    transfer_rate: LatencyHistogram = field(default_factory=LatencyHistogram)
+    failure_time: LatencyHistogram = field(default_factory=LatencyHistogram)
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """number of successful requests per second"""
+        if not self.wall_time_ns:
+            return None
+        return round(self.latency.count / (self.wall_time_ns / NS_PER_S), 3)
+
+    def merge(self, other: "RunStats", sequential: bool = False) -> "RunStats":
+        """
+        Merge the statistics of another batch
+        Args:
+            other (RunStats): statistics of the other batch
+            sequential (bool): False if the other batch ran at the same time as this one (for example in another process),
+                True if it ran after this one (for example the next trial). Defaults to False.
+        Returns:
+            RunStats: this object
+        """
+        self.latency.merge(other.latency)
+        if sequential:
+            self.wall_time_ns += other.wall_time_ns
+            self.achieved_concurrency = max(
+                self.achieved_concurrency, other.achieved_concurrency
+            )
+        else:
+            self.wall_time_ns = max(self.wall_time_ns, other.wall_time_ns)
+            self.achieved_concurrency += other.achieved_concurrency
+        if other.arrival_rate is not None:
+            # requests scheduled at the same time add up, requests scheduled one batch after another do not
+            self.arrival_rate = (
+                other.arrival_rate
+                if sequential
+                else (self.arrival_rate or 0) + other.arrival_rate
+            )
+        if other.service_time is not None:
+            if self.service_time is None:
+                self.service_time = LatencyHistogram(
+                    other.service_time.significant_figures
+                )
+            self.service_time.merge(other.service_time)
+        for phase, histogram in other.phases.items():
+            self.phases.setdefault(
+                phase, LatencyHistogram(histogram.significant_figures)
+            ).merge(histogram)
+        self.response_size.merge(other.response_size)
+        self.transfer_rate.merge(other.transfer_rate)
+        self.failure_time.merge(other.failure_time)
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        return self
+
+    def record_outcome(self, outcome: str, elapsed_ns: int) -> bool:
+        """
+        Record how a request ended and how long it took
+        Args:
+            outcome (str): status code of the response, or one of TIMEOUT, CONNECTION_ERROR and TLS_ERROR
+            elapsed_ns (int): time from sending the request to its outcome, in nanoseconds
+        Returns:
+            bool: whether the request was successful
+        """
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        success = is_success(outcome)
+        if success:
+            self.latency.record(elapsed_ns)
+        else:
+            self.failure_time.record(elapsed_ns)
+        return success
+
+    def status_code_dict(self) -> Dict[str, int]:
+        """
+        Count the requests of every outcome
+        Returns:
+            Dict[str, int]: number of requests of every outcome. The status codes of REPORTED_STATUS_CODES are always included.
+        """
+        status_code_dict = {status_code: 0 for status_code in REPORTED_STATUS_CODES}
+        status_code_dict.update(self.outcomes)
+        return status_code_dict
+
+    def record_transfer(self, size: int, elapsed_ns: int) -> None:
+        """
+        Record the size of a response body and its transfer rate
+        Args:
+            size (int): size of the response body, in bytes
+            elapsed_ns (int): latency of the request, in nanoseconds
+        """
+        self.response_size.record(size)
+        if elapsed_ns > 0:
+            self.transfer_rate.record(size * NS_PER_S // elapsed_ns)
+
+    def transfer_summary(self) -> Dict[str, Optional[float]]:
+        """
+        Summarize the size of the responses and how fast they were received
+        Returns:
+            Dict[str, Optional[float]]: mean and max response size in bytes, total MB received,
+                p50 and p5 (slowest 5%) of the per request transfer rate in MB/s, and the MB/s of the whole run
+        """
+
+        def to_mb(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value / BYTES_PER_MB, 3)
+
+        total_mb = to_mb(self.response_size.total)
+        return {
+            "mean_bytes": None
+            if self.response_size.mean is None
+            else round(self.response_size.mean),
+            "max_bytes": self.response_size.max,
+            "total_mb": total_mb,
+            "p50_mb_per_s": to_mb(self.transfer_rate.percentile(50)),
+            "p5_mb_per_s": to_mb(self.transfer_rate.percentile(5)),
+            "mb_per_s": round(total_mb / (self.wall_time_ns / NS_PER_S), 3)
+            if self.wall_time_ns
+            else None,
+        }
+
+    def record_phases(self, timings: Dict[str, int]) -> None:
+        """
+        Record the duration of the phases of a request
+        Args:
+            timings (Dict[str, int]): duration of every phase that happened, in nanoseconds
+        """
+        for phase, elapsed_ns in timings.items():
+            self.phases.setdefault(phase, LatencyHistogram()).record(elapsed_ns)
+
+    def phase_summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Summarize the duration of every phase in milliseconds
+        Returns:
+            Dict[str, Dict[str, Optional[float]]]: p50, p95 and p99 of every phase that was recorded
+        """
+        summary = {}
+        for phase in REQUEST_PHASES:
+            if phase in self.phases:
+                phase_summary = self.phases[phase].summary()
+                summary[phase] = {
+                    f"p{p}": phase_summary[f"p{p}"] for p in PHASE_PERCENTILES
+                }
+        return summary
+
+
+class ConcurrencyTracker:
+    """
+    Count the number of requests in flight and remember the highest count.
+    Use an instance as a context manager around each request. It is safe to share across threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def __enter__(self) -> "ConcurrencyTracker":
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with self._lock:
+            self.in_flight -= 1
@@ -0,0 +1,381 @@
+import argparse
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from latency_stats import RunStats
+from result_store import ResultStore
+from utils import (
+    BASE_URL,
+    WARM_POOLED,
+    MultiRow,
+    StoreRuntime,
+    save_run_time_result,
+)
+
+logger = logging.getLogger("load-profiles")
+
+# a stage stops counting as progress when its throughput is less than 10% above the best one so far
+DEFAULT_MIN_THROUGHPUT_GAIN = 0.1
+
+
+@dataclass
+class LoadStage:
+    """
+    One stage of a load profile
+
+    Attributes:
+        concurrency (int): number of requests kept in flight during the stage
+        duration_s (float): how long the stage lasts, in seconds
+    """
+
+    concurrency: int
+    duration_s: float
+
+
+@dataclass
+class LoadProfile:
+    """
+    A sequence of load stages that are run one after another
+
+    Attributes:
+        name (str): name of the profile, for example "ramp"
+        stages (List[LoadStage]): stages of the profile
+    """
+
+    name: str
+    stages: List[LoadStage]
+
+    @classmethod
+    def linear_ramp(
+        cls, start: int, stop: int, step: int, stage_duration_s: float
+    ) -> "LoadProfile":
+        """
+        Increase the concurrency linearly
+        Args:
+            start (int): concurrency of the first stage
+            stop (int): concurrency of the last stage
+            step (int): concurrency added at every stage
+            stage_duration_s (float): duration of every stage, in seconds
+        Returns:
+            LoadProfile: the ramp profile
+        """
+        if start < 1 or step < 1 or stop < start:
+            raise ValueError("a ramp needs 1 <= start <= stop and step >= 1")
+        levels = list(range(start, stop + 1, step))
+        if levels[-1] != stop:
+            levels.append(stop)
+        return cls(
+            name="ramp",
+            stages=[LoadStage(level, stage_duration_s) for level in levels],
+        )
+
+    @classmethod
+    def step_ladder(cls, levels: List[int], stage_duration_s: float) -> "LoadProfile":
+        """
+        Run a given list of concurrency levels, for example doubling the concurrency at every step
+        Args:
+            levels (List[int]): concurrency of every stage
+            stage_duration_s (float): duration of every stage, in seconds
+        Returns:
+            LoadProfile: the step profile
+        """
+        if not levels or min(levels) < 1:
+            raise ValueError("a step ladder needs at least one level >= 1")
+        return cls(
+            name="step",
+            stages=[LoadStage(level, stage_duration_s) for level in levels],
+        )
+
+    @classmethod
+    def spike(
+        cls,
+        base: int,
+        peak: int,
+        base_duration_s: float,
+        spike_duration_s: float,
+    ) -> "LoadProfile":
+        """
+        Run a base load, a short spike and the base load again to see how the endpoint recovers
+        Args:
+            base (int): concurrency before and after the spike
+            peak (int): concurrency during the spike
+            base_duration_s (float): duration of the base load before and after the spike, in seconds
+            spike_duration_s (float): duration of the spike, in seconds
+        Returns:
+            LoadProfile: the spike profile
+        """
+        return cls(
+            name="spike",
+            stages=[
+                LoadStage(base, base_duration_s),
+                LoadStage(peak, spike_duration_s),
+                LoadStage(base, base_duration_s),
+            ],
+        )
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "LoadProfile":
+        """
+        Create a load profile from a declarative specification, for example
+        {"type": "ramp", "start": 1, "stop": 32, "step": 4, "stage_duration_s": 30}
+        {"type": "step", "levels": [1, 2, 4, 8, 16], "stage_duration_s": 30}
+        {"type": "spike", "base": 2, "peak": 50, "base_duration_s": 60, "spike_duration_s": 10}
+        Args:
+            spec (dict): specification of the profile. "type" is one of ramp, step or spike, the other keys are passed to the matching constructor.
+        Returns:
+            LoadProfile: the load profile
+        """
+        spec = dict(spec)
+        profile_type = spec.pop("type", None)
+        constructors = {
+            "ramp": cls.linear_ramp,
+            "step": cls.step_ladder,
+            "spike": cls.spike,
+        }
+        if profile_type not in constructors:
+            raise ValueError(
+                f"Unknown load profile type {profile_type}. Please use one of {list(constructors)}"
+            )
+        return constructors[profile_type](**spec)
+
+
+# profiles that can be selected by name
+PROFILES: Dict[str, dict] = {
+    "ramp": {"type": "ramp", "start": 1, "stop": 32, "step": 4, "stage_duration_s": 30},
+    "step": {"type": "step", "levels": [1, 2, 4, 8, 16, 32], "stage_duration_s": 30},
+    "spike": {
+        "type": "spike",
+        "base": 2,
+        "peak": 32,
+        "base_duration_s": 60,
+        "spike_duration_s": 15,
+    },
+}
+
+
+@dataclass
+class StageResult:
+    """
+    Result of running one stage of a load profile
+
+    Attributes:
+        stage (LoadStage): the stage that was run
+        dt_string (str): start time of the stage
+        time_diff (float): duration of the stage, in seconds
+        status_code_dict (dict): status codes of the responses received during the stage
+        run_stats (RunStats): latency and throughput of the stage
+    """
+
+    stage: LoadStage
+    dt_string: str
+    time_diff: float
+    status_code_dict: dict
+    run_stats: RunStats
+
+    @property
+    def p95_ms(self) -> Optional[float]:
+        return self.run_stats.latency.summary()["p95"]
+
+
+@dataclass
+class LoadProfileResult:
+    """
+    Results of all stages of a load profile
+
+    Attributes:
+        profile (LoadProfile): the profile that was run
+        stages (List[StageResult]): result of every stage, in the order they ran
+    """
+
+    profile: LoadProfile
+    stages: List[StageResult] = field(default_factory=list)
+
+    def saturation_concurrency(
+        self, min_throughput_gain: float = DEFAULT_MIN_THROUGHPUT_GAIN
+    ) -> Optional[int]:
+        """
+        Find the concurrency at which throughput stops rising (the knee of the throughput curve)
+        Args:
+            min_throughput_gain (float): smallest relative gain in throughput that still counts as rising. Defaults to 0.1.
+        Returns:
+            Optional[int]: the highest concurrency that still increased throughput, or None if throughput kept rising until the last stage
+        """
+        # keep the best throughput observed at every concurrency
+        throughput_by_concurrency: Dict[int, float] = {}
+        for result in self.stages:
+            throughput = result.run_stats.throughput or 0
+            concurrency = result.stage.concurrency
+            throughput_by_concurrency[concurrency] = max(
+                throughput, throughput_by_concurrency.get(concurrency, 0)
+            )
+
+        levels = sorted(throughput_by_concurrency)
+        if not levels:
+            return None
+        best_concurrency, best_throughput = (
+            levels[0],
+            throughput_by_concurrency[levels[0]],
+        )
+        for concurrency in levels[1:]:
+            throughput = throughput_by_concurrency[concurrency]
+            if throughput < best_throughput * (1 + min_throughput_gain):
+                return best_concurrency
+            best_concurrency, best_throughput = concurrency, throughput
+        return None
+
+    def to_rows(self, endpoint_name: str, description: str, **kwargs) -> MultiRow:
+        """
+        Create one result row per stage
+        Args:
+            endpoint_name (str): name of the endpoint being run
+            description (str): description of the case being run. The stage gets appended to it.
+            **kwargs: other arguments passed to save_run_time_result, for example data_schema or num_rows
+        Returns:
+            MultiRow: a row for every stage
+        """
+        num_stages = len(self.stages)
+        return [
+            save_run_time_result(
+                endpoint_name=endpoint_name,
+                description=f"{description} Stage {i} of {num_stages} of a {self.profile.name} load profile with {result.stage.concurrency} concurrent requests for {result.stage.duration_s} seconds.",
+                dt_string=result.dt_string,
+                num_concurrent=result.stage.concurrency,
+                latency=result.time_diff,
+                status_code_dict=result.status_code_dict,
+                run_stats=result.run_stats,
+                **kwargs,
+            )
+            for i, result in enumerate(self.stages, start=1)
+        ]
+
+    def log_summary(self) -> None:
+        """log the throughput and p95 latency of every stage, and the saturation concurrency"""
+        for i, result in enumerate(self.stages, start=1):
+            logger.info(
+                f"stage {i}: {result.stage.concurrency} concurrent requests, throughput {result.run_stats.throughput} requests/s, p95 latency {result.p95_ms} ms"
+            )
+        knee = self.saturation_concurrency()
+        if knee is None:
+            logger.info(
+                "throughput kept rising until the last stage, try a profile with a higher concurrency"
+            )
+        else:
+            logger.info(f"throughput stops rising above {knee} concurrent requests")
+
+
+def run_load_profile(
+    profile: LoadProfile,
+    url: str,
+    params: dict,
+    headers: dict = None,
+    file_path_manifest: str = None,
+    connection_mode: str = WARM_POOLED,
+    stream: bool = False,
+) -> LoadProfileResult:
+    """
+    Run every stage of a load profile against an endpoint, using the async engine.
+    During a stage, each of the concurrent workers sends a new request as soon as its previous one returns.
+    Args:
+        profile (LoadProfile): load profile to run
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        headers (dict): headers used for API requests. For example, authorization headers.
+        file_path_manifest (str, optional): if provided, the manifest is uploaded with a post request. Otherwise get requests are sent.
+        connection_mode (str): "warm" to reuse keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        stream (bool): if True, response bodies of get requests are read in chunks and discarded. Defaults to False.
+    Returns:
+        LoadProfileResult: results of every stage
+    """
+    from async_engine import (
+        cal_time_api_call_async,
+        cal_time_api_call_post_request_async,
+    )
+
+    result = LoadProfileResult(profile)
+    for i, stage in enumerate(profile.stages, start=1):
+        logger.info(
+            f"running stage {i} of {len(profile.stages)} of the {profile.name} profile: {stage.concurrency} concurrent requests for {stage.duration_s} seconds"
+        )
+        if file_path_manifest:
+            stage_result = cal_time_api_call_post_request_async(
+                url,
+                params,
+                stage.concurrency,
+                file_path_manifest,
+                headers=headers,
+                connection_mode=connection_mode,
+                duration_s=stage.duration_s,
+            )
+        else:
+            stage_result = cal_time_api_call_async(
+                url,
+                params,
+                stage.concurrency,
+                headers=headers,
+                connection_mode=connection_mode,
+                duration_s=stage.duration_s,
+                stream=stream,
+            )
+        result.stages.append(StageResult(stage, *stage_result))
+    result.log_summary()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a load profile against a schematic API endpoint"
+    )
+    parser.add_argument(
+        "endpoint", help="endpoint to run, relative to BASE_URL. E.g. model/validate"
+    )
+    parser.add_argument(
+        "--profile",
+        default="step",
+        help=f"name of a predefined profile ({', '.join(PROFILES)}) or a JSON specification of a profile",
+    )
+    parser.add_argument(
+        "--params", default="{}", help="parameters of the request as JSON"
+    )
+    parser.add_argument(
+        "--manifest", help="file path of a manifest to upload with a post request"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read response bodies in chunks and discard them, for large responses such as asset views",
+    )
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="store the rows of every stage in the local result store",
+    )
+    parser.add_argument(
+        "--synapse",
+        action="store_true",
+        help="also export the new rows of the local result store to synapse",
+    )
+    args = parser.parse_args()
+
+    spec = PROFILES.get(args.profile) or json.loads(args.profile)
+    token = StoreRuntime.get_access_token()
+    profile_result = run_load_profile(
+        LoadProfile.from_dict(spec),
+        f"{BASE_URL}/{args.endpoint}",
+        json.loads(args.params),
+        headers={"Authorization": f"Bearer {token}"},
+        file_path_manifest=args.manifest,
+        stream=args.stream,
+    )
+    if args.store:
+        rows = profile_result.to_rows(
+            endpoint_name=args.endpoint,
+            description=f"Running a {profile_result.profile.name} load profile against {args.endpoint}.",
+        )
+        with ResultStore() as store:
+            store.append_rows(
+                rows, run_stats=[result.run_stats for result in profile_result.stages]
+            )
+            if args.synapse:
+                store.export_synapse()
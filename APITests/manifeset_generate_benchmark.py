@@ -1,8 +1,11 @@
 import logging
-from typing import Optional
+from functools import partial
+from typing import Dict, Optional
 
+from fixtures import FixtureRegistry
 from manifest_generator import GenerateManifest
-from test_resources_utils import create_test_files
+from teardown import TeardownManager
+from trials import TrialResults, run_trials
 from utils import send_request
 
 logger = logging.getLogger("test manifest generation")
@@ -14,86 +17,70 @@ def execute_manifest_generate_use_annotations_comparison(
     num_time: int,
     asset_view_id: Optional[str],
     dataset_id: Optional[str],
-) -> None:
+    target_relative_ci: Optional[float] = 0.05,
+) -> Dict[bool, TrialResults]:
     """compare the run time of generating a manifest
 
     Args:
         schema_url (str): schema url
         data_type (str): data type of the manifest
-        num_time (int): number of times that end endpoint needs to run
+        num_time (int): maximum number of times that end endpoint needs to run, after one discarded warmup run
         asset_view_id (Optional[str]): asset view id
         dataset_id (Optional[str]): dataset id
+        target_relative_ci (Optional[float]): stop early once the mean run time is known within +/- this fraction. Defaults to 0.05.
+    Returns:
+        Dict[bool, TrialResults]: results of the trials for every value of use_annotations
     """
     use_annotations = [True, False]
     CONCURRENT_THREADS = 1
     base_url = (
         "https://schematic-dev-refactor.api.sagebionetworks.org/v1/manifest/generate"
     )
-    generation_duration = []
+    results = {}
     for opt in use_annotations:
         gm = GenerateManifest(url=schema_url, use_annotation=opt, data_type=data_type)
         gm.params["asset_view"] = asset_view_id
         gm.params["dataset_id"] = dataset_id
 
-        for count in range(num_time):
-            _, time_diff, all_status_code = send_request(
-                base_url, gm.params, CONCURRENT_THREADS, gm.headers
+        results[opt] = run_trials(
+            partial(send_request, base_url, gm.params, CONCURRENT_THREADS, gm.headers),
+            trials=num_time,
+            target_relative_ci=target_relative_ci,
+        )
+        if results[opt].failed_trials:
+            logger.error(
+                f"encountered an error when generating the manifest in {results[opt].failed_trials} runs"
             )
-            if all_status_code["200"] != 1:
-                logger.error("encountered an error when generating the manifest")
-            else:
-                generation_duration.append(time_diff)
-        average_generate_time = sum(generation_duration) / len(generation_duration)
         logger.info(
-            f"average time of generating a manifest when use_annotations set to {opt} is: {average_generate_time}"
+            f"time of generating a manifest when use_annotations set to {opt} (ms): {results[opt].summary()}"
         )
+    return results
 
 
-# case 1: a dataset folder with 10 dataset files
-test_folder_dir = (
-    "/Users/lpeng/Documents/schematic_profiler/schematic_profiler/test_new_files"
-)
-dataset_id, project_id, asset_view_id = create_test_files(
-    num_file=10,
-    project_name="API manifest generate project",
-    test_folder_path=test_folder_dir,
-)
-print("dataset id", dataset_id)
-print("project id", project_id)
-print("asset view", asset_view_id)
-
-schema_url = "https://raw.githubusercontent.com/Sage-Bionetworks/schematic/develop/tests/data/example.model.jsonld"
-data_type = "BulkRNA-seqAssay"
-num_time = 10
-execute_manifest_generate_use_annotations_comparison(
-    schema_url=schema_url,
-    data_type=data_type,
-    num_time=num_time,
-    asset_view_id=asset_view_id,
-    dataset_id=dataset_id,
-)
-
-
-# case 2: a dataset folder with 10 dataset files
-test_folder_dir = (
-    "/Users/lpeng/Documents/schematic_profiler/schematic_profiler/test_new_files"
-)
-dataset_id, project_id, asset_view_id = create_test_files(
-    num_file=100,
-    project_name="API manifest generate project 2",
-    test_folder_path=test_folder_dir,
-)
-print("dataset id", dataset_id)
-print("project id", project_id)
-print("asset view", asset_view_id)
+if __name__ == "__main__":
+    # delete what a fixture build leaves behind if it fails, registered fixtures are kept
+    with TeardownManager():
+        registry = FixtureRegistry()
+        schema_url = "https://raw.githubusercontent.com/Sage-Bionetworks/schematic/develop/tests/data/example.model.jsonld"
+        data_type = "BulkRNA-seqAssay"
+        num_time = 10
+        # case 1: a dataset folder with 10 dataset files
+        # case 2: a dataset folder with 100 dataset files
+        for num_files, project_name in [
+            (10, "API manifest generate project"),
+            (100, "API manifest generate project 2"),
+        ]:
+            ids = registry.ensure(
+                {"type": "files", "project_name": project_name, "num_files": num_files}
+            )
+            print("dataset id", ids["dataset_id"])
+            print("project id", ids["project_id"])
+            print("asset view", ids["view_id"])
 
-schema_url = "https://raw.githubusercontent.com/Sage-Bionetworks/schematic/develop/tests/data/example.model.jsonld"
-data_type = "BulkRNA-seqAssay"
-num_time = 10
-execute_manifest_generate_use_annotations_comparison(
-    schema_url=schema_url,
-    data_type=data_type,
-    num_time=num_time,
-    asset_view_id=asset_view_id,
-    dataset_id=dataset_id,
-)
+            execute_manifest_generate_use_annotations_comparison(
+                schema_url=schema_url,
+                data_type=data_type,
+                num_time=num_time,
+                asset_view_id=ids["view_id"],
+                dataset_id=ids["dataset_id"],
+            )
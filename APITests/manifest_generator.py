@@ -1,6 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Tuple
 import logging
+from scenario_matrix import load_scenario
 from utils import (
     Row,
     BASE_URL,
@@ -21,7 +22,7 @@ logger = logging.getLogger("manifest-generator")
 class GenerateManifest:
     url: str
     use_annotation: bool = False
-    token: str = StoreRuntime.get_access_token()
+    token: str = field(default_factory=StoreRuntime.get_access_token)
     title: str = "example"
     data_type: str = "Patient"
 
@@ -39,7 +40,7 @@ class GenerateManifest:
         """
         Generate a new manifest as a google sheet by using the example data model
         """
-        dt_string, time_diff, status_code_dict = send_request(
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
             base_url, self.params, CONCURRENT_THREADS
         )
 
@@ -53,6 +54,7 @@ class GenerateManifest:
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
     def generate_new_manifest_example_model_excel(self, output_format: str) -> Row:
@@ -61,11 +63,10 @@ class GenerateManifest:
         Args:
             output_format: specify the output of manifest. For this function, the output_format is excel
         """
-        params = self.params
-        params["output"] = output_format
+        params = {**self.params, "output": output_format}
 
-        dt_string, time_diff, status_code_dict = send_request(
-            base_url, self.params, CONCURRENT_THREADS
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
+            base_url, params, CONCURRENT_THREADS
         )
 
         return save_run_time_result(
@@ -78,13 +79,14 @@ class GenerateManifest:
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
     def generate_new_manifest_HTAN_google_sheet(self) -> Row:
         """
         Generate a new manifest as a google sheet by using the HTAN manifest
         """
-        dt_string, time_diff, status_code_dict = send_request(
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
             base_url, self.params, CONCURRENT_THREADS
         )
 
@@ -98,31 +100,38 @@ class GenerateManifest:
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
     def generate_existing_manifest_google_sheet(self) -> Row:
         """
         Generate a new manifest as a google sheet by using the existing manifest
         """
-        params = self.params
-        params["dataset_id"] = "syn51078367"
-        params["asset_view"] = "syn23643253"
+        # use the same existing manifest as the generate-existing-manifest scenario
+        scenario = load_scenario("generate-existing-manifest")
+        scenario_params = scenario.shared_params()
+        params = {
+            **self.params,
+            "dataset_id": scenario_params["dataset_id"],
+            "asset_view": scenario_params["asset_view"],
+        }
 
-        dt_string, time_diff, status_code_dict = send_request(
-            base_url, self.params, CONCURRENT_THREADS, self.headers
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
+            base_url, params, CONCURRENT_THREADS, self.headers
         )
 
         return save_run_time_result(
             endpoint_name="manifest/generate",
             description="Generating an existing manifest as a google sheet by using the example data model",
             data_schema="example data schema",
-            num_rows=542,  # number of rows of the existing manifest
+            num_rows=scenario.num_rows,  # number of rows of the existing manifest
             data_type=self.data_type,
             output_format="google sheet",
             dt_string=dt_string,
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
 
@@ -1,6 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Tuple
 import logging
+from scenario_matrix import load_scenario
 from utils import (
     Row,
     BASE_URL,
@@ -16,7 +17,7 @@ logger = logging.getLogger("manifest-storage")
 
 @dataclass
 class ManifestStorage:
-    token: str = StoreRuntime.get_access_token()
+    token: str = field(default_factory=StoreRuntime.get_access_token)
 
     def __post_init__(self):
         self.params = {}
@@ -24,34 +25,46 @@ class ManifestStorage:
 
 
 class RetrieveAssetView(ManifestStorage):
-    def retrieve_asset_view_as_json(self) -> Row:
+    def retrieve_asset_view(self, return_type: str) -> Row:
         """
-        Retrieve asset view table as a dataframe.
+        Retrieve asset view table. Responses are streamed and discarded, so that large asset views can be retrieved with high concurrency.
+        Args:
+            return_type (str): format of the asset view, "json" or "csv"
         """
         # define base_url
         base_url = f"{BASE_URL}/storage/assets/tables"
-        # define the asset view to retrieve
-        asset_view = "syn23643253"
-        params = self.params
-        params["asset_view"] = asset_view
-
-        # calculate latency for different return type
-        # TO DO: add csv
-        params["return_type"] = "json"
-        dt_string, time_diff, status_code_dict = send_request(
-            base_url, params, CONCURRENT_THREADS, headers=self.headers
+        # retrieve the asset view of the retrieve-asset-view scenario
+        asset_view = load_scenario("retrieve-asset-view").shared_params()["asset_view"]
+        params = {**self.params, "asset_view": asset_view, "return_type": return_type}
+
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
+            base_url, params, CONCURRENT_THREADS, headers=self.headers, stream=True
         )
 
         return save_run_time_result(
             endpoint_name="storage/assets/tables",
-            description=f"Retrieve asset view {asset_view} as a json",
+            description=f"Retrieve asset view {asset_view} as a {return_type}",
             asset_view=asset_view,
+            output_format=return_type,
             dt_string=dt_string,
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
+    def retrieve_asset_view_as_json(self) -> Row:
+        """
+        Retrieve asset view table as a json.
+        """
+        return self.retrieve_asset_view("json")
+
+    def retrieve_asset_view_as_csv(self) -> Row:
+        """
+        Retrieve asset view table as a csv.
+        """
+        return self.retrieve_asset_view("csv")
+
 
 class RestrieveProjectDataset(ManifestStorage):
     def retrieve_project_dataset_api_call(
@@ -64,13 +77,10 @@ class RestrieveProjectDataset(ManifestStorage):
             asset_view: ID of view listing all project data assets.
         """
         base_url = f"{BASE_URL}/storage/project/datasets"
-        params = self.params
-
         # update parameter
-        params["asset_view"] = asset_view
-        params["project_id"] = project_id
+        params = {**self.params, "asset_view": asset_view, "project_id": project_id}
 
-        dt_string, time_diff, status_code_dict = send_request(
+        dt_string, time_diff, status_code_dict, run_stats = send_request(
             base_url, params, CONCURRENT_THREADS, headers=self.headers
         )
 
@@ -82,39 +92,44 @@ class RestrieveProjectDataset(ManifestStorage):
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
     def retrieve_project_datasets_test(self) -> Row:
         """
         Retrieve all datasets under a given example project
         """
-        # define the asset view to retrieve
-        asset_view = "syn23643253"
-        project_id = "syn26251192"
+        # use the project and asset view of the retrieve-project-datasets scenario
+        params = load_scenario("retrieve-project-datasets").shared_params()
 
-        return self.retrieve_project_dataset_api_call(project_id, asset_view)
+        return self.retrieve_project_dataset_api_call(
+            params["project_id"], params["asset_view"]
+        )
 
     def retrieve_project_datasets_HTAN(self) -> Row:
         """
         Retrieve all datasets under a given testing HTAN project (used by DCA)
         """
-        # define the asset view to retrieve
-        asset_view = "syn20446927"  # htan asset view
-        project_id = "syn32596076"  # htan center c
+        # use the htan center c project and the htan asset view of the retrieve-project-datasets-htan scenario
+        params = load_scenario("retrieve-project-datasets-htan").shared_params()
 
-        return self.retrieve_project_dataset_api_call(project_id, asset_view)
+        return self.retrieve_project_dataset_api_call(
+            params["project_id"], params["asset_view"]
+        )
 
 
-def monitor_manifest_storage() -> Tuple[Row, Row, Row]:
+def monitor_manifest_storage() -> Tuple[Row, Row, Row, Row]:
     logger.info("Monitoring storage endpoints")
     retrieve_asset_view_class = RetrieveAssetView()
     row_one = retrieve_asset_view_class.retrieve_asset_view_as_json()
+    row_four = retrieve_asset_view_class.retrieve_asset_view_as_csv()
 
     retrieve_project_dataset = RestrieveProjectDataset()
     row_two = retrieve_project_dataset.retrieve_project_datasets_test()
     row_three = retrieve_project_dataset.retrieve_project_datasets_HTAN()
 
-    return row_one, row_two, row_three
+    return row_one, row_two, row_three, row_four
 
 
-monitor_manifest_storage()
+if __name__ == "__main__":
+    monitor_manifest_storage()
@@ -1,8 +1,9 @@
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable, Tuple
 from requests import Response
 import logging
+from scenario_matrix import load_scenario
 from utils import (
     Row,
     MultiRow,
@@ -10,6 +11,7 @@ from utils import (
     DATA_FLOW_SCHEMA_URL,
     EXAMPLE_SCHEMA_URL,
     StoreRuntime,
+    load_manifest_payload,
     save_run_time_result,
     send_manifest,
     send_post_request,
@@ -21,14 +23,19 @@ base_url = f"{BASE_URL}/model/submit"
 logger = logging.getLogger("manifest-submit")
 
 
+def submit_scenario_param(name: str) -> str:
+    # the monitors submit to the same dataset as the submit-example-manifest scenario
+    return load_scenario("submit-example-manifest").shared_params()[name]
+
+
 @dataclass
 class ManifestSubmit:
     url: str
-    dataset_id: str = "syn51376664"
-    asset_view: str = "syn51376649"
+    dataset_id: str = field(default_factory=lambda: submit_scenario_param("dataset_id"))
+    asset_view: str = field(default_factory=lambda: submit_scenario_param("asset_view"))
     restrict_rules: bool = False
     use_schema_label: bool = True
-    token: str = StoreRuntime.get_access_token()
+    token: str = field(default_factory=StoreRuntime.get_access_token)
 
     def __post_init__(self):
         self.params = {
@@ -65,12 +72,15 @@ class ManifestSubmit:
         combined_list = []
         for opt in data_type_lst:
             for record_type in record_type_lst:
-                params["data_type"] = opt
-                params["manifest_record_type"] = record_type
+                case_params = {
+                    **params,
+                    "data_type": opt,
+                    "manifest_record_type": record_type,
+                }
 
-                dt_string, time_diff, status_code_dict = send_post_request(
+                dt_string, time_diff, status_code_dict, run_stats = send_post_request(
                     base_url,
-                    params,
+                    case_params,
                     CONCURRENT_THREADS,
                     manifest_to_send_func,
                     file_path_manifest=file_path_manifest,
@@ -82,13 +92,11 @@ class ManifestSubmit:
                 else:
                     validate_setting = False
 
+                num_rows = load_manifest_payload(file_path_manifest).num_rows
                 if "example" in description:
                     data_schema = "example data schema"
-                    # TO DO: added way to automatically calculate the number of rows
-                    num_rows = 600
                 elif "dataflow" in description:
                     data_schema = "Data flow schema"
-                    num_rows = 30
                 else:
                     data_schema = None
 
@@ -97,13 +105,14 @@ class ManifestSubmit:
                     description=f"{description} {record_type} with validation set to {validate_setting}. The manifest has {num_rows} rows.",
                     data_schema=data_schema,
                     num_rows=num_rows,  # number of rows of manifest being submitted
-                    data_type=params["data_type"],
+                    data_type=case_params["data_type"],
                     restrict_rules=False,  # restrict_rules # TO DO: add restrict_rules = True?
                     dt_string=dt_string,
-                    manifest_record_type=params["manifest_record_type"],
+                    manifest_record_type=case_params["manifest_record_type"],
                     num_concurrent=CONCURRENT_THREADS,
                     latency=time_diff,
                     status_code_dict=status_code_dict,
+                    run_stats=run_stats,
                 )
                 combined_list.append(result)
                 time.sleep(2)
@@ -114,9 +123,8 @@ class ManifestSubmit:
         """
         submitting an example data manifest
         """
-        params = self.params
         # update parameter.
-        params["table_manipulation"] = "replace"
+        params = {**self.params, "table_manipulation": "replace"}
         data_type_lst = [None]
         record_type_lst = ["table_and_file", "file_only"]
 
@@ -133,9 +141,8 @@ class ManifestSubmit:
         )
 
     def submit_dataflow_manifest(self) -> MultiRow:
-        params = self.params
         # update parameter.
-        params["table_manipulation"] = "replace"
+        params = {**self.params, "table_manipulation": "replace"}
 
         # update parameter
         # temporary remove validation of data flow manifest
@@ -165,4 +172,5 @@ def monitor_manifest_submission() -> Tuple[Row, Row, Row]:
     return rows[0], rows[1], row_three[0]
 
 
-monitor_manifest_submission()
+if __name__ == "__main__":
+    monitor_manifest_submission()
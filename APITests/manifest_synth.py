@@ -0,0 +1,201 @@
+import csv
+import logging
+import math
+import os
+import random
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("manifest-synth")
+
+UUID_PATTERN = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+TRAILING_NUMBER_PATTERN = re.compile(r"^(.*?)(\d+)$")
+# validation is considered linear as long as the fitted exponent stays below this value
+SUPERLINEAR_EXPONENT = 1.1
+
+
+@dataclass
+class ManifestTemplate:
+    """
+    An existing manifest used as a template to generate synthetic manifests of any size.
+    Synthetic rows are drawn at random from the template rows, which keeps the distribution of every column
+    and the relationships between columns. Columns that identify a row are rewritten so that they stay unique.
+
+    Attributes:
+        header (List[str]): column names
+        rows (List[List[str]]): rows of the template
+        unique_columns (List[str]): columns whose values need to be unique in every manifest
+    """
+
+    header: List[str]
+    rows: List[List[str]]
+    unique_columns: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_csv(
+        cls, manifest_path: str, unique_columns: Optional[List[str]] = None
+    ) -> "ManifestTemplate":
+        """
+        Load a template from a manifest
+        Args:
+            manifest_path (str): file path of the manifest
+            unique_columns (Optional[List[str]]): columns to keep unique. Defaults to every column that has a distinct, non empty value on every row of the template.
+        Returns:
+            ManifestTemplate: the template
+        """
+        with open(manifest_path, newline="") as manifest:
+            reader = csv.reader(manifest)
+            header = next(reader)
+            rows = [row for row in reader if row]
+        if not rows:
+            raise ValueError(
+                f"{manifest_path} does not have any rows to use as a template"
+            )
+
+        if unique_columns is None:
+            unique_columns = []
+            for i, column in enumerate(header):
+                values = [row[i] if i < len(row) else "" for row in rows]
+                if len(rows) > 1 and all(values) and len(set(values)) == len(rows):
+                    unique_columns.append(column)
+        return cls(header, rows, unique_columns)
+
+    def _id_generators(self, rng: random.Random) -> Dict[int, "_UniqueValues"]:
+        generators = {}
+        for column in self.unique_columns:
+            i = self.header.index(column)
+            generators[i] = _UniqueValues([row[i] for row in self.rows], rng)
+        return generators
+
+    def iter_rows(self, num_rows: int, seed: int = 0) -> Iterator[List[str]]:
+        """
+        Generate synthetic rows one at a time
+        Args:
+            num_rows (int): number of rows to generate
+            seed (int): seed of the random generator, so that the same manifest can be generated again. Defaults to 0.
+        Returns:
+            Iterator[List[str]]: synthetic rows
+        """
+        rng = random.Random(seed)
+        generators = self._id_generators(rng)
+        for _ in range(num_rows):
+            row = list(rng.choice(self.rows))
+            for i, generator in generators.items():
+                row[i] = generator.next_value(row[i])
+            yield row
+
+    def write(self, output_path: str, num_rows: int, seed: int = 0) -> str:
+        """
+        Stream a synthetic manifest to a file, without building it in memory
+        Args:
+            output_path (str): file path of the synthetic manifest
+            num_rows (int): number of rows of the synthetic manifest
+            seed (int): seed of the random generator. Defaults to 0.
+        Returns:
+            str: file path of the synthetic manifest
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, "w", newline="") as manifest:
+            writer = csv.writer(manifest)
+            writer.writerow(self.header)
+            writer.writerows(self.iter_rows(num_rows, seed))
+        logger.info(f"wrote a synthetic manifest with {num_rows} rows to {output_path}")
+        return output_path
+
+
+class _UniqueValues:
+    """
+    Generate new unique values that look like the values of a column.
+    UUIDs are replaced by new UUIDs, values ending with a number get a new number, other values get a numbered suffix.
+    """
+
+    def __init__(self, template_values: List[str], rng: random.Random):
+        self._rng = rng
+        numbers = [
+            int(match.group(2))
+            for match in map(TRAILING_NUMBER_PATTERN.match, template_values)
+            if match
+        ]
+        self._counter = max(numbers, default=0)
+
+    def next_value(self, template_value: str) -> str:
+        if UUID_PATTERN.match(template_value):
+            return str(uuid.UUID(int=self._rng.getrandbits(128), version=4))
+        self._counter += 1
+        match = TRAILING_NUMBER_PATTERN.match(template_value)
+        if match:
+            return f"{match.group(1)}{self._counter}"
+        return f"{template_value}-{self._counter}"
+
+
+def generate_synthetic_manifests(
+    template_path: str,
+    sizes: Sequence[int],
+    output_dir: str = "synthetic_manifests",
+    seed: int = 0,
+) -> Dict[int, str]:
+    """
+    Generate synthetic manifests of different sizes from a template
+    Args:
+        template_path (str): file path of the manifest to use as a template
+        sizes (Sequence[int]): number of rows of every synthetic manifest
+        output_dir (str): folder to write the synthetic manifests to. Defaults to "synthetic_manifests".
+        seed (int): seed of the random generator. Defaults to 0.
+    Returns:
+        Dict[int, str]: file path of the synthetic manifest of every size
+    """
+    template = ManifestTemplate.from_csv(template_path)
+    name, _ = os.path.splitext(os.path.basename(template_path))
+    return {
+        size: template.write(
+            os.path.join(output_dir, f"{name}_{size}_rows.csv"), size, seed
+        )
+        for size in sizes
+    }
+
+
+def fit_power_law(
+    num_rows: Sequence[int], latencies: Sequence[float]
+) -> Tuple[float, float]:
+    """
+    Fit latency = coefficient * num_rows ^ exponent with a least squares fit in log-log space.
+    An exponent close to 1 means that latency grows linearly with the number of rows, a higher exponent means that it grows superlinearly.
+    Args:
+        num_rows (Sequence[int]): number of rows of every manifest
+        latencies (Sequence[float]): latency of every manifest
+    Returns:
+        Tuple[float, float]: the coefficient and the exponent
+    """
+    points = [
+        (math.log(rows), math.log(latency))
+        for rows, latency in zip(num_rows, latencies)
+        if rows > 0 and latency and latency > 0
+    ]
+    if len({x for x, _ in points}) < 2:
+        raise ValueError("fitting a curve needs latencies of at least two sizes")
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    exponent = sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+        (x - mean_x) ** 2 for x, _ in points
+    )
+    coefficient = math.exp(mean_y - exponent * mean_x)
+    return coefficient, exponent
+
+
+def describe_scaling(exponent: float) -> str:
+    """
+    Describe how latency grows with the number of rows
+    Args:
+        exponent (float): exponent returned by fit_power_law
+    Returns:
+        str: "sublinear", "linear" or "superlinear"
+    """
+    if exponent > SUPERLINEAR_EXPONENT:
+        return "superlinear"
+    if exponent < 2 - SUPERLINEAR_EXPONENT:
+        return "sublinear"
+    return "linear"
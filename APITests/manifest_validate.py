@@ -1,6 +1,7 @@
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Sequence, Tuple
 import logging
+from manifest_synth import describe_scaling, fit_power_law, generate_synthetic_manifests
 from utils import (
     BASE_URL,
     EXAMPLE_SCHEMA_URL,
@@ -8,12 +9,15 @@ from utils import (
     Row,
     MultiRow,
     StoreRuntime,
+    load_manifest_payload,
     save_run_time_result,
     send_manifest,
     send_post_request,
 )
 
 CONCURRENT_THREADS = 1
+# number of rows of the synthetic manifests used to measure how validation scales
+SYNTHETIC_MANIFEST_SIZES = (1000, 10000, 100000)
 
 base_url = f"{BASE_URL}/model/validate"
 
@@ -23,7 +27,7 @@ logger = logging.getLogger("manifest-validate")
 @dataclass
 class ManifestValidate:
     url: str
-    token: str = StoreRuntime.get_access_token()
+    token: str = field(default_factory=StoreRuntime.get_access_token)
 
     def __post_init__(self):
         self.params: dict = {
@@ -35,35 +39,36 @@ class ManifestValidate:
         """
         validating an example data manifest
         """
-        params = self.params
         # update parameter. For this example, validate a Patient manifest
-        params["data_type"] = "Patient"
+        params = {**self.params, "data_type": "Patient"}
+
+        file_path_manifest = "test_manifests/synapse_storage_manifest_patient.csv"
+        num_rows = load_manifest_payload(file_path_manifest).num_rows
 
         restrict_rules_opt = [True, False]
         # calculate latency of running /model/validate with different parameters
         combined_results = []
         for opt in restrict_rules_opt:
-            params["restrict_rules"] = opt
-
-            dt_string, time_diff, status_code_dict = send_post_request(
+            dt_string, time_diff, status_code_dict, run_stats = send_post_request(
                 base_url,
-                params,
+                {**params, "restrict_rules": opt},
                 CONCURRENT_THREADS,
                 send_manifest,
-                file_path_manifest="test_manifests/synapse_storage_manifest_patient.csv",
+                file_path_manifest=file_path_manifest,
             )
 
             result = save_run_time_result(
                 endpoint_name="model/validate",
-                description=f"Validate an example data model using the patient component with restrict_rules set to {opt}. The manifest has 600 rows.",
+                description=f"Validate an example data model using the patient component with restrict_rules set to {opt}. The manifest has {num_rows} rows.",
                 data_schema="example data schema",
-                num_rows=600,  # number of rows of the manifest being validated
+                num_rows=num_rows,  # number of rows of the manifest being validated
                 data_type=params["data_type"],
                 restrict_rules=opt,
                 dt_string=dt_string,
                 num_concurrent=CONCURRENT_THREADS,
                 latency=time_diff,
                 status_code_dict=status_code_dict,
+                run_stats=run_stats,
             )
 
             combined_results.append(result)
@@ -74,31 +79,99 @@ class ManifestValidate:
         """
         validating a HTAN manifest
         """
-        params = self.params
         # update parameter. For this example, validate a Biospecimen manifest
-        params["data_type"] = "Biospecimen"
+        params = {**self.params, "data_type": "Biospecimen"}
+        file_path_manifest = "test_manifests/synapse_storage_manifest_HTAN_HMS.csv"
+        num_rows = load_manifest_payload(file_path_manifest).num_rows
 
-        dt_string, time_diff, status_code_dict = send_post_request(
+        dt_string, time_diff, status_code_dict, run_stats = send_post_request(
             base_url,
             params,
             CONCURRENT_THREADS,
             send_manifest,
-            file_path_manifest="test_manifests/synapse_storage_manifest_HTAN_HMS.csv",
+            file_path_manifest=file_path_manifest,
         )
 
         return save_run_time_result(
             endpoint_name="model/validate",
-            description="Validate a HTAN data model using the biospecimen component with restrict_rules set to False. The manifest has around 700 rows.",
+            description=f"Validate a HTAN data model using the biospecimen component with restrict_rules set to False. The manifest has {num_rows} rows.",
             data_schema="HTAN data schema",
-            num_rows=773,  # number of rows of the manifest being validated
+            num_rows=num_rows,  # number of rows of the manifest being validated
             data_type=params["data_type"],  # data type
             restrict_rules=False,  # Restrict rules is set to False
             dt_string=dt_string,
             num_concurrent=CONCURRENT_THREADS,
             latency=time_diff,
             status_code_dict=status_code_dict,
+            run_stats=run_stats,
         )
 
+    def validate_synthetic_manifests(
+        self,
+        template_path: str,
+        data_type: str,
+        data_schema: str,
+        sizes: Sequence[int] = SYNTHETIC_MANIFEST_SIZES,
+    ) -> MultiRow:
+        """
+        validating synthetic manifests of increasing size generated from a template manifest,
+        and fitting how latency grows with the number of rows
+        Args:
+            template_path (str): file path of the manifest used as a template
+            data_type (str): data type/component of the manifest
+            data_schema (str): name of the data schema, for example "HTAN data schema"
+            sizes (Sequence[int]): number of rows of every synthetic manifest. Defaults to 1000, 10000 and 100000 rows.
+        """
+        params = {**self.params, "data_type": data_type, "restrict_rules": False}
+
+        combined_results = []
+        latencies = []
+        synthetic_manifests = generate_synthetic_manifests(template_path, sizes)
+        for num_rows, file_path_manifest in synthetic_manifests.items():
+            dt_string, time_diff, status_code_dict, run_stats = send_post_request(
+                base_url,
+                params,
+                CONCURRENT_THREADS,
+                send_manifest,
+                file_path_manifest=file_path_manifest,
+            )
+            # do not keep large manifests in memory once they are sent
+            load_manifest_payload.cache_clear()
+            latencies.append(run_stats.latency.percentile(50))
+
+            combined_results.append(
+                save_run_time_result(
+                    endpoint_name="model/validate",
+                    description=f"Validate a synthetic manifest generated from {template_path} using the {data_type} component with restrict_rules set to False. The manifest has {num_rows} rows.",
+                    data_schema=data_schema,
+                    num_rows=num_rows,
+                    data_type=data_type,
+                    restrict_rules=False,
+                    dt_string=dt_string,
+                    num_concurrent=CONCURRENT_THREADS,
+                    latency=time_diff,
+                    status_code_dict=status_code_dict,
+                    run_stats=run_stats,
+                )
+            )
+
+        # sizes whose requests all failed, for example with a 504, have no latency to fit
+        measured = [
+            (num_rows, latency)
+            for num_rows, latency in zip(synthetic_manifests, latencies)
+            if latency is not None
+        ]
+        if len(measured) < 2:
+            logger.warning(
+                f"could not fit how validation latency of {data_type} manifests grows with the number of rows: only {len(measured)} sizes were validated successfully"
+            )
+            return combined_results
+        _, exponent = fit_power_law(*zip(*measured))
+        logger.info(
+            f"validation latency of {data_type} manifests grows {describe_scaling(exponent)}ly with the number of rows (latency ~ rows^{exponent:.2f})"
+        )
+        return combined_results
+
 
 def monitor_manifest_validator() -> Tuple[Row, Row, Row]:
     logger.info("Monitoring manifest validation")
@@ -112,3 +185,23 @@ def monitor_manifest_validator() -> Tuple[Row, Row, Row]:
     row_three = vm_htan_manifest.validate_HTAN_data_manifest()
 
     return row_one, row_two, row_three
+
+
+def monitor_manifest_validation_scaling() -> MultiRow:
+    logger.info("Monitoring how manifest validation scales with the number of rows")
+    vm_example_manifest = ManifestValidate(EXAMPLE_SCHEMA_URL)
+    rows = vm_example_manifest.validate_synthetic_manifests(
+        "test_manifests/synapse_storage_manifest_patient.csv",
+        data_type="Patient",
+        data_schema="example data schema",
+    )
+
+    vm_htan_manifest = ManifestValidate(HTAN_SCHEMA_URL)
+    rows.extend(
+        vm_htan_manifest.validate_synthetic_manifests(
+            "test_manifests/synapse_storage_manifest_HTAN_HMS.csv",
+            data_type="Biospecimen",
+            data_schema="HTAN data schema",
+        )
+    )
+    return rows
@@ -0,0 +1,317 @@
+import argparse
+import logging
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import NormalDist
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlsplit
+
+import yaml
+
+logger = logging.getLogger("mock-server")
+
+DEFAULT_MOCK_CONFIG_FILE = "mock_server.yml"
+# size of the chunks response bodies are written in
+WRITE_CHUNK_SIZE = 64 * 1024
+# length of the queue of connections waiting to be accepted, so that bursts of new connections are not refused
+REQUEST_QUEUE_SIZE = 4096
+
+
+@dataclass
+class Distribution:
+    """
+    A distribution of values, for example of latencies in milliseconds or of payload sizes in bytes
+
+    Attributes:
+        type (str): "constant", "uniform", "normal", "lognormal" or "exponential"
+        params (dict): parameters of the distribution:
+            constant: value
+            uniform: low, high
+            normal: mean, sd (negative values are drawn as 0)
+            lognormal: median, sigma
+            exponential: mean
+    """
+
+    type: str
+    params: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_spec(cls, spec: Union[float, dict]) -> "Distribution":
+        """
+        Create a distribution from a declarative specification, for example
+        50
+        {"type": "uniform", "low": 10, "high": 90}
+        {"type": "lognormal", "median": 800, "sigma": 0.4}
+        Args:
+            spec (Union[float, dict]): a number for a constant value, or "type" and the parameters of the distribution
+        Returns:
+            Distribution: the distribution
+        """
+        if isinstance(spec, (int, float)):
+            return cls("constant", {"value": spec})
+        spec = dict(spec)
+        distribution_type = spec.pop("type", None)
+        if distribution_type not in _QUANTILES:
+            raise ValueError(
+                f"Unknown distribution type {distribution_type}. Please use one of {list(_QUANTILES)}"
+            )
+        return cls(distribution_type, spec)
+
+    def quantile(self, p: float) -> float:
+        """
+        Get the value at a given quantile
+        Args:
+            p (float): quantile between 0 and 1
+        Returns:
+            float: the value
+        """
+        return _QUANTILES[self.type](p, **self.params)
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draw a value
+        Args:
+            rng (random.Random): random generator
+        Returns:
+            float: the value
+        """
+        # inverse transform sampling, the quantile of a uniform value between 0 and 1 excluded
+        return self.quantile(rng.uniform(1e-9, 1 - 1e-9))
+
+
+_QUANTILES = {
+    "constant": lambda p, value: value,
+    "uniform": lambda p, low, high: low + (high - low) * p,
+    "normal": lambda p, mean, sd: max(NormalDist(mean, sd).inv_cdf(p), 0),
+    "lognormal": lambda p, median, sigma: median
+    * math.exp(sigma * NormalDist().inv_cdf(p)),
+    "exponential": lambda p, mean: -mean * math.log(1 - p),
+}
+
+
+@dataclass
+class Route:
+    """
+    Behaviour of an endpoint of the mock server
+
+    Attributes:
+        latency_ms (Distribution): time before the response is sent, in milliseconds
+        size_bytes (Distribution): size of the response body, in bytes
+        error_rate (float): fraction of requests that fail
+        error_status (List[int]): status codes of failed requests, drawn uniformly
+        chunked (bool): whether the body is sent with chunked transfer encoding instead of a content length
+    """
+
+    latency_ms: Distribution = field(
+        default_factory=lambda: Distribution("constant", {"value": 0})
+    )
+    size_bytes: Distribution = field(
+        default_factory=lambda: Distribution("constant", {"value": 2})
+    )
+    error_rate: float = 0
+    error_status: List[int] = field(default_factory=lambda: [500])
+    chunked: bool = False
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "Route":
+        """
+        Create a route from a declarative specification, for example
+        {"latency_ms": {"type": "lognormal", "median": 800, "sigma": 0.4}, "size_bytes": 2000, "error_rate": 0.01}
+        Args:
+            spec (dict): specification of the route. Latency and size are distribution specifications (see Distribution.from_spec).
+        Returns:
+            Route: the route
+        """
+        spec = dict(spec)
+        for key in ("latency_ms", "size_bytes"):
+            if key in spec:
+                spec[key] = Distribution.from_spec(spec[key])
+        return cls(**spec)
+
+
+def load_routes(path: str = DEFAULT_MOCK_CONFIG_FILE) -> Dict[str, Route]:
+    """
+    Load the routes of a yaml configuration file
+    Args:
+        path (str): file path of the configuration. Defaults to mock_server.yml.
+    Returns:
+        Dict[str, Route]: routes by path prefix
+    """
+    with open(path) as config_file:
+        config = yaml.safe_load(config_file)
+    return {
+        prefix: Route.from_dict(spec or {})
+        for prefix, spec in config.get("routes", {}).items()
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send small responses right away instead of waiting for the client to acknowledge the headers
+    disable_nagle_algorithm = True
+    server: "_MockHTTPServer"
+
+    def _respond(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        mock = self.server.mock
+        route = mock.match(urlsplit(self.path).path)
+        if route is None:
+            self._send(404, 0, False)
+            return
+        with mock.lock:
+            latency_s = route.latency_ms.sample(mock.rng) / 1000
+            size = int(route.size_bytes.sample(mock.rng))
+            failed = mock.rng.random() < route.error_rate
+            status = mock.rng.choice(route.error_status) if failed else 200
+            mock.requests += 1
+        if latency_s > 0:
+            time.sleep(latency_s)
+        self._send(status, size, route.chunked)
+
+    do_GET = do_POST = _respond
+
+    def _send(self, status: int, size: int, chunked: bool) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(size))
+        self.end_headers()
+        body = _body(size)
+        for start in range(0, size, WRITE_CHUNK_SIZE):
+            chunk = body[start : start + WRITE_CHUNK_SIZE]
+            if chunked:
+                self.wfile.write(b"%x\r\n" % len(chunk) + bytes(chunk) + b"\r\n")
+            else:
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+
+_filler = memoryview(b"")
+
+
+def _body(size: int) -> memoryview:
+    # an opaque body of the given size, sliced out of one buffer shared by all responses
+    global _filler
+    if len(_filler) < size:
+        _filler = memoryview(b"x" * size)
+    return _filler[:size]
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+    mock: "MockServer"
+
+
+class MockServer:
+    """
+    Local stand-in for the schematic API, to exercise the profiler without the real BASE_URL.
+    Every route has a scriptable latency distribution, error rate and payload size. Requests are matched to the route
+    with the longest path prefix, unknown paths get a 404. Connections are kept alive and served by one thread each.
+    Usage:
+        with MockServer(load_routes()) as server:
+            send_request(f"{server.url}/v1/model/validate", params, 10)
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Route],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            routes (Dict[str, Route]): routes by path prefix, for example "/v1/storage/"
+            host (str): address to listen on. Defaults to 127.0.0.1.
+            port (int): port to listen on. Defaults to 0, a free port.
+            seed (int, optional): seed of the random latencies, sizes and errors
+        """
+        # longest prefixes first
+        self.routes = dict(sorted(routes.items(), key=lambda item: -len(item[0])))
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self._server = _MockHTTPServer((host, port), _Handler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """base url of the server, without a trailing slash"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def match(self, path: str) -> Optional[Route]:
+        """
+        Find the route of a path
+        Args:
+            path (str): path of the request
+        Returns:
+            Optional[Route]: the route with the longest matching prefix, or None
+        """
+        for prefix, route in self.routes.items():
+            if path.startswith(prefix):
+                return route
+        return None
+
+    def start(self) -> "MockServer":
+        """serve requests from a background thread"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """serve requests from this thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """stop serving requests and close the socket"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a local mock of the schematic API. Point the profiler at it with SCHEMATIC_API_URL."
+    )
+    parser.add_argument(
+        "--config",
+        default=DEFAULT_MOCK_CONFIG_FILE,
+        help="yaml file of the routes of the server",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--seed", type=int, help="seed of the random latencies")
+    args = parser.parse_args()
+
+    server = MockServer(load_routes(args.config), args.host, args.port, args.seed)
+    logger.info(
+        f"serving the mock schematic api on {server.url}. Run the profiler with SCHEMATIC_API_URL={server.url}/v1"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
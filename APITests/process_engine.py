@@ -0,0 +1,180 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Tuple
+
+from requests import Response
+
+from latency_stats import NS_PER_S, RunStats
+from utils import (
+    ASYNC_ENGINE,
+    DEFAULT_TIMEOUT_S,
+    WARM_POOLED,
+    return_time_now,
+    send_post_request,
+    send_request,
+)
+
+logger = logging.getLogger("process-engine")
+
+
+def split_concurrency(concurrent_requests: int, num_processes: int) -> List[int]:
+    """
+    Split the concurrent requests as evenly as possible across processes
+    Args:
+        concurrent_requests (int): total number of concurrent requests
+        num_processes (int): number of processes
+    Returns:
+        List[int]: number of concurrent requests of every process. Processes without any request are left out.
+    """
+    share, remainder = divmod(concurrent_requests, num_processes)
+    shares = [share + 1 if i < remainder else share for i in range(num_processes)]
+    return [share for share in shares if share > 0]
+
+
+def merge_results(
+    results: List[Tuple[str, float, dict, RunStats]]
+) -> Tuple[float, dict, RunStats]:
+    """
+    Merge the results of workers that ran at the same time
+    Args:
+        results (List[Tuple[str, float, dict, RunStats]]): start time, duration, status codes and statistics of every worker
+    Returns:
+        time_diff (float): duration of the slowest worker.
+        all_status_code (dict): dict; status codes of all workers added up.
+        run_stats (RunStats): merged latency histograms and throughput of all workers.
+    """
+    time_diff = max(result[1] for result in results)
+    all_status_code = {}
+    run_stats = RunStats(connection_mode=results[0][3].connection_mode)
+    for _, _, status_code_dict, worker_stats in results:
+        for status_code, count in status_code_dict.items():
+            all_status_code[status_code] = all_status_code.get(status_code, 0) + count
+        run_stats.merge(worker_stats)
+    return time_diff, all_status_code, run_stats
+
+
+def _run_worker(kwargs: dict) -> Tuple[str, float, dict, RunStats]:
+    """
+    Run a share of the concurrent requests in a worker process
+    Args:
+        kwargs (dict): arguments of send_post_request if they include a manifest, otherwise arguments of send_request
+    Returns:
+        Tuple[str, float, dict, RunStats]: start time, duration, status codes and statistics of the worker
+    """
+    if "file_path_manifest" in kwargs:
+        return send_post_request(**kwargs)
+    return send_request(**kwargs)
+
+
+def _run_in_processes(
+    worker_kwargs: List[dict], url: str
+) -> Tuple[str, float, dict, RunStats]:
+    start_time = time.perf_counter_ns()
+    dt_string = return_time_now()
+    with ProcessPoolExecutor(max_workers=len(worker_kwargs)) as executor:
+        results = list(executor.map(_run_worker, worker_kwargs))
+    time_diff, all_status_code, run_stats = merge_results(results)
+    logger.info(
+        f"duration time of running {url} from {len(worker_kwargs)} processes: {round((time.perf_counter_ns() - start_time) / NS_PER_S, 2)}, "
+        f"{run_stats.achieved_concurrency} requests in flight, per request latency (ms): {run_stats.latency.summary()}"
+    )
+    return dt_string, time_diff, all_status_code, run_stats
+
+
+def cal_time_api_call_multiprocess(
+    url: str,
+    params: dict,
+    concurrent_requests: int,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    engine: str = ASYNC_ENGINE,
+    num_processes: int = None,
+    stream: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by sending get requests from several processes, so that parsing responses does not compete for one GIL.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        concurrent_requests (int): total number of concurrent requests, split across processes
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" or "cold". Defaults to "warm".
+        engine (str): engine used by every process, "threads" or "async". Defaults to "async".
+        num_processes (int, optional): number of processes. Defaults to the number of CPU cores.
+        stream (bool): if True, response bodies are read in chunks and discarded. Defaults to False.
+        timeout (float): deadline of every request, in seconds. Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time it took the slowest process to finish its requests.
+        all_status_code (dict): dict; a dictionary that records the status code of all processes.
+        run_stats (RunStats): merged latency and throughput of all processes.
+    """
+    worker_kwargs = [
+        dict(
+            base_url=url,
+            params=params,
+            concurrent_threads=share,
+            headers=headers,
+            connection_mode=connection_mode,
+            engine=engine,
+            stream=stream,
+            timeout=timeout,
+        )
+        for share in split_concurrency(
+            concurrent_requests, num_processes or os.cpu_count() or 1
+        )
+    ]
+    return _run_in_processes(worker_kwargs, url)
+
+
+def cal_time_api_call_post_request_multiprocess(
+    url: str,
+    params: dict,
+    concurrent_requests: int,
+    manifest_to_send_func: Callable[[str, dict], Response],
+    file_path_manifest: str,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    engine: str = ASYNC_ENGINE,
+    num_processes: int = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    calculate the latency of api calls by uploading manifests from several processes, so that building multipart bodies does not compete for one GIL.
+    Args:
+        url (str): the url that users want to access
+        params (dict): the parameters need to use for the request
+        concurrent_requests (int): total number of concurrent requests, split across processes
+        manifest_to_send_func (Callable): a function that sends a post request that upload a manifest to be sent. Must be defined at the top level of a module.
+        file_path_manifest (str): file path of the manifest to upload
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" or "cold". Defaults to "warm".
+        engine (str): engine used by every process, "threads" or "async". Defaults to "async".
+        num_processes (int, optional): number of processes. Defaults to the number of CPU cores.
+        timeout (float): deadline of every request, in seconds. Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time it took the slowest process to finish its requests.
+        all_status_code (dict): dict; a dictionary that records the status code of all processes.
+        run_stats (RunStats): merged latency and throughput of all processes.
+    """
+    worker_kwargs = [
+        dict(
+            base_url=url,
+            params=params,
+            concurrent_threads=share,
+            manifest_to_send_func=manifest_to_send_func,
+            file_path_manifest=file_path_manifest,
+            headers=headers,
+            connection_mode=connection_mode,
+            engine=engine,
+            timeout=timeout,
+        )
+        for share in split_concurrency(
+            concurrent_requests, num_processes or os.cpu_count() or 1
+        )
+    ]
+    return _run_in_processes(worker_kwargs, url)
@@ -0,0 +1,277 @@
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("regression")
+
+# trial latencies of every scenario, in milliseconds, by scenario name
+Samples = Dict[str, List[float]]
+
+DEFAULT_BASELINE_FILE = "baseline.json"
+# a slowdown is a regression if it is significant at this level...
+DEFAULT_ALPHA = 0.05
+# ...and if the median latency grew by at least this fraction
+DEFAULT_MIN_EFFECT = 0.1
+# scenarios with fewer samples on either side are not tested
+MIN_SAMPLES = 3
+# number of most recent samples of every scenario kept in the baseline
+DEFAULT_BASELINE_SIZE = 50
+
+
+def mann_whitney_u(
+    baseline: Sequence[float], current: Sequence[float]
+) -> Tuple[float, float]:
+    """
+    One-sided Mann-Whitney U test of whether the current values tend to be larger than the baseline values.
+    The p-value uses the normal approximation with tie and continuity corrections.
+    Args:
+        baseline (Sequence[float]): baseline values
+        current (Sequence[float]): current values
+    Returns:
+        Tuple[float, float]: U statistic of the current values and p-value
+    """
+    n1, n2 = len(current), len(baseline)
+    values = sorted(
+        [(value, True) for value in current] + [(value, False) for value in baseline]
+    )
+    # average the ranks of ties
+    rank_sum, tie_term, i = 0.0, 0, 0
+    while i < len(values):
+        j = i
+        while j < len(values) and values[j][0] == values[i][0]:
+            j += 1
+        rank = (i + j + 1) / 2
+        rank_sum += rank * sum(1 for _, is_current in values[i:j] if is_current)
+        tie_term += (j - i) ** 3 - (j - i)
+        i = j
+    u = rank_sum - n1 * (n1 + 1) / 2
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@dataclass
+class Comparison:
+    """
+    Result of comparing the current samples of a scenario with its baseline
+
+    Attributes:
+        name (str): name of the scenario
+        baseline_median (float, optional): median of the baseline samples, in milliseconds
+        current_median (float, optional): median of the current samples, in milliseconds
+        relative_change (float, optional): relative change of the median, for example 0.2 if it grew by 20%
+        p_value (float, optional): p-value of the Mann-Whitney U test. None if there were not enough samples.
+        probability_slower (float, optional): probability that a current sample is slower than a baseline sample (U / (n1 * n2))
+        regression (bool): whether the slowdown is both significant and large enough
+    """
+
+    name: str
+    baseline_median: Optional[float] = None
+    current_median: Optional[float] = None
+    relative_change: Optional[float] = None
+    p_value: Optional[float] = None
+    probability_slower: Optional[float] = None
+    regression: bool = False
+
+    def __str__(self) -> str:
+        if self.p_value is None:
+            return f"{self.name}: not enough samples to compare"
+        status = "REGRESSION" if self.regression else "ok"
+        return (
+            f"{self.name}: {status}, median {self.baseline_median:.2f} ms -> {self.current_median:.2f} ms "
+            f"({self.relative_change:+.1%}), p={self.p_value:.4f}, P(slower)={self.probability_slower:.2f}"
+        )
+
+
+def compare_scenario(
+    name: str,
+    baseline: Sequence[float],
+    current: Sequence[float],
+    alpha: float = DEFAULT_ALPHA,
+    min_effect: float = DEFAULT_MIN_EFFECT,
+) -> Comparison:
+    """
+    Compare the current samples of a scenario with its baseline
+    Args:
+        name (str): name of the scenario
+        baseline (Sequence[float]): baseline samples, in milliseconds
+        current (Sequence[float]): current samples, in milliseconds
+        alpha (float): significance level. Defaults to 0.05.
+        min_effect (float): smallest relative growth of the median that counts as a regression. Defaults to 0.1.
+    Returns:
+        Comparison: the comparison
+    """
+    if len(baseline) < MIN_SAMPLES or len(current) < MIN_SAMPLES:
+        return Comparison(name)
+    baseline_median = statistics.median(baseline)
+    current_median = statistics.median(current)
+    relative_change = (
+        current_median / baseline_median - 1 if baseline_median else math.inf
+    )
+    u, p_value = mann_whitney_u(baseline, current)
+    return Comparison(
+        name=name,
+        baseline_median=baseline_median,
+        current_median=current_median,
+        relative_change=relative_change,
+        p_value=p_value,
+        probability_slower=u / (len(baseline) * len(current)),
+        regression=p_value < alpha and relative_change >= min_effect,
+    )
+
+
+def compare(
+    baseline: Samples,
+    current: Samples,
+    alpha: float = DEFAULT_ALPHA,
+    min_effect: float = DEFAULT_MIN_EFFECT,
+) -> List[Comparison]:
+    """
+    Compare the current samples of every scenario with its baseline. Scenarios without a baseline are skipped.
+    Args:
+        baseline (Samples): baseline samples by scenario
+        current (Samples): current samples by scenario
+        alpha (float): significance level. Defaults to 0.05.
+        min_effect (float): smallest relative growth of the median that counts as a regression. Defaults to 0.1.
+    Returns:
+        List[Comparison]: a comparison for every scenario of the current run
+    """
+    return [
+        compare_scenario(name, baseline.get(name, []), samples, alpha, min_effect)
+        for name, samples in current.items()
+    ]
+
+
+def update_baseline(
+    baseline: Samples, current: Samples, size: int = DEFAULT_BASELINE_SIZE
+) -> Samples:
+    """
+    Add the current samples to the baseline, keeping the most recent samples of every scenario
+    Args:
+        baseline (Samples): baseline samples by scenario
+        current (Samples): current samples by scenario
+        size (int): number of samples kept for every scenario. Defaults to 50.
+    Returns:
+        Samples: the new baseline
+    """
+    updated = {name: list(samples) for name, samples in baseline.items()}
+    for name, samples in current.items():
+        updated[name] = (updated.get(name, []) + list(samples))[-size:]
+    return updated
+
+
+def accept_regressions(
+    baseline: Samples, current: Samples, names: Sequence[str]
+) -> Samples:
+    """
+    Accept intended slowdowns: the baseline of every given scenario is replaced by the current samples,
+    so that later runs are compared with the new latency instead of failing until the old samples age out
+    Args:
+        baseline (Samples): baseline samples by scenario
+        current (Samples): current samples by scenario
+        names (Sequence[str]): scenarios whose regression is accepted
+    Returns:
+        Samples: the new baseline
+    """
+    updated = {name: list(samples) for name, samples in baseline.items()}
+    for name in names:
+        updated[name] = list(current[name])
+    return updated
+
+
+def load_samples(path: str) -> Samples:
+    """
+    Load samples from a json file
+    Args:
+        path (str): file path
+    Returns:
+        Samples: samples by scenario. Empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as samples_file:
+        return json.load(samples_file)
+
+
+def save_samples(samples: Samples, path: str) -> None:
+    """
+    Save samples to a json file
+    Args:
+        samples (Samples): samples by scenario
+        path (str): file path
+    """
+    with open(path, "w") as samples_file:
+        json.dump(samples, samples_file, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the trial latencies of a run with a baseline and exit with 1 on a significant regression"
+    )
+    parser.add_argument("current", help="json file of the samples of the run")
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE_FILE, help="json file of the baseline"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=DEFAULT_ALPHA, help="significance level"
+    )
+    parser.add_argument(
+        "--min-effect",
+        type=float,
+        default=DEFAULT_MIN_EFFECT,
+        help="smallest relative growth of the median that counts as a regression",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="add the samples of the run to the baseline if there is no regression",
+    )
+    parser.add_argument(
+        "--accept",
+        action="store_true",
+        help="accept the regressions of this run as intended: replace the baseline of the regressed scenarios with the samples of the run, add the other scenarios to it and exit with 0",
+    )
+    args = parser.parse_args()
+
+    baseline = load_samples(args.baseline)
+    current = load_samples(args.current)
+    if not baseline:
+        logger.warning(f"no baseline found at {args.baseline}, nothing to compare")
+    comparisons = compare(baseline, current, args.alpha, args.min_effect)
+    for comparison in comparisons:
+        print(comparison)
+
+    regressions = [
+        comparison.name for comparison in comparisons if comparison.regression
+    ]
+    if args.accept:
+        if regressions:
+            logger.warning(
+                f"accepting the regression of {len(regressions)} scenarios: {regressions}"
+            )
+        others = {
+            name: samples
+            for name, samples in current.items()
+            if name not in regressions
+        }
+        baseline = accept_regressions(baseline, current, regressions)
+        save_samples(update_baseline(baseline, others), args.baseline)
+        sys.exit(0)
+    if regressions:
+        logger.error(
+            f"latency regressed in {len(regressions)} scenarios: {regressions}. If the slowdown is intended, run with --accept to reset their baseline."
+        )
+        sys.exit(1)
+    if args.update_baseline:
+        save_samples(update_baseline(baseline, current), args.baseline)
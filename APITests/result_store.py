@@ -0,0 +1,603 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from latency_stats import REQUEST_PHASES, LatencyHistogram, RunStats
+from utils import ROW_COLUMNS, MultiRow, Row, StoreRuntime, row_to_dict
+
+logger = logging.getLogger("result-store")
+
+DEFAULT_STORE_FILE = "results.db"
+# format of the start time of rows (see return_time_now) and of the started_at column, which sorts by time
+ROW_TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+STORE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# columns of rows that hold dictionaries or lists, stored as json
+JSON_COLUMNS = (
+    "service_time",
+    "phases",
+    "transfer",
+    "outcomes",
+    "failure_time",
+    "trials",
+    "overlapping",
+)
+BOOL_COLUMNS = ("restrict_rules",)
+
+# metrics of the samples table. Histograms are stored bucket by bucket, in nanoseconds (bytes for response_size)
+LATENCY = "latency"
+FAILURE_TIME = "failure_time"
+SERVICE_TIME = "service_time"
+RESPONSE_SIZE = "response_size"
+TRANSFER_RATE = "transfer_rate"
+# median latency of every trial, in milliseconds (see TrialResults.samples)
+TRIALS = "trials"
+
+# number of rows uploaded to synapse in one table store call
+DEFAULT_BATCH_SIZE = 50
+# seconds between two uploads of the background sink, unless it gets notified of new rows
+DEFAULT_FLUSH_INTERVAL_S = 30
+# a failed upload is retried this many times, waiting RETRY_DELAY_S, then twice as long after every attempt
+DEFAULT_MAX_RETRIES = 4
+RETRY_DELAY_S = 5
+
+
+def _quote(name: str) -> str:
+    # column names such as "values" are sql keywords
+    return f'"{name}"'
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    scenario TEXT NOT NULL,
+    session TEXT,
+    row_key TEXT,
+    started_at TEXT,
+    recorded_at REAL NOT NULL,
+    exported_at REAL,
+    num_columns INTEGER NOT NULL,
+    {", ".join(map(_quote, ROW_COLUMNS))}
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    metric TEXT NOT NULL,
+    "values" BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    PRIMARY KEY (run_id, metric)
+);
+"""
+# columns added to the runs table after it was first released, with their type
+_ADDED_COLUMNS = {"session": "TEXT", "row_key": "TEXT"}
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_scenario_started_at ON runs (scenario, started_at);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_session ON runs (session);
+CREATE UNIQUE INDEX IF NOT EXISTS runs_row_key ON runs (row_key);
+"""
+
+
+def _to_column(column: str, value: Any) -> Any:
+    if value is not None and column in JSON_COLUMNS:
+        return json.dumps(value)
+    return value
+
+
+def _from_column(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.loads(value)
+    if column in BOOL_COLUMNS:
+        return bool(value)
+    return value
+
+
+def _pack(values: Sequence[float]) -> bytes:
+    return array("d", values).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("d")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+def run_stats_histograms(run_stats: RunStats) -> Dict[str, LatencyHistogram]:
+    """
+    Get every histogram of the statistics of a run
+    Args:
+        run_stats (RunStats): statistics of a run
+    Returns:
+        Dict[str, LatencyHistogram]: non empty histograms by metric. Phases are named "phase:<phase>", for example "phase:ttfb".
+    """
+    histograms = {
+        LATENCY: run_stats.latency,
+        FAILURE_TIME: run_stats.failure_time,
+        SERVICE_TIME: run_stats.service_time,
+        RESPONSE_SIZE: run_stats.response_size,
+        TRANSFER_RATE: run_stats.transfer_rate,
+        **{f"phase:{phase}": run_stats.phases.get(phase) for phase in REQUEST_PHASES},
+    }
+    return {metric: histogram for metric, histogram in histograms.items() if histogram}
+
+
+class ResultStore:
+    """
+    Local, append-only store of result rows in a SQLite database.
+    Every row is stored with named columns, indexed by scenario and start time, along with the samples of the run:
+    every histogram of its statistics, bucket by bucket, and the latency of every trial. Samples are stored in columnar
+    form, as an array of values and an array of counts per run and metric.
+    Runs are kept locally whether or not they get exported to synapse, so that a run is never lost without a token or network.
+    Rows of a session are keyed by session and scenario, so that adding the same row twice is a no-op and an
+    interrupted session can be resumed. A store can be shared across threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_FILE):
+        """
+        Args:
+            path (str): file path of the database. It gets created if it does not exist. Defaults to results.db.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        existing = {
+            record[1] for record in self._connection.execute("PRAGMA table_info(runs)")
+        }
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._connection.execute(
+                    f"ALTER TABLE runs ADD COLUMN {column} {column_type}"
+                )
+        self._connection.executescript(_INDEXES)
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def append(
+        self,
+        row: Row,
+        scenario: str = None,
+        run_stats: RunStats = None,
+        trial_samples: Sequence[float] = None,
+        session: str = None,
+    ) -> int:
+        """
+        Add a result row
+        Args:
+            row (Row): the row, for example created by save_run_time_result
+            scenario (str, optional): name of the scenario. Defaults to the endpoint and description of the row.
+            run_stats (RunStats, optional): statistics of the run. If provided, its histograms get stored as samples.
+            trial_samples (Sequence[float], optional): median latency of every trial, in milliseconds
+            session (str, optional): id of the session that ran the scenario. If provided, the row is only added once per
+                session and scenario.
+        Returns:
+            int: id of the run in the store
+        """
+        with self._lock, self._connection:
+            return self._append(row, scenario, run_stats, trial_samples, session)
+
+    def append_rows(
+        self,
+        rows: MultiRow,
+        scenarios: Sequence[str] = None,
+        run_stats: Sequence[Optional[RunStats]] = None,
+        trial_samples: Sequence[Optional[Sequence[float]]] = None,
+        session: str = None,
+    ) -> List[int]:
+        """
+        Add several result rows at once
+        Args:
+            rows (MultiRow): the rows
+            scenarios (Sequence[str], optional): name of the scenario of every row
+            run_stats (Sequence[Optional[RunStats]], optional): statistics of the run of every row
+            trial_samples (Sequence[Optional[Sequence[float]]], optional): median latency of every trial of every row, in milliseconds
+            session (str, optional): id of the session that ran the scenarios
+        Returns:
+            List[int]: ids of the runs in the store
+        """
+        no_values = [None] * len(rows)
+        with self._lock, self._connection:
+            return [
+                self._append(*values, session)
+                for values in zip(
+                    rows,
+                    scenarios or no_values,
+                    run_stats or no_values,
+                    trial_samples or no_values,
+                )
+            ]
+
+    def _append(
+        self,
+        row: Row,
+        scenario: Optional[str],
+        run_stats: Optional[RunStats],
+        trial_samples: Optional[Sequence[float]],
+        session: Optional[str],
+    ) -> int:
+        values = row_to_dict(row)
+        if scenario is None:
+            scenario = f"{values['endpoint']}: {values['description']}"
+        row_key = None
+        if session is not None:
+            row_key = f"{session}/{scenario}"
+            existing = self._connection.execute(
+                "SELECT id FROM runs WHERE row_key = ?", (row_key,)
+            ).fetchone()
+            if existing:
+                logger.debug(f"{row_key} is already stored")
+                return existing[0]
+        started_at = None
+        if values.get("start_time"):
+            started_at = datetime.strptime(
+                values["start_time"], ROW_TIME_FORMAT
+            ).strftime(STORE_TIME_FORMAT)
+        columns = [
+            "scenario",
+            "session",
+            "row_key",
+            "started_at",
+            "recorded_at",
+            "num_columns",
+            *values,
+        ]
+        cursor = self._connection.execute(
+            f"INSERT INTO runs ({', '.join(map(_quote, columns))}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [
+                scenario,
+                session,
+                row_key,
+                started_at,
+                time.time(),
+                len(row),
+                *(_to_column(column, value) for column, value in values.items()),
+            ],
+        )
+        run_id = cursor.lastrowid
+
+        samples = []
+        if run_stats is not None:
+            for metric, histogram in run_stats_histograms(run_stats).items():
+                buckets = list(histogram.iter_values())
+                samples.append(
+                    (
+                        metric,
+                        [value for value, _ in buckets],
+                        [count for _, count in buckets],
+                    )
+                )
+        if trial_samples:
+            samples.append((TRIALS, list(trial_samples), [1] * len(trial_samples)))
+        self._connection.executemany(
+            'INSERT INTO samples (run_id, metric, "values", counts) VALUES (?, ?, ?, ?)',
+            [
+                (run_id, metric, _pack(values), _pack(counts))
+                for metric, values, counts in samples
+            ],
+        )
+        return run_id
+
+    def runs(
+        self,
+        scenario: str = None,
+        since: datetime = None,
+        until: datetime = None,
+        session: str = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get stored runs, oldest first
+        Args:
+            scenario (str, optional): only get the runs of this scenario
+            since (datetime, optional): only get the runs that started at or after this time
+            until (datetime, optional): only get the runs that started before this time
+            session (str, optional): only get the runs of this session
+        Returns:
+            List[Dict[str, Any]]: every run with its id, scenario, session, started_at and the columns of its row
+        """
+        conditions, parameters = [], []
+        if scenario is not None:
+            conditions.append("scenario = ?")
+            parameters.append(scenario)
+        if session is not None:
+            conditions.append("session = ?")
+            parameters.append(session)
+        if since is not None:
+            conditions.append("started_at >= ?")
+            parameters.append(since.strftime(STORE_TIME_FORMAT))
+        if until is not None:
+            conditions.append("started_at < ?")
+            parameters.append(until.strftime(STORE_TIME_FORMAT))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT * FROM runs {where} ORDER BY started_at, id", parameters
+            )
+            names = [description[0] for description in cursor.description]
+            return [
+                {name: _from_column(name, value) for name, value in zip(names, record)}
+                for record in cursor
+            ]
+
+    def scenarios(self) -> List[str]:
+        """names of all stored scenarios, sorted"""
+        with self._lock:
+            return [
+                name
+                for (name,) in self._connection.execute(
+                    "SELECT DISTINCT scenario FROM runs ORDER BY scenario"
+                )
+            ]
+
+    def finished_scenarios(self, session: str) -> Set[str]:
+        """
+        Get the scenarios that a session already stored, for example to resume it
+        Args:
+            session (str): id of the session
+        Returns:
+            Set[str]: names of the scenarios
+        """
+        with self._lock:
+            return {
+                name
+                for (name,) in self._connection.execute(
+                    "SELECT scenario FROM runs WHERE session = ?", (session,)
+                )
+            }
+
+    def trial_samples(self, session: str) -> Dict[str, List[float]]:
+        """
+        Get the latency of every trial of every scenario of a session, for example to compare them with a baseline
+        Args:
+            session (str): id of the session
+        Returns:
+            Dict[str, List[float]]: median latency of every trial in milliseconds, by scenario
+        """
+        return {
+            run["scenario"]: [value for value, _ in self.samples(run["id"], TRIALS)]
+            for run in self.runs(session=session)
+        }
+
+    def samples(self, run_id: int, metric: str = LATENCY) -> List[Tuple[float, int]]:
+        """
+        Get the samples of a run
+        Args:
+            run_id (int): id of the run
+            metric (str): name of the metric, for example "latency", "trials" or "phase:ttfb". Defaults to "latency".
+        Returns:
+            List[Tuple[float, int]]: every value and the number of times it was observed. Empty if the run has no such samples.
+        """
+        with self._lock:
+            record = self._connection.execute(
+                'SELECT "values", counts FROM samples WHERE run_id = ? AND metric = ?',
+                (run_id, metric),
+            ).fetchone()
+        if record is None:
+            return []
+        return list(zip(_unpack(record[0]), map(int, _unpack(record[1]))))
+
+    def histogram(
+        self, scenario: str, metric: str = LATENCY, since: datetime = None
+    ) -> LatencyHistogram:
+        """
+        Merge the samples of every run of a scenario into a histogram
+        Args:
+            scenario (str): name of the scenario
+            metric (str): name of a histogram metric, for example "latency" or "phase:ttfb". Defaults to "latency".
+            since (datetime, optional): only use the runs that started at or after this time
+        Returns:
+            LatencyHistogram: the merged samples
+        """
+        histogram = LatencyHistogram()
+        for run in self.runs(scenario, since):
+            for value, count in self.samples(run["id"], metric):
+                histogram.record(value, count)
+        return histogram
+
+    def to_dataframe(self, scenario: str = None, since: datetime = None):
+        """
+        Get stored runs as a pandas dataframe, for example to analyze their history
+        Args:
+            scenario (str, optional): only get the runs of this scenario
+            since (datetime, optional): only get the runs that started at or after this time
+        Returns:
+            pandas.DataFrame: a row for every run
+        """
+        import pandas as pd
+
+        return pd.DataFrame.from_records(self.runs(scenario, since))
+
+    def unexported_rows(self, limit: int = None) -> List[Tuple[int, Row]]:
+        """
+        Get the rows that have not been exported to synapse yet, oldest first
+        Args:
+            limit (int, optional): maximum number of rows. Defaults to all rows.
+        Returns:
+            List[Tuple[int, Row]]: id and row of every run that was not exported
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT * FROM runs WHERE exported_at IS NULL ORDER BY id LIMIT ?",
+                (-1 if limit is None else limit,),
+            )
+            names = [description[0] for description in cursor.description]
+            records = [dict(zip(names, record)) for record in cursor]
+        return [
+            (
+                run["id"],
+                [
+                    _from_column(column, run[column])
+                    for column in ROW_COLUMNS[: run["num_columns"]]
+                ],
+            )
+            for run in records
+        ]
+
+    def mark_exported(self, run_ids: Sequence[int]) -> None:
+        """
+        Mark runs as exported to synapse
+        Args:
+            run_ids (Sequence[int]): ids of the runs
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE runs SET exported_at = ? WHERE id = ?",
+                [(time.time(), run_id) for run_id in run_ids],
+            )
+
+    def export_synapse(self, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Upload the rows that have not been exported yet to the synapse table, in batches, and mark them as exported
+        Args:
+            batch_size (int): number of rows per upload. Defaults to 50.
+        Returns:
+            int: number of uploaded rows
+        """
+        return SynapseSink(self, batch_size=batch_size).flush()
+
+
+class SynapseSink:
+    """
+    Upload the new rows of a result store to synapse in the background, in batches.
+    A failed upload is retried with an exponential backoff. Rows are only marked as exported once their batch was stored,
+    so that the rows of a batch that kept failing are uploaded by the next flush, the next run or "result_store.py export".
+    Usage:
+        with SynapseSink(store) as sink:
+            store.append(row, ...)
+            sink.notify()
+    """
+
+    def __init__(
+        self,
+        store: ResultStore,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        upload: Callable[[MultiRow], None] = None,
+    ):
+        """
+        Args:
+            store (ResultStore): store to upload the rows of
+            batch_size (int): number of rows per upload. Defaults to 50.
+            interval_s (float): seconds between two uploads, unless notified of new rows. Defaults to 30.
+            max_retries (int): number of times a failed upload is retried. Defaults to 4.
+            upload (Callable, optional): function that uploads rows. Defaults to StoreRuntime.record_run_time_result_synapse.
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.max_retries = max_retries
+        self.upload = upload
+        self._new_rows = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="synapse-sink", daemon=True
+        )
+
+    def __enter__(self) -> "SynapseSink":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def notify(self) -> None:
+        """wake up the sink to upload new rows"""
+        self._new_rows.set()
+
+    def close(self) -> None:
+        """upload the remaining rows and stop the background thread"""
+        self._stopping.set()
+        self._new_rows.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._new_rows.wait(self.interval_s)
+            self._new_rows.clear()
+            self.flush()
+        # upload the rows added during the last flush
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Upload all rows that have not been exported yet
+        Returns:
+            int: number of uploaded rows
+        """
+        uploaded = 0
+        while True:
+            batch = self.store.unexported_rows(self.batch_size)
+            if not batch:
+                break
+            if not self._upload_with_retries([row for _, row in batch]):
+                break
+            self.store.mark_exported([run_id for run_id, _ in batch])
+            uploaded += len(batch)
+            logger.info(f"uploaded {len(batch)} rows to synapse")
+        return uploaded
+
+    def _upload_with_retries(self, rows: MultiRow) -> bool:
+        if self.upload is None:
+            self.upload = StoreRuntime().record_run_time_result_synapse
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.upload(rows)
+                return True
+            except Exception as err:
+                if attempt == self.max_retries:
+                    logger.error(
+                        f"could not upload {len(rows)} rows to synapse: {err!r}. They stay in the local store and can be exported later."
+                    )
+                    return False
+                delay = RETRY_DELAY_S * 2**attempt
+                logger.warning(
+                    f"uploading {len(rows)} rows to synapse failed: {err!r}. Retrying in {delay} seconds."
+                )
+                time.sleep(delay)
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Inspect or export the local result store"
+    )
+    parser.add_argument(
+        "command",
+        choices=("scenarios", "runs", "export", "migrate"),
+        help="scenarios: list stored scenarios. runs: print stored runs. export: upload new rows to synapse. migrate: add the missing columns to the synapse table.",
+    )
+    parser.add_argument(
+        "--store", default=DEFAULT_STORE_FILE, help="file path of the database"
+    )
+    parser.add_argument("--scenario", help="only print the runs of this scenario")
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="only print the runs that started at or after this time, for example 2024-01-31",
+    )
+    args = parser.parse_args()
+
+    with ResultStore(args.store) as store:
+        if args.command == "scenarios":
+            print("\n".join(store.scenarios()))
+        elif args.command == "runs":
+            print(store.to_dataframe(args.scenario, args.since).to_string())
+        elif args.command == "migrate":
+            print(f"Added columns {StoreRuntime().migrate_synapse_table()} to Synapse")
+        else:
+            print(f"Exported {store.export_synapse()} rows to Synapse")
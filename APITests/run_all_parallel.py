@@ -1,32 +1,138 @@
-import concurrent.futures
-from manifest_validate import monitor_manifest_validator
-from manifest_submit import monitor_manifest_submission
-from manifest_storage import monitor_manifest_storage
-from manifest_generator import monitor_manifest_generator
+import argparse
+import logging
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+
+from regression import save_samples
+from result_store import DEFAULT_STORE_FILE, ResultStore, SynapseSink
+from scenario_matrix import (
+    DEFAULT_SCENARIO_FILE,
+    ScenarioMatrix,
+    describe_plan,
+    run_scenario,
+    store_scenario_row,
+)
+from scheduler import (
+    DEFAULT_MAX_PARALLEL,
+    DEFAULT_MIX_SIZE,
+    DEFAULT_SETTLE_S,
+    ISOLATED,
+    SCHEDULE_MODES,
+    run_schedule,
+)
 from utils import StoreRuntime
 
+logger = logging.getLogger("run-all")
+
 
 if __name__ == "__main__":
-    all_rows_to_insert = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as e:
-        funcs = (
-            monitor_manifest_storage,
-            monitor_manifest_generator,
-            monitor_manifest_submission,
-            monitor_manifest_validator,
+    parser = argparse.ArgumentParser(
+        description="Run all performance scenarios and store their results locally and on synapse"
+    )
+    parser.add_argument(
+        "--config", default=DEFAULT_SCENARIO_FILE, help="yaml file of scenarios"
+    )
+    parser.add_argument(
+        "--only", nargs="+", help="names of the scenarios to run. Defaults to all."
+    )
+    parser.add_argument(
+        "--mode",
+        choices=SCHEDULE_MODES,
+        default=ISOLATED,
+        help="isolated: one scenario at a time. contention: fixed groups of scenarios at the same time. random: random order on several workers.",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE_S,
+        help="seconds to wait between scenarios or groups",
+    )
+    parser.add_argument(
+        "--mix-size",
+        type=int,
+        default=DEFAULT_MIX_SIZE,
+        help="number of scenarios per group in contention mode",
+    )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=DEFAULT_MAX_PARALLEL,
+        help="number of workers in random mode",
+    )
+    parser.add_argument("--seed", type=int, help="seed of the random order")
+    parser.add_argument(
+        "--samples",
+        help="json file to save the trial latencies of every scenario to, to compare them with a baseline",
+    )
+    parser.add_argument(
+        "--store",
+        default=DEFAULT_STORE_FILE,
+        help="file path of the local result store",
+    )
+    parser.add_argument(
+        "--synapse",
+        action="store_true",
+        help="also upload the rows to synapse in the background, as scenarios finish",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION",
+        help="resume an interrupted session: scenarios that it already stored are not run again",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the scenarios, then exit"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the cases that would run, then exit without sending requests",
+    )
+    args = parser.parse_args()
+
+    matrix = ScenarioMatrix.from_file(args.config)
+    if args.list:
+        print("\n".join(matrix.names()))
+        raise SystemExit
+    scenarios = matrix.plan(args.only)
+    if args.dry_run:
+        print("\n".join(describe_plan(scenarios)))
+        raise SystemExit
+    token = StoreRuntime.get_access_token()
+    session = args.resume or datetime.now().strftime("%Y%m%dT%H%M%S")
+    trial_results = {}
+    with ResultStore(args.store) as store:
+        finished = store.finished_scenarios(session)
+        if finished:
+            logger.info(
+                f"resuming session {session}: skipping {len(finished)} finished scenarios"
+            )
+        remaining = [
+            scenario for scenario in scenarios if scenario.name not in finished
+        ]
+        logger.info(
+            f"session {session}: running {len(remaining)} scenarios. Use --resume {session} to resume it if it gets interrupted."
         )
-        futures = [e.submit(func) for func in funcs]
-
-        for f in concurrent.futures.as_completed(futures):
-            row_list = f.result()
-
-            # save results to a new list
-            for row in row_list:
-                if isinstance(row, list) and row not in all_rows_to_insert:
-                    all_rows_to_insert.append(row)
-                else:
-                    print(f"can not insert {row}")
-    # store results on synapse
-    srt = StoreRuntime()
-    print(f"Inserting {len(all_rows_to_insert)} rows to Synapse")
-    srt.record_run_time_result_synapse(rows=all_rows_to_insert)
+
+        with SynapseSink(store) if args.synapse else nullcontext() as sink:
+
+            def checkpoint(scenario, row):
+                # store every row as soon as its scenario finishes, then upload it in the background
+                store_scenario_row(store, scenario, row, trial_results, session)
+                if sink:
+                    sink.notify()
+
+            run_schedule(
+                remaining,
+                mode=args.mode,
+                headers={"Authorization": f"Bearer {token}"},
+                settle_s=args.settle,
+                mix_size=args.mix_size,
+                max_parallel=args.max_parallel,
+                seed=args.seed,
+                run=partial(run_scenario, trial_results=trial_results),
+                on_row=checkpoint,
+            )
+
+        if args.samples:
+            save_samples(store.trial_samples(session), args.samples)
@@ -0,0 +1,474 @@
+import argparse
+import importlib
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import yaml
+
+from result_store import DEFAULT_STORE_FILE, ResultStore
+from trials import TrialResults, run_trials
+from utils import (
+    BASE_URL,
+    MultiRow,
+    Row,
+    StoreRuntime,
+    load_manifest_payload,
+    save_run_time_result,
+    send_manifest,
+    send_post_request,
+    send_request,
+)
+
+logger = logging.getLogger("scenario-matrix")
+
+# scenarios run by default
+DEFAULT_SCENARIO_FILE = "scenarios.yml"
+# axes that are not request parameters
+SCHEMA_AXIS = "schema"
+CONCURRENCY_AXIS = "concurrency"
+# monitors written as python functions instead of scenarios, as "module:function" by name.
+# Their modules are imported only when they are selected.
+MONITORS = {
+    "generate": "manifest_generator:monitor_manifest_generator",
+    "validate": "manifest_validate:monitor_manifest_validator",
+    "validate-scaling": "manifest_validate:monitor_manifest_validation_scaling",
+    "submit": "manifest_submit:monitor_manifest_submission",
+    "storage": "manifest_storage:monitor_manifest_storage",
+}
+
+
+@dataclass
+class Scenario:
+    """
+    One case of a scenario matrix: an endpoint with a fixed set of parameters
+
+    Attributes:
+        name (str): name of the case, made of the name of the scenario and the values of its axes
+        endpoint (str): endpoint relative to BASE_URL, for example "model/validate"
+        params (dict): parameters of the request
+        concurrency (int): number of concurrent requests
+        description (str): description of the case recorded in the result row
+        data_schema (str, optional): name of the data model, for example "example data schema"
+        manifest (str, optional): file path of a manifest to upload with a post request. Get requests are sent if None.
+        num_rows (int, optional): number of rows of the manifest. Defaults to the number of rows of the uploaded manifest.
+        options (dict): other arguments of send_request or send_post_request, for example engine, connection_mode or stream
+        pause_s (float): seconds to wait after the case, for example to let synapse settle after a submission
+        trials (int): number of measured runs of the case. Defaults to 1.
+        warmup (int): number of runs before the measured runs, whose results are discarded. Defaults to 0.
+        exclusive (bool): never run the case at the same time as another case (see scheduler.py), for example a submission
+            that changes a dataset shared with other cases. Defaults to False.
+    """
+
+    name: str
+    endpoint: str
+    params: dict
+    concurrency: int
+    description: str
+    data_schema: Optional[str] = None
+    manifest: Optional[str] = None
+    num_rows: Optional[int] = None
+    options: dict = field(default_factory=dict)
+    pause_s: float = 0
+    trials: int = 1
+    warmup: int = 0
+    exclusive: bool = False
+
+
+@dataclass
+class ScenarioSpec:
+    """
+    A scenario of the configuration file: an endpoint and the axes of parameters to run it with
+
+    Attributes:
+        name (str): name of the scenario
+        endpoint (str): endpoint relative to BASE_URL
+        axes (Dict[str, list]): values of every axis. "schema" and "concurrency" are special axes, the other axes are request parameters.
+        params (dict): parameters shared by all cases
+        description (str): description template. It can refer to any axis, to {schema_label} and to {num_rows}.
+        manifest (str, optional): file path of a manifest to upload with a post request
+        num_rows (int, optional): number of rows, for cases that do not upload a manifest
+        options (dict): other arguments of send_request or send_post_request
+        pause_s (float): seconds to wait after every case
+        trials (int): number of measured runs of every case
+        warmup (int): number of discarded runs before the measured runs of every case
+        exclusive (bool): never run the cases at the same time as another case
+    """
+
+    name: str
+    endpoint: str
+    axes: Dict[str, list] = field(default_factory=dict)
+    params: dict = field(default_factory=dict)
+    description: str = ""
+    manifest: Optional[str] = None
+    num_rows: Optional[int] = None
+    options: dict = field(default_factory=dict)
+    pause_s: float = 0
+    trials: int = 1
+    warmup: int = 0
+    exclusive: bool = False
+
+    def shared_params(self) -> dict:
+        """
+        Request parameters that are the same in every case of the scenario
+        Returns:
+            dict: a copy of params, with the axes of the request parameters that have a single value
+        """
+        return {
+            **self.params,
+            **{
+                axis: values[0]
+                for axis, values in self.axes.items()
+                if len(values) == 1 and axis not in (SCHEMA_AXIS, CONCURRENCY_AXIS)
+            },
+        }
+
+    def expand(self, schemas: Dict[str, dict], defaults: dict) -> List[Scenario]:
+        """
+        Create a case for every combination of the values of the axes
+        Args:
+            schemas (Dict[str, dict]): url and label of every data model that can be used on the schema axis
+            defaults (dict): default values of axes that the scenario does not set, for example concurrency
+        Returns:
+            List[Scenario]: the cases, in the order of the axes
+        """
+        axes = {**defaults, **self.axes}
+        unknown = set(axes.get(SCHEMA_AXIS, [])) - set(schemas)
+        if unknown:
+            raise ValueError(
+                f"Scenario {self.name} uses unknown schemas {sorted(unknown)}. Please add them to schemas."
+            )
+        num_rows = self.num_rows
+        if num_rows is None and self.manifest:
+            num_rows = load_manifest_payload(self.manifest).num_rows
+
+        cases = []
+        for values in itertools.product(*axes.values()):
+            case_axes = dict(zip(axes, values))
+            params = dict(self.params)
+            concurrency = case_axes.get(CONCURRENCY_AXIS, 1)
+            schema_label = None
+            for axis, value in case_axes.items():
+                if axis == SCHEMA_AXIS:
+                    params["schema_url"] = schemas[value]["url"]
+                    schema_label = schemas[value].get("label", value)
+                elif axis != CONCURRENCY_AXIS:
+                    params[axis] = value
+
+            label = ",".join(f"{axis}={value}" for axis, value in case_axes.items())
+            cases.append(
+                Scenario(
+                    name=f"{self.name}[{label}]",
+                    endpoint=self.endpoint,
+                    params=params,
+                    concurrency=concurrency,
+                    description=self.description.format(
+                        **{
+                            **params,
+                            **case_axes,
+                            "schema_label": schema_label,
+                            "num_rows": num_rows,
+                        }
+                    ),
+                    data_schema=schema_label,
+                    manifest=self.manifest,
+                    num_rows=num_rows,
+                    options=dict(self.options),
+                    pause_s=self.pause_s,
+                    trials=self.trials,
+                    warmup=self.warmup,
+                    exclusive=self.exclusive,
+                )
+            )
+        return cases
+
+
+@dataclass
+class ScenarioMatrix:
+    """
+    All scenarios of a configuration file
+
+    Attributes:
+        scenarios (List[ScenarioSpec]): the scenarios
+        schemas (Dict[str, dict]): url and label of every data model, by name
+        defaults (dict): default values of axes, for example {"concurrency": [1]}
+    """
+
+    scenarios: List[ScenarioSpec]
+    schemas: Dict[str, dict] = field(default_factory=dict)
+    defaults: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_SCENARIO_FILE) -> "ScenarioMatrix":
+        """
+        Load the scenarios of a yaml configuration file
+        Args:
+            path (str): file path of the configuration. Defaults to scenarios.yml.
+        Returns:
+            ScenarioMatrix: the scenarios
+        """
+        with open(path) as config_file:
+            config: Dict[str, Any] = yaml.safe_load(config_file)
+        return cls(
+            scenarios=[ScenarioSpec(**spec) for spec in config.get("scenarios", [])],
+            schemas=config.get("schemas", {}),
+            defaults=config.get("defaults", {}),
+        )
+
+    def spec(self, name: str) -> ScenarioSpec:
+        """
+        Find a scenario by name
+        Args:
+            name (str): name of the scenario
+        Returns:
+            ScenarioSpec: the scenario
+        """
+        for spec in self.scenarios:
+            if spec.name == name:
+                return spec
+        raise ValueError(f"Unknown scenario {name}")
+
+    def names(self) -> List[str]:
+        """
+        List the scenarios without expanding them
+        Returns:
+            List[str]: the name of every scenario, in the order of the configuration
+        """
+        return [spec.name for spec in self.scenarios]
+
+    def plan(self, names: Sequence[str] = None) -> List[Scenario]:
+        """
+        Expand the scenarios into cases
+        Args:
+            names (Sequence[str], optional): names of the scenarios to plan. Defaults to all scenarios.
+        Returns:
+            List[Scenario]: every case of the selected scenarios
+        """
+        specs = self.scenarios
+        if names:
+            unknown = set(names) - {spec.name for spec in specs}
+            if unknown:
+                raise ValueError(f"Unknown scenarios {sorted(unknown)}")
+            specs = [spec for spec in specs if spec.name in names]
+        return [
+            case for spec in specs for case in spec.expand(self.schemas, self.defaults)
+        ]
+
+
+def load_scenario(name: str, path: str = DEFAULT_SCENARIO_FILE) -> ScenarioSpec:
+    """
+    Load a single scenario, so that the monitors use the same synapse IDs as the scenarios
+    Args:
+        name (str): name of the scenario
+        path (str): file path of the configuration. Defaults to scenarios.yml.
+    Returns:
+        ScenarioSpec: the scenario
+    """
+    return ScenarioMatrix.from_file(path).spec(name)
+
+
+def describe_plan(cases: List[Scenario]) -> List[str]:
+    """
+    Describe cases without running them, for a dry run
+    Args:
+        cases (List[Scenario]): the cases
+    Returns:
+        List[str]: a line for every case: its name, endpoint, concurrency, trials and uploaded manifest
+    """
+    return [
+        f"{case.name}: {'POST' if case.manifest else 'GET'} {case.endpoint}, {case.concurrency} concurrent requests, "
+        f"{case.warmup} warmup + {case.trials} trials"
+        + (f", uploads {case.manifest}" if case.manifest else "")
+        for case in cases
+    ]
+
+
+def load_monitor(name: str) -> Callable[[], Sequence[Row]]:
+    """
+    Import a monitor of MONITORS
+    Args:
+        name (str): name of the monitor
+    Returns:
+        Callable[[], Sequence[Row]]: the monitor. It returns the rows of its cases.
+    """
+    if name not in MONITORS:
+        raise ValueError(
+            f"Unknown monitor {name}. Please use one of {sorted(MONITORS)}"
+        )
+    module_name, function_name = MONITORS[name].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def run_scenario(
+    scenario: Scenario,
+    headers: dict = None,
+    trial_results: Dict[str, TrialResults] = None,
+) -> Row:
+    """
+    Run one case and record its result. The statistics of all measured runs of the case are merged into one row,
+    followed by a summary of the median latency of every run with confidence intervals.
+    Args:
+        scenario (Scenario): the case to run
+        headers (dict): headers used for API requests. For example, authorization headers.
+        trial_results (Dict[str, TrialResults], optional): if provided, the results of the trials are stored under the name of the case,
+            for example to compare them with a baseline (see regression.py) or to store their samples (see result_store.py)
+    Returns:
+        Row: the result row
+    """
+    logger.info(f"running {scenario.name}")
+    url = f"{BASE_URL}/{scenario.endpoint}"
+    if scenario.manifest:
+        trial = partial(
+            send_post_request,
+            url,
+            scenario.params,
+            scenario.concurrency,
+            send_manifest,
+            file_path_manifest=scenario.manifest,
+            headers=headers,
+            **scenario.options,
+        )
+    else:
+        trial = partial(
+            send_request,
+            url,
+            scenario.params,
+            scenario.concurrency,
+            headers=headers,
+            **scenario.options,
+        )
+    results = run_trials(trial, trials=scenario.trials, warmup=scenario.warmup)
+    if trial_results is not None:
+        trial_results[scenario.name] = results
+    if scenario.pause_s:
+        time.sleep(scenario.pause_s)
+
+    params = scenario.params
+    return save_run_time_result(
+        endpoint_name=scenario.endpoint,
+        description=scenario.description,
+        data_schema=scenario.data_schema,
+        num_rows=scenario.num_rows,
+        data_type=params.get("data_type"),
+        output_format=params.get("output") or params.get("return_type"),
+        restrict_rules=params.get("restrict_rules"),
+        manifest_record_type=params.get("manifest_record_type"),
+        asset_view=params.get("asset_view"),
+        dt_string=results.dt_string,
+        num_concurrent=scenario.concurrency,
+        latency=results.time_diff,
+        status_code_dict=results.status_code_dict,
+        run_stats=results.run_stats,
+    ) + [results.summary()]
+
+
+def run_scenarios(scenarios: List[Scenario], headers: dict = None) -> MultiRow:
+    """
+    Run cases one after another
+    Args:
+        scenarios (List[Scenario]): the cases to run
+        headers (dict): headers used for API requests. For example, authorization headers.
+    Returns:
+        MultiRow: a result row for every case
+    """
+    return [run_scenario(scenario, headers) for scenario in scenarios]
+
+
+def store_scenario_row(
+    store: ResultStore,
+    scenario: Scenario,
+    row: Row,
+    trial_results: Dict[str, TrialResults],
+    session: str = None,
+) -> int:
+    """
+    Add the row of a case to a local result store, along with the samples of its trials
+    Args:
+        store (ResultStore): the result store
+        scenario (Scenario): the case
+        row (Row): the row of the case
+        trial_results (Dict[str, TrialResults]): results of the trials of cases, by name (see run_scenario)
+        session (str, optional): id of the session that ran the case, to resume it later
+    Returns:
+        int: id of the run in the store
+    """
+    results = trial_results.get(scenario.name)
+    return store.append(
+        row,
+        scenario=scenario.name,
+        run_stats=results and results.run_stats,
+        trial_samples=results and results.samples,
+        session=session,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the performance scenarios of a configuration file"
+    )
+    parser.add_argument(
+        "config",
+        nargs="?",
+        default=DEFAULT_SCENARIO_FILE,
+        help="yaml file of scenarios",
+    )
+    parser.add_argument(
+        "--only", nargs="+", help="names of the scenarios to run. Defaults to all."
+    )
+    parser.add_argument(
+        "--monitor",
+        nargs="+",
+        choices=sorted(MONITORS),
+        default=[],
+        help="also run monitors written as python functions",
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="list the scenarios and monitors, then exit",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the cases that would run, then exit without sending requests",
+    )
+    parser.add_argument(
+        "--store",
+        default=DEFAULT_STORE_FILE,
+        help="file path of the local result store",
+    )
+    parser.add_argument(
+        "--synapse",
+        action="store_true",
+        help="also export the new rows of the local result store to synapse",
+    )
+    args = parser.parse_args()
+
+    matrix = ScenarioMatrix.from_file(args.config)
+    if args.list:
+        print("\n".join(matrix.names()))
+        print("\n".join(f"monitor {name}: {MONITORS[name]}" for name in MONITORS))
+        raise SystemExit
+    cases = matrix.plan(args.only)
+    if args.dry_run:
+        print("\n".join(describe_plan(cases)))
+        print("\n".join(f"monitor {name}" for name in args.monitor))
+        raise SystemExit
+    logger.info(f"planned {len(cases)} cases")
+    token = StoreRuntime.get_access_token()
+    trial_results = {}
+    with ResultStore(args.store) as store:
+        # store every row as soon as its case finishes
+        for case in cases:
+            row = run_scenario(
+                case, {"Authorization": f"Bearer {token}"}, trial_results
+            )
+            store_scenario_row(store, case, row, trial_results)
+        for name in args.monitor:
+            # every row is stored under its own endpoint and description
+            store.append_rows(list(load_monitor(name)()))
+        if args.synapse:
+            store.export_synapse()
@@ -0,0 +1,168 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+
+from scenario_matrix import Scenario, run_scenario
+from utils import MultiRow, Row
+
+logger = logging.getLogger("scheduler")
+
+# schedule modes
+# isolated: one scenario at a time, with a settle gap between scenarios
+# contention: fixed groups of cases of different scenarios run at the same time, with a settle gap between groups
+# random: scenarios run in a random order on a fixed number of workers, to cancel out order effects across nights
+# In contention and random mode, exclusive cases (see Scenario.exclusive) run alone once the others are done.
+ISOLATED = "isolated"
+CONTENTION = "contention"
+RANDOMIZED = "random"
+SCHEDULE_MODES = (ISOLATED, CONTENTION, RANDOMIZED)
+
+# seconds to wait between scenarios (or groups of scenarios), so that the server recovers from the previous load
+DEFAULT_SETTLE_S = 5
+# number of scenarios run at the same time in contention mode
+DEFAULT_MIX_SIZE = 2
+# number of scenarios run at the same time in random mode
+DEFAULT_MAX_PARALLEL = 4
+
+
+class InFlightScenarios:
+    """
+    Keep track of the scenarios that run at the same time. For every scenario, remember all the
+    other scenarios that were in flight at any point while it ran. It is safe to share across threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._overlaps: Dict[str, Set[str]] = {}
+
+    def start(self, name: str) -> None:
+        """
+        Mark a scenario as in flight
+        Args:
+            name (str): name of the scenario
+        """
+        with self._lock:
+            for overlaps in self._overlaps.values():
+                overlaps.add(name)
+            self._overlaps[name] = set(self._overlaps)
+
+    def finish(self, name: str) -> List[str]:
+        """
+        Mark a scenario as done
+        Args:
+            name (str): name of the scenario
+        Returns:
+            List[str]: names of the other scenarios that were in flight while it ran, sorted
+        """
+        with self._lock:
+            return sorted(self._overlaps.pop(name))
+
+
+def contention_groups(scenarios: List[Scenario], mix_size: int) -> List[List[int]]:
+    """
+    Group cases to run at the same time in contention mode. The cases of one scenario are planned next to each other,
+    so groups take one case of up to mix_size different scenarios, round-robin, and never two cases of the same scenario.
+    Exclusive cases get a group of their own, after the others.
+    Args:
+        scenarios (List[Scenario]): cases to group, for example the cases planned by ScenarioMatrix
+        mix_size (int): maximum number of cases of a group
+    Returns:
+        List[List[int]]: indexes of the cases of every group
+    """
+    queues: Dict[str, List[int]] = {}
+    exclusive = []
+    for index, scenario in enumerate(scenarios):
+        if scenario.exclusive:
+            exclusive.append([index])
+        else:
+            # case names are the name of their scenario followed by the values of its axes in brackets
+            queues.setdefault(scenario.name.partition("[")[0], []).append(index)
+    groups = []
+    names = list(queues)
+    while names:
+        mixed, names = names[:mix_size], names[mix_size:]
+        groups.append([queues[name].pop(0) for name in mixed])
+        # move the scenarios of the group to the back, so that every scenario gets mixed with different ones
+        names = [name for name in names + mixed if queues[name]]
+    return groups + exclusive
+
+
+def run_schedule(
+    scenarios: List[Scenario],
+    mode: str = ISOLATED,
+    headers: dict = None,
+    settle_s: float = DEFAULT_SETTLE_S,
+    mix_size: int = DEFAULT_MIX_SIZE,
+    max_parallel: int = DEFAULT_MAX_PARALLEL,
+    seed: Optional[int] = None,
+    run: Callable[[Scenario, dict], Row] = run_scenario,
+    on_row: Callable[[Scenario, Row], None] = None,
+) -> MultiRow:
+    """
+    Run scenarios against the same schematic instance in a controlled way.
+    The schedule mode and the names of the other scenarios that were in flight are added to the row of every scenario,
+    so that results of different nights can be compared.
+    Args:
+        scenarios (List[Scenario]): scenarios to run, for example the cases planned by ScenarioMatrix
+        mode (str): "isolated", "contention" or "random". Defaults to "isolated".
+        headers (dict): headers used for API requests. For example, authorization headers.
+        settle_s (float): seconds to wait between scenarios in isolated mode and between groups in contention mode. Defaults to 5.
+        mix_size (int): number of scenarios run at the same time in contention mode (see contention_groups). Defaults to 2.
+        max_parallel (int): number of scenarios run at the same time in random mode. Defaults to 4.
+        seed (int, optional): seed of the random order. A seed is drawn and logged if None, so that an order can be replayed.
+        run (Callable): function that runs one scenario and returns its row. Defaults to run_scenario.
+        on_row (Callable, optional): function called with every scenario and its row as soon as the scenario finishes,
+            for example to checkpoint the row. It gets called from the worker threads.
+    Returns:
+        MultiRow: the row of every scenario, in the order the scenarios were given
+    """
+    if mode not in SCHEDULE_MODES:
+        raise ValueError(
+            f"Unknown schedule mode {mode}. Please use one of {SCHEDULE_MODES}"
+        )
+    in_flight = InFlightScenarios()
+    rows: Dict[int, Row] = {}
+
+    def run_tracked(index: int) -> None:
+        scenario = scenarios[index]
+        in_flight.start(scenario.name)
+        try:
+            row = run(scenario, headers)
+        finally:
+            overlapping = in_flight.finish(scenario.name)
+        rows[index] = row + [mode, overlapping]
+        if on_row is not None:
+            on_row(scenario, rows[index])
+
+    indexes = list(range(len(scenarios)))
+    # whether scenarios already ran, so that the next group waits for the server to settle
+    ran = False
+    if mode == RANDOMIZED:
+        if seed is None:
+            seed = random.randrange(2**32)
+        random.Random(seed).shuffle(indexes)
+        shared = [index for index in indexes if not scenarios[index].exclusive]
+        logger.info(
+            f"running {len(shared)} scenarios in a random order (seed {seed}) on {max_parallel} workers"
+        )
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            # raise the first error, if any
+            list(executor.map(run_tracked, shared))
+        ran = bool(shared)
+        groups = [[index] for index in indexes if scenarios[index].exclusive]
+    elif mode == CONTENTION:
+        groups = contention_groups(scenarios, mix_size)
+    else:
+        groups = [[index] for index in indexes]
+    for group in groups:
+        if ran and settle_s:
+            time.sleep(settle_s)
+        logger.info(f"running {', '.join(scenarios[index].name for index in group)}")
+        with ThreadPoolExecutor(max_workers=len(group)) as executor:
+            list(executor.map(run_tracked, group))
+        ran = True
+
+    return [rows[index] for index in range(len(scenarios))]
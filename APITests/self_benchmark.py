@@ -0,0 +1,175 @@
+import argparse
+import logging
+import multiprocessing
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from latency_stats import NS_PER_MS, REPORTED_PERCENTILES
+from load_profiles import LoadProfile, run_load_profile
+from mock_server import Distribution, MockServer, Route
+from trials import run_trials
+from utils import ENGINES, send_request
+
+logger = logging.getLogger("self-benchmark")
+
+# routes of the mock server used by the self-benchmark
+# /constant: every response takes exactly CONSTANT_LATENCY_MS, so that anything above it is overhead of the profiler
+# /lognormal: latencies with known percentiles, to check the percentiles reported by the profiler
+# /zero: responses are sent right away, to find the highest request rate the profiler can drive
+CONSTANT_LATENCY_MS = 50
+LOGNORMAL_LATENCY = {"type": "lognormal", "median": 50, "sigma": 0.5}
+SELF_BENCHMARK_ROUTES = {
+    "/constant": {"latency_ms": CONSTANT_LATENCY_MS},
+    "/lognormal": {"latency_ms": LOGNORMAL_LATENCY},
+    "/zero": {"latency_ms": 0},
+}
+# concurrency levels of the max request rate search, each held for a few seconds
+MAX_RPS_LEVELS = [1, 4, 16, 64, 256]
+DEFAULT_STAGE_DURATION_S = 5
+
+
+def _serve(routes: Dict[str, dict], port_queue: multiprocessing.Queue) -> None:
+    server = MockServer(
+        {prefix: Route.from_dict(spec) for prefix, spec in routes.items()}
+    )
+    port_queue.put(server.url)
+    server.serve_forever()
+
+
+def start_server_process(
+    routes: Dict[str, dict] = SELF_BENCHMARK_ROUTES,
+) -> Tuple[multiprocessing.Process, str]:
+    """
+    Start a mock server in its own process, so that it does not compete with the profiler for the GIL
+    Args:
+        routes (Dict[str, dict]): specification of every route, by path prefix (see Route.from_dict)
+    Returns:
+        Tuple[multiprocessing.Process, str]: the server process, to terminate when done, and the base url of the server
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve, args=(routes, port_queue), daemon=True
+    )
+    process.start()
+    return process, port_queue.get(timeout=30)
+
+
+def measure_overhead(
+    url: str, engine: str, concurrency: int, trials: int = 10
+) -> Dict[str, Optional[float]]:
+    """
+    Measure the latency the profiler adds on top of the server: requests to a route that always takes CONSTANT_LATENCY_MS
+    Args:
+        url (str): base url of the mock server
+        engine (str): load engine, "threads" or "async"
+        concurrency (int): number of concurrent requests
+        trials (int): number of batches of requests. Defaults to 10.
+    Returns:
+        Dict[str, Optional[float]]: p50 and p99 of the reported latency minus CONSTANT_LATENCY_MS, in milliseconds
+    """
+    results = run_trials(
+        partial(send_request, f"{url}/constant", {}, concurrency, engine=engine),
+        trials=trials,
+        outlier_iqr_factor=None,
+    )
+    latency = results.run_stats.latency
+    return {
+        f"p{p}_overhead_ms": round(
+            latency.percentile(p) / NS_PER_MS - CONSTANT_LATENCY_MS, 2
+        )
+        for p in (50, 99)
+    }
+
+
+def measure_accuracy(
+    url: str, engine: str, concurrency: int, trials: int = 20
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the percentiles reported by the profiler with the percentiles of the latency distribution of the server
+    Args:
+        url (str): base url of the mock server
+        engine (str): load engine, "threads" or "async"
+        concurrency (int): number of concurrent requests
+        trials (int): number of batches of requests. Defaults to 20.
+    Returns:
+        Dict[str, Dict[str, float]]: expected and reported value of every reported percentile, in milliseconds
+    """
+    results = run_trials(
+        partial(send_request, f"{url}/lognormal", {}, concurrency, engine=engine),
+        trials=trials,
+        outlier_iqr_factor=None,
+    )
+    distribution = Distribution.from_spec(LOGNORMAL_LATENCY)
+    return {
+        f"p{p}": {
+            "expected_ms": round(distribution.quantile(p / 100), 2),
+            "reported_ms": round(
+                results.run_stats.latency.percentile(p) / NS_PER_MS, 2
+            ),
+        }
+        for p in REPORTED_PERCENTILES
+    }
+
+
+def measure_max_rps(
+    url: str,
+    levels: List[int] = MAX_RPS_LEVELS,
+    stage_duration_s: float = DEFAULT_STAGE_DURATION_S,
+) -> Dict[str, Optional[float]]:
+    """
+    Find the highest request rate the async engine can drive on this machine, with a step load profile against a route that answers right away
+    Args:
+        url (str): base url of the mock server
+        levels (List[int]): concurrency of every stage. Defaults to 1, 4, 16, 64 and 256.
+        stage_duration_s (float): duration of every stage, in seconds. Defaults to 5.
+    Returns:
+        Dict[str, Optional[float]]: highest throughput of any stage (requests per second) and the concurrency at which throughput stopped rising
+    """
+    result = run_load_profile(
+        LoadProfile.step_ladder(levels, stage_duration_s), f"{url}/zero", {}
+    )
+    return {
+        "max_rps": max(stage.run_stats.throughput or 0 for stage in result.stages),
+        "saturation_concurrency": result.saturation_concurrency(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the profiler itself against a local mock server: its overhead, the accuracy of its percentiles and its highest request rate"
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=list(ENGINES),
+        help="load engines to measure",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="concurrent requests of the overhead and accuracy runs",
+    )
+    parser.add_argument(
+        "--stage-duration",
+        type=float,
+        default=DEFAULT_STAGE_DURATION_S,
+        help="seconds of every stage of the max request rate search",
+    )
+    args = parser.parse_args()
+
+    server, url = start_server_process()
+    try:
+        for engine in args.engines:
+            logger.info(
+                f"{engine} engine overhead: {measure_overhead(url, engine, args.concurrency)}"
+            )
+            logger.info(
+                f"{engine} engine percentiles: {measure_accuracy(url, engine, args.concurrency)}"
+            )
+        logger.info(
+            f"highest request rate of the async engine: {measure_max_rps(url, stage_duration_s=args.stage_duration)}"
+        )
+    finally:
+        server.terminate()
@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set
+
+from fixtures import DEFAULT_FIXTURE_REGISTRY_FILE, FixtureRegistry
+from test_resources_utils import (
+    DEFAULT_MAX_STORE_RETRIES,
+    DEFAULT_STORE_BACKOFF_S,
+    add_created_entity_listener,
+    call_with_backoff,
+    remove_created_entity_listener,
+    use_store_executor,
+)
+from utils import get_synapse_client
+
+logger = logging.getLogger("teardown")
+
+# ledgers of the entities created by every run, one json line per entity
+DEFAULT_LEDGER_DIR = "teardown_ledgers"
+# number of entities deleted at the same time
+DEFAULT_MAX_CONCURRENT_DELETES = 25
+# types of entities listed when a fixture is torn down
+CHILD_TYPES = ["folder", "file", "entityview", "table"]
+
+# id of every entity, mapped to the id of its parent (None for projects)
+Entities = Dict[str, Optional[str]]
+
+
+class Ledger:
+    """
+    Append-only record of the entities created by a run, written as soon as every entity is created,
+    so that the entities of a run that crashed can still be found and deleted later
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): file path of the ledger, one json line per entity
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, entity_id: str, parent_id: Optional[str]) -> None:
+        """
+        Record a new entity
+        Args:
+            entity_id (str): synapse id of the entity
+            parent_id (Optional[str]): synapse id of its parent
+        """
+        line = json.dumps({"id": entity_id, "parent_id": parent_id}) + "\n"
+        with self._lock, open(self.path, "a") as ledger_file:
+            ledger_file.write(line)
+
+    def entities(self) -> Entities:
+        """
+        Read the recorded entities
+        Returns:
+            Entities: parent of every entity. Empty if the ledger does not exist.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as ledger_file:
+            records = [json.loads(line) for line in ledger_file if line.strip()]
+        return {record["id"]: record["parent_id"] for record in records}
+
+    def rewrite(self, entities: Entities) -> None:
+        """
+        Replace the recorded entities, for example with the ones that could not be deleted. The ledger is removed if there are none left.
+        Args:
+            entities (Entities): the entities to keep
+        """
+        with self._lock:
+            if not entities:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            with open(self.path, "w") as ledger_file:
+                for entity_id, parent_id in entities.items():
+                    ledger_file.write(
+                        json.dumps({"id": entity_id, "parent_id": parent_id}) + "\n"
+                    )
+
+
+def protected_ids(
+    registry_path: str = DEFAULT_FIXTURE_REGISTRY_FILE, except_keys: Sequence[str] = ()
+) -> Set[str]:
+    """
+    List the entities of the registered fixtures, which are kept for later runs (see fixtures.py)
+    Args:
+        registry_path (str): file path of the fixture registry. Defaults to fixtures.json.
+        except_keys (Sequence[str]): keys of fixtures whose entities are not protected. Defaults to none.
+    Returns:
+        Set[str]: synapse ids of the resources of every registered fixture
+    """
+    return {
+        entity_id
+        for fixture in FixtureRegistry(registry_path).fixtures()
+        if fixture.key not in except_keys
+        for entity_id in fixture.ids.values()
+    }
+
+
+def leaf_first_levels(entities: Entities) -> List[List[str]]:
+    """
+    Group entities by depth, deepest first, so that children are deleted before their parents
+    Args:
+        entities (Entities): parent of every entity. Parents that are not in entities count as roots.
+    Returns:
+        List[List[str]]: ids of the entities of every level, from the deepest level up to the roots
+    """
+    depths: Dict[str, int] = {}
+
+    def depth(entity_id: str) -> int:
+        if entity_id not in depths:
+            parent_id = entities.get(entity_id)
+            depths[entity_id] = 0 if parent_id not in entities else depth(parent_id) + 1
+        return depths[entity_id]
+
+    levels: Dict[int, List[str]] = {}
+    for entity_id in entities:
+        levels.setdefault(depth(entity_id), []).append(entity_id)
+    return [levels[level] for level in sorted(levels, reverse=True)]
+
+
+class TeardownManager:
+    """
+    Track every synapse entity created during a run and delete them when the run ends: concurrently, level by level
+    from the leaves up, with bounded concurrency and retries. Entities of registered fixtures are kept.
+    Usage:
+        with TeardownManager():
+            CreateTestFiles.create_test_files(10, "test project", "test_files")
+    """
+
+    def __init__(
+        self,
+        ledger_dir: str = DEFAULT_LEDGER_DIR,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_DELETES,
+        max_retries: int = DEFAULT_MAX_STORE_RETRIES,
+        backoff_s: float = DEFAULT_STORE_BACKOFF_S,
+        registry_path: str = DEFAULT_FIXTURE_REGISTRY_FILE,
+    ):
+        """
+        Args:
+            ledger_dir (str): directory of the ledgers of all runs. Defaults to teardown_ledgers.
+            max_concurrency (int): maximum number of deletes in flight. Defaults to 25.
+            max_retries (int): maximum number of retries of a throttled delete. Defaults to 6.
+            backoff_s (float): seconds to wait before the first retry, doubled for every later retry. Defaults to 1.
+            registry_path (str): file path of the fixture registry, whose fixtures are never deleted. Defaults to fixtures.json.
+        """
+        self.ledger_dir = ledger_dir
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.registry_path = registry_path
+        # the process id tells the ledgers of running processes from the ledgers of crashed runs
+        self.run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        os.makedirs(ledger_dir, exist_ok=True)
+        self.ledger = Ledger(os.path.join(ledger_dir, f"{self.run_id}.jsonl"))
+
+    def __enter__(self) -> "TeardownManager":
+        add_created_entity_listener(self.ledger.record)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        remove_created_entity_listener(self.ledger.record)
+        self.teardown()
+
+    async def _delete(self, entity_id: str, semaphore: asyncio.Semaphore) -> bool:
+        from synapseclient.core.exceptions import SynapseHTTPError
+
+        syn = get_synapse_client()
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            try:
+                await call_with_backoff(
+                    lambda: loop.run_in_executor(None, syn.delete, entity_id),
+                    f"deleting {entity_id}",
+                    self.max_retries,
+                    self.backoff_s,
+                )
+            except SynapseHTTPError as err:
+                status = getattr(getattr(err, "response", None), "status_code", None)
+                if status == 404:
+                    # already deleted, for example with its parent by an earlier teardown
+                    return True
+                logger.error(f"could not delete {entity_id}: {err}")
+                return False
+        return True
+
+    async def _delete_leaf_first(self, entities: Entities) -> Entities:
+        use_store_executor(self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        failed: Entities = {}
+        for level in leaf_first_levels(entities):
+            deleted = await asyncio.gather(
+                *(self._delete(entity_id, semaphore) for entity_id in level)
+            )
+            failed.update(
+                {
+                    entity_id: entities[entity_id]
+                    for entity_id, ok in zip(level, deleted)
+                    if not ok
+                }
+            )
+        return failed
+
+    def delete(
+        self, entities: Entities, unprotected_fixtures: Sequence[str] = ()
+    ) -> Entities:
+        """
+        Delete entities leaf first. Entities of registered fixtures, and entities under them, are kept.
+        Args:
+            entities (Entities): parent of every entity to delete
+            unprotected_fixtures (Sequence[str]): keys of registered fixtures whose entities are deleted anyway. Defaults to none.
+        Returns:
+            Entities: the entities that could not be deleted
+        """
+        protected = protected_ids(self.registry_path, unprotected_fixtures)
+
+        def is_protected(entity_id: Optional[str]) -> bool:
+            while entity_id is not None:
+                if entity_id in protected:
+                    return True
+                entity_id = entities.get(entity_id)
+            return False
+
+        to_delete = {
+            entity_id: parent_id
+            for entity_id, parent_id in entities.items()
+            if not is_protected(entity_id)
+        }
+        if not to_delete:
+            return {}
+        logger.info(
+            f"deleting {len(to_delete)} entities, keeping {len(entities) - len(to_delete)} entities of registered fixtures"
+        )
+        failed = asyncio.run(self._delete_leaf_first(to_delete))
+        if failed:
+            logger.warning(f"{len(failed)} entities could not be deleted")
+        return failed
+
+    def teardown(self) -> Entities:
+        """
+        Delete the entities created during this run. Entities that could not be deleted stay in the ledger, for a later sweep.
+        Returns:
+            Entities: the entities that could not be deleted
+        """
+        failed = self.delete(self.ledger.entities())
+        self.ledger.rewrite(failed)
+        return failed
+
+    def sweep(self) -> Entities:
+        """
+        Delete the entities left by earlier runs that crashed or could not delete everything, as recorded in their ledgers.
+        Ledgers of processes that are still running are skipped.
+        Returns:
+            Entities: the entities that could not be deleted
+        """
+        failed: Entities = {}
+        for path in sorted(glob.glob(os.path.join(self.ledger_dir, "*.jsonl"))):
+            run_id = os.path.basename(path)[: -len(".jsonl")]
+            if run_id == self.run_id or _is_running(run_id):
+                continue
+            ledger = Ledger(path)
+            logger.info(f"sweeping the entities of run {run_id}")
+            run_failed = self.delete(ledger.entities())
+            ledger.rewrite(run_failed)
+            failed.update(run_failed)
+        return failed
+
+    def teardown_fixture(self, key: str) -> Entities:
+        """
+        Delete every entity of a registered fixture, leaf first, and forget the fixture once all of them are deleted.
+        If listing or deleting them fails, the fixture stays registered, so that its teardown can be retried.
+        Args:
+            key (str): key of the fixture (see fixtures.py)
+        Returns:
+            Entities: the entities that could not be deleted
+        """
+        registry = FixtureRegistry(self.registry_path)
+        fixture = next(
+            (fixture for fixture in registry.fixtures() if fixture.key == key), None
+        )
+        if fixture is None:
+            raise ValueError(f"Unknown fixture {key}")
+        entities = asyncio.run(self._list_tree(fixture.ids["project_id"]))
+        failed = self.delete(entities, unprotected_fixtures=[key])
+        if failed:
+            logger.warning(
+                f"fixture {key} stays registered, {len(failed)} of its entities could not be deleted"
+            )
+        else:
+            registry.forget(key)
+        return failed
+
+    async def _list_tree(self, root_id: str) -> Entities:
+        # list the children of every level concurrently, breadth first
+        use_store_executor(self.max_concurrency)
+        syn = get_synapse_client()
+        loop = asyncio.get_running_loop()
+        entities: Entities = {root_id: None}
+        level = [root_id]
+        while level:
+            children = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        None,
+                        lambda parent_id=parent_id: list(
+                            syn.getChildren(parent_id, CHILD_TYPES)
+                        ),
+                    )
+                    for parent_id in level
+                )
+            )
+            next_level = []
+            for parent_id, parent_children in zip(level, children):
+                for child in parent_children:
+                    entities[child["id"]] = parent_id
+                    next_level.append(child["id"])
+            level = next_level
+        return entities
+
+
+def _is_running(run_id: str) -> bool:
+    try:
+        pid = int(run_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Delete synapse entities created by benchmark runs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "sweep",
+        help="delete the entities left by earlier runs that crashed, as recorded in their ledgers",
+    )
+    fixture = subparsers.add_parser(
+        "fixture", help="delete registered fixtures and forget them"
+    )
+    fixture.add_argument("keys", nargs="+", help="keys of the fixtures")
+    parser.add_argument(
+        "--ledger-dir", default=DEFAULT_LEDGER_DIR, help="directory of the ledgers"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_DELETES,
+        help="number of deletes in flight",
+    )
+    parser.add_argument(
+        "--registry",
+        default=DEFAULT_FIXTURE_REGISTRY_FILE,
+        help="json file of the fixture registry",
+    )
+    args = parser.parse_args()
+
+    manager = TeardownManager(
+        args.ledger_dir, args.concurrency, registry_path=args.registry
+    )
+    if args.command == "sweep":
+        failed = manager.sweep()
+    else:
+        failed = {}
+        for key in args.keys:
+            failed.update(manager.teardown_fixture(key))
+    if failed:
+        logger.error(f"could not delete {sorted(failed)}")
@@ -1,23 +1,106 @@
 import asyncio
 import logging
+import math
 import os
+import random
 import shutil
-from typing import List, Tuple, Union, Optional
-from dataclasses import dataclass
-
-from synapseclient import EntityViewSchema, EntityViewType, Folder, Project
-from synapseclient.models import File
-
-from utils import StoreRuntime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Sequence, Tuple, TypeVar, Union, Optional
+from dataclasses import dataclass, field
+
+from synapseclient import (
+    Entity,
+    EntityViewSchema,
+    EntityViewType,
+    Folder,
+    Project,
+    Synapse,
+)
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapseclient.models import File, Folder as FolderModel
+
+from latency_stats import BYTES_PER_MB
+from utils import get_synapse_client
 
 logger = logging.getLogger("test upload annotations parameter")
 
+# number of folders created at the same time by FolderTreeBuilder
+DEFAULT_MAX_CONCURRENT_STORES = 25
+# retries of a store throttled by synapse, and the wait before the first retry
+DEFAULT_MAX_STORE_RETRIES = 6
+DEFAULT_STORE_BACKOFF_S = 1
+THROTTLED_STATUS_CODES = (429, 503)
+# status code of a store refused because an entity of the same name already exists under the parent
+CONFLICT_STATUS_CODE = 409
+# number of files uploaded at the same time by CreateTestFiles
+DEFAULT_MAX_CONCURRENT_UPLOADS = 25
+# seconds between two progress reports of an upload
+PROGRESS_INTERVAL_S = 10
+
+T = TypeVar("T")
+
+# callbacks told about every entity created on synapse, with its id and the id of its parent (see teardown.py)
+_created_entity_listeners: List[Callable[[str, Optional[str]], None]] = []
+
+
+def add_created_entity_listener(listener: Callable[[str, Optional[str]], None]) -> None:
+    """
+    Get told about every entity created on synapse from now on
+    Args:
+        listener (Callable[[str, Optional[str]], None]): called with the id of every new entity and the id of its parent.
+            It can be called from several threads at the same time.
+    """
+    _created_entity_listeners.append(listener)
+
+
+def remove_created_entity_listener(
+    listener: Callable[[str, Optional[str]], None]
+) -> None:
+    """
+    Stop telling a listener about new entities
+    Args:
+        listener (Callable[[str, Optional[str]], None]): a listener added with add_created_entity_listener
+    """
+    _created_entity_listeners.remove(listener)
+
+
+def entity_created(entity_id: str, parent_id: Optional[str]) -> None:
+    """
+    Tell the listeners about a new entity
+    Args:
+        entity_id (str): synapse id of the entity
+        parent_id (Optional[str]): synapse id of its parent. None for projects.
+    """
+    for listener in list(_created_entity_listeners):
+        listener(entity_id, parent_id)
+
+
+def store_new_entity(syn: Synapse, entity: Entity, parent_id: Optional[str]) -> Entity:
+    """
+    Store an entity and tell the listeners about it if this call created it.
+    As with syn.store, an existing entity of the same name and parent is updated instead, but the listeners are not told about it.
+    Args:
+        syn (Synapse): logged in synapse client
+        entity (Entity): the entity to store
+        parent_id (Optional[str]): synapse id of its parent. None for projects.
+    Returns:
+        Entity: the stored entity
+    """
+    try:
+        stored = syn.store(entity, createOrUpdate=False)
+    except SynapseHTTPError as err:
+        if not is_conflict(err):
+            raise
+        return syn.store(entity)
+    entity_created(stored["id"], parent_id)
+    return stored
+
 
 @dataclass
 class CreateSynapseResources:
     def __post_init__(self):
-        srt = StoreRuntime()
-        self.syn = srt.login_synapse()
+        self.syn = get_synapse_client()
 
     def create_test_project(
         self, project_name: Optional[str] = "My favorite test project"
@@ -30,9 +113,7 @@ class CreateSynapseResources:
         Returns:
             Project: synapse project
         """
-        syn = self.syn
-        project = Project(name=project_name)
-        project = syn.store(obj=project)
+        project = store_new_entity(self.syn, Project(name=project_name), None)
         return project, project["id"]
 
     def create_test_folder(
@@ -47,10 +128,8 @@ class CreateSynapseResources:
         Returns:
             Folder: synapse folder created
         """
-        syn = self.syn
         data_folder = Folder(folder_name, parent=parent)
-        data_folder = syn.store(data_folder)
-        return data_folder
+        return store_new_entity(self.syn, data_folder, data_folder.parentId)
 
     def create_test_entity_view(
         self,
@@ -75,8 +154,7 @@ class CreateSynapseResources:
             includeEntityTypes=[EntityViewType.FILE, EntityViewType.FOLDER],
             parent=project,
         )
-        entity_view = self.syn.store(entity_view)
-        return entity_view
+        return store_new_entity(self.syn, entity_view, project_syn_id)
 
     def create_all_basic_resources(
         self,
@@ -109,6 +187,8 @@ class CreateTestFiles:
     num_test_files: int
     test_folder_path: Optional[str] = None
     text_to_write: Optional[str] = "writing test files"
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_UPLOADS
+    annotations: Optional[dict] = None
 
     def write_test_file(self, file_path: str) -> None:
         """write mock test files"""
@@ -116,40 +196,106 @@ class CreateTestFiles:
             with open(file_path, "w") as file:
                 file.write(self.text_to_write)
 
+    def local_test_files(self) -> List[str]:
+        """
+        List the local test files
+        Returns:
+            List[str]: file paths of the num_test_files test files
+        """
+        return [
+            f"{self.test_folder_path}/sample_file_{i}.txt"
+            for i in range(self.num_test_files)
+        ]
+
     # create test files locally
     def create_local_test_files(self) -> None:
-        """create local test files"""
-        test_dir = self.test_folder_path
-        if os.path.exists(test_dir):
-            shutil.rmtree(test_dir)
-
-        os.makedirs(test_dir)
-
-        files = os.listdir(test_dir)
-        current_num_files = len(files)
-
-        if current_num_files < self.num_test_files:
-            num_files_to_add = self.num_test_files - len(files)
-
-            for i in range(current_num_files, current_num_files + num_files_to_add):
-                sample_file = f"{test_dir}/sample_file_{i}.txt"
-                self.write_test_file(sample_file)
+        """create local test files. Files that already exist are reused, so that they are generated once for all folders."""
+        os.makedirs(self.test_folder_path, exist_ok=True)
+        for sample_file in self.local_test_files():
+            self.write_test_file(sample_file)
 
     async def store_test_file_on_syn(
         self,
         syn_dataset: Folder,
         test_file: str,
-    ) -> None:
+    ) -> File:
         """asynchronously store test files on synapse
 
         Args:
             syn_dataset (Folder): synapse dataset folder
-            test_file (Str): test file name
+            test_file (Str): file path of the test file
+
+        Returns:
+            File: the stored file
+        """
+
+        def store(create_or_update: bool) -> Awaitable[File]:
+            return call_with_backoff(
+                lambda: File(
+                    path=test_file,
+                    annotations=self.annotations,
+                    create_or_update=create_or_update,
+                ).store_async(parent=syn_dataset, synapse_client=get_synapse_client()),
+                f"uploading {test_file} to {syn_dataset.id}",
+            )
+
+        try:
+            file = await store(create_or_update=False)
+        except SynapseHTTPError as err:
+            if not is_conflict(err):
+                raise
+            # a file of the same name already exists: update it, as a store does by default, but it was not created by this run
+            return await store(create_or_update=True)
+        entity_created(file.id, syn_dataset.id)
+        return file
+
+    async def store_test_files_on_syn(self, syn_datasets: Sequence[Folder]) -> int:
+        """
+        Upload the local test files to every given folder. Uploads to all folders share one pool of
+        max_concurrency uploads, so that a new upload starts as soon as any upload finishes.
+        Progress and throughput are logged every PROGRESS_INTERVAL_S seconds.
+
+        Args:
+            syn_datasets (Sequence[Folder]): synapse folders to upload the files to
+
+        Returns:
+            int: number of uploaded files
         """
-        test_folder = self.test_folder_path
-        path_test_file = test_folder + "/" + test_file
-        file = File(path=path_test_file)
-        await file.store_async(parent=syn_dataset)
+        use_store_executor(self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        test_files = self.local_test_files()
+        total = len(test_files) * len(syn_datasets)
+        file_size = sum(os.path.getsize(test_file) for test_file in test_files)
+        uploaded = 0
+        start_time = last_report = time.perf_counter()
+
+        def report() -> None:
+            elapsed_s = time.perf_counter() - start_time
+            mb = uploaded / len(test_files) * file_size / BYTES_PER_MB
+            logger.info(
+                f"uploaded {uploaded} of {total} files in {elapsed_s:.0f} seconds "
+                f"({uploaded / elapsed_s:.1f} files/s, {mb / elapsed_s:.2f} MB/s)"
+            )
+
+        async def upload(syn_dataset: Folder, test_file: str) -> None:
+            nonlocal uploaded, last_report
+            async with semaphore:
+                await self.store_test_file_on_syn(syn_dataset, test_file)
+            uploaded += 1
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL_S:
+                last_report = time.perf_counter()
+                report()
+
+        await asyncio.gather(
+            *(
+                upload(syn_dataset, test_file)
+                for syn_dataset in syn_datasets
+                for test_file in test_files
+            )
+        )
+        if total:
+            report()
+        return uploaded
 
     async def store_multi_test_files_on_syn(self, syn_dataset: Folder) -> None:
         """store multiple test files on synapse
@@ -157,13 +303,7 @@ class CreateTestFiles:
         Args:
             syn_dataset (Folder): synapse dataset Folder
         """
-        # assume directory is called "test files"
-        files = os.listdir(self.test_folder_path)
-        for test_file in files:
-            task = self.store_test_file_on_syn(
-                syn_dataset=syn_dataset, test_file=test_file
-            )
-            await asyncio.gather(task)
+        await self.store_test_files_on_syn([syn_dataset])
 
     @staticmethod
     def create_test_files(
@@ -172,6 +312,8 @@ class CreateTestFiles:
         test_folder_path: str,
         entity_view: Optional[str] = "test view",
         text_to_write: Optional[str] = "writing test files",
+        folder_name: Optional[str] = None,
+        annotations: Optional[dict] = None,
     ) -> Tuple[str, str, str]:
         """create test files in a given folder
 
@@ -181,13 +323,15 @@ class CreateTestFiles:
             test_folder_path (str): path of local test folder
             entity_view (Optional[str]): name of entity view
             text_to_write(Optional[str]): text to write in test files.
+            folder_name (Optional[str]): name of the folder on synapse. Defaults to test_folder_path.
+            annotations (Optional[dict]): annotations of every test file
         Returns:
             Tuple[str, str, str]: data folder id, project id, asset view id
         """
         cyr = CreateSynapseResources()
         _, project_id, data_folder, entity_view = cyr.create_all_basic_resources(
             project_name=project_name,
-            folder_name=test_folder_path,
+            folder_name=folder_name or test_folder_path,
             entity_view_name=entity_view,
         )
 
@@ -195,6 +339,7 @@ class CreateTestFiles:
             num_test_files=num_file,
             test_folder_path=test_folder_path,
             text_to_write=text_to_write,
+            annotations=annotations,
         )
         ctf.create_local_test_files()
 
@@ -204,79 +349,182 @@ class CreateTestFiles:
 
 
 @dataclass
-class CreateTestFolders:
-    max_depth: int
-    test_folder_path: Optional[str] = None
+class FolderNode:
+    """
+    A folder created on synapse, with the folders created under it
 
-    def __post_init__(self):
-        self.create_synapse_resource = CreateSynapseResources()
+    Attributes:
+        id (str): synapse id
+        name (str): name of the folder
+        children (List[FolderNode]): folders created under it, in creation order
+    """
 
-    def create_test_folder_recursive(
-        self,
-        next_levels_test_folder: List[Folder],
-        num_folder_per_layer: int,
-        max_depth: int,
-    ) -> None:
-        """create number of test folders with a certain number of folders per layer
+    id: str
+    name: str
+    children: List["FolderNode"] = field(default_factory=list)
+
+    def levels(self) -> List[List["FolderNode"]]:
+        """
+        List the folders under this one level by level
+        Returns:
+            List[List[FolderNode]]: the folders of every level, starting with the children of this folder
+        """
+        levels = []
+        level = self.children
+        while level:
+            levels.append(level)
+            level = [child for node in level for child in node.children]
+        return levels
+
+    def ids(self) -> List[str]:
+        """
+        List the synapse ids of the folders under this one, breadth first
+        Returns:
+            List[str]: the ids
+        """
+        return [node.id for level in self.levels() for node in level]
 
+
+class FolderTreeBuilder:
+    """
+    Create a hierarchy of synapse folders level by level. All folders of a level are created concurrently,
+    with at most max_concurrency stores in flight, and stores that get throttled are retried with an exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENT_STORES,
+        max_retries: int = DEFAULT_MAX_STORE_RETRIES,
+        backoff_s: float = DEFAULT_STORE_BACKOFF_S,
+    ):
+        """
         Args:
-            next_levels_test_folder (List[Folder]): next level of folder
-            num_folder_per_layer (int): number of folders per layer
-            max_depth (int): maximum depth of folders
+            max_concurrency (int): maximum number of folders being created at the same time. Defaults to 25.
+            max_retries (int): maximum number of retries of a throttled store. Defaults to 6.
+            backoff_s (float): seconds to wait before the first retry, doubled for every later retry. Defaults to 1.
         """
-        if max_depth == 0:
-            return
-        new_levels_test_folder = []
-        for i in range(num_folder_per_layer):
-            for parent in next_levels_test_folder:
-                sub_data_folder = self.create_synapse_resource.create_test_folder(
-                    parent=parent, folder_name=f"Test folder {i}"
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+
+    async def _create_folder(
+        self, parent: FolderNode, name: str, semaphore: asyncio.Semaphore
+    ) -> FolderNode:
+        async with semaphore:
+            # new folders do not need the lookup of an existing folder of the same name
+            folder = await call_with_backoff(
+                lambda: FolderModel(
+                    name=name, parent_id=parent.id, create_or_update=False
+                ).store_async(synapse_client=get_synapse_client()),
+                f"creating {name} under {parent.id}",
+                self.max_retries,
+                self.backoff_s,
+            )
+        entity_created(folder.id, parent.id)
+        node = FolderNode(folder.id, name)
+        parent.children.append(node)
+        return node
+
+    async def _build(
+        self,
+        root: FolderNode,
+        fan_out: Sequence[int],
+        max_folders: Optional[int],
+    ) -> FolderNode:
+        use_store_executor(self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        remaining = math.inf if max_folders is None else max_folders
+        level = [root]
+        for depth, num_children in enumerate(fan_out, start=1):
+            # children are planned parent by parent, so that a limited number of folders goes to the first parents
+            planned = [
+                (parent, f"Test folder {i}")
+                for parent in level
+                for i in range(num_children)
+            ][: max(0, min(remaining, len(level) * num_children))]
+            if not planned:
+                break
+            start_time = time.perf_counter()
+            level = await asyncio.gather(
+                *(
+                    self._create_folder(parent, name, semaphore)
+                    for parent, name in planned
                 )
-                new_levels_test_folder.append(sub_data_folder)
+            )
+            remaining -= len(level)
+            logger.info(
+                f"created {len(level)} folders of level {depth} in {time.perf_counter() - start_time:.1f} seconds"
+            )
+        return root
 
-        self.create_test_folder_recursive(
-            num_folder_per_layer=num_folder_per_layer,
-            next_levels_test_folder=new_levels_test_folder,
-            max_depth=max_depth - 1,
+    def build(
+        self,
+        root_id: str,
+        fan_out: Sequence[int],
+        max_folders: Optional[int] = None,
+        root_name: str = "",
+    ) -> FolderNode:
+        """
+        Create a hierarchy of folders under a project or folder
+        Args:
+            root_id (str): synapse id of the project or folder to create the folders in
+            fan_out (Sequence[int]): number of folders to create under every folder of the previous level, for every level.
+                For example [5, 5, 5] creates 5 folders, 25 folders under them and 125 folders under those.
+            max_folders (int, optional): stop once this many folders were created in total. Defaults to no limit.
+            root_name (str): name of the project or folder, recorded in the returned tree
+        Returns:
+            FolderNode: the tree of created folders, rooted at root_id
+        """
+        return asyncio.run(
+            self._build(FolderNode(root_id, root_name), fan_out, max_folders)
         )
 
-    def create_multi_layer_test_folders(
-        self,
-        num_folder_per_layer: int,
-        project_name: str,
-    ) -> Tuple[str, str, str]:
-        """create multiple layers of test folder for testing
 
-        Args:
-            num_folder_per_layer (int): number of folder per layer
-            project_name (str): project name
+@dataclass
+class CreateTestFolders:
+    max_depth: int
+    test_folder_path: Optional[str] = None
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_STORES
+
+    def __post_init__(self):
+        self.create_synapse_resource = CreateSynapseResources()
+        self.builder = FolderTreeBuilder(max_concurrency=self.max_concurrency)
+        # tree of the folders of the last created project
+        self.folder_tree: Optional[FolderNode] = None
 
+    def create_project_with_view(self, project_name: str) -> Tuple[Project, str, str]:
+        """
+        Create a test project and its entity view
+        Args:
+            project_name (str): name of the project
         Returns:
-            Tuple[str, str, str]: data folder id, project id, asset view id
+            Tuple[Project, str, str]: the project, its id and the entity view id
         """
-
         project, project_id = self.create_synapse_resource.create_test_project(
             project_name
         )
         entity_view = self.create_synapse_resource.create_test_entity_view(
             project_syn_id=project_id, project=project
         )
+        return project, project_id, entity_view.id
 
-        first_layer_folder = []
+    def create_multi_layer_test_folders(
+        self,
+        num_folder_per_layer: int,
+        project_name: str,
+    ) -> Tuple[str, str]:
+        """create multiple layers of test folder for testing, with the same number of folders under every folder
 
-        # create the first layer
-        for i in range(num_folder_per_layer):
-            sub_data_folder = self.create_synapse_resource.create_test_folder(
-                parent=project, folder_name=f"Test folder {i}"
-            )
-            first_layer_folder.append(sub_data_folder)
+        Args:
+            num_folder_per_layer (int): number of folder per layer
+            project_name (str): project name
 
-        self.create_test_folder_recursive(
-            num_folder_per_layer=num_folder_per_layer,
-            next_levels_test_folder=first_layer_folder,
-            max_depth=self.max_depth - 1,
+        Returns:
+            Tuple[str, str]: project id, entity view id. The tree of folders is kept in folder_tree.
+        """
+        return self.create_test_folder_tree(
+            project_name, [num_folder_per_layer] * self.max_depth
         )
-        return project_id, entity_view.id
 
     def create_multi_layer_test_folders_fixed_entities(
         self,
@@ -285,7 +533,8 @@ class CreateTestFolders:
         total_folders_to_create: int,
         num_files: Optional[int] = 0,
     ) -> Tuple[str, str]:
-        """create multiple layers of test folders with fixed total number of folders
+        """create multiple layers of test folders with fixed total number of folders.
+        Every folder of the first layer gets a chain of single sub folders, until the total number of folders is reached.
 
         Args:
             first_layer_num (int): number of folders in the first layer
@@ -294,78 +543,124 @@ class CreateTestFolders:
             num_files (Optional[int]): number of files attached to folders in each layer (except the first layer)
 
         Returns:
-            Tuple[str, str]: project id, entity view id
+            Tuple[str, str]: project id, entity view id. The tree of folders is kept in folder_tree.
         """
-        project, project_id = self.create_synapse_resource.create_test_project(
-            project_name
-        )
-        entity_view = self.create_synapse_resource.create_test_entity_view(
-            project_syn_id=project_id, project=project
-        )
-
-        first_layer_folder = []
-
-        # create the first layer
-        for i in range(first_layer_num):
-            sub_data_folder = self.create_synapse_resource.create_test_folder(
-                parent=project, folder_name=f"Test folder {i}"
-            )
-            first_layer_folder.append(sub_data_folder)
-
-        self.create_test_folder_fixed_entities_recursive(
-            max_depth=self.max_depth - 1,
-            next_levels_test_folder=first_layer_folder,
-            remained_entities_to_create=total_folders_to_create - first_layer_num,
+        return self.create_test_folder_tree(
+            project_name,
+            [first_layer_num] + [1] * (self.max_depth - 1),
+            max_folders=total_folders_to_create,
             num_files=num_files,
-            test_folder_path=self.test_folder_path,
         )
 
-        return project_id, entity_view.id
-
-    def create_test_folder_fixed_entities_recursive(
+    def create_test_folder_tree(
         self,
-        max_depth: int,
-        next_levels_test_folder: List[Folder],
-        remained_entities_to_create: int,
+        project_name: str,
+        fan_out: Sequence[int],
+        max_folders: Optional[int] = None,
         num_files: Optional[int] = 0,
-        test_folder_path: Optional[str] = None,
-    ) -> None:
-        """create number of test folders for a fixed number of entities and layers
+        annotations: Optional[dict] = None,
+    ) -> Tuple[str, str]:
+        """create a test project with any hierarchy of folders (see FolderTreeBuilder.build)
 
         Args:
-            max_depth (int): max depth of folders
-            next_levels_test_folder (List[Folder]): list of folders of the next level
-            remained_entities_to_create (int): remaining number of folders to create
-            num_files (Optional[int], optional): number of files to attach to the next layer of folders. Defaults to 0.
-            test_folder_path (Optional[str], optional): if attaching files, specify the local test folder that stores the files. Defaults to None.
-        """
-        if max_depth == 0 or remained_entities_to_create == 0:
-            return
+            project_name (str): name of project
+            fan_out (Sequence[int]): number of folders under every folder of the previous level, for every level
+            max_folders (Optional[int]): total number of folders to create. Defaults to no limit.
+            num_files (Optional[int]): number of files attached to folders in each layer (except the first layer).
+                Files are only attached if test_folder_path is set.
+            annotations (Optional[dict]): annotations of every attached file
 
-        new_levels_test_folder = []
+        Returns:
+            Tuple[str, str]: project id, entity view id. The tree of folders is kept in folder_tree.
+        """
+        _, project_id, entity_view_id = self.create_project_with_view(project_name)
+        self.folder_tree = self.builder.build(
+            project_id, fan_out, max_folders=max_folders, root_name=project_name
+        )
 
-        for parent in next_levels_test_folder:
-            sub_data_folder = self.create_synapse_resource.create_test_folder(
-                parent=parent, folder_name="Test folder"
+        if num_files > 0 and self.test_folder_path:
+            ctf = CreateTestFiles(
+                num_test_files=num_files,
+                test_folder_path=self.test_folder_path,
+                annotations=annotations,
             )
-            new_levels_test_folder.append(sub_data_folder)
-            remained_entities_to_create = remained_entities_to_create - 1
-            if num_files > 0 and test_folder_path:
-                ctf = CreateTestFiles(
-                    num_test_files=num_files, test_folder_path=self.test_folder_path
-                )
-                ctf.create_local_test_files()
-                asyncio.run(
-                    ctf.store_multi_test_files_on_syn(syn_dataset=sub_data_folder)
+            ctf.create_local_test_files()
+            asyncio.run(
+                ctf.store_test_files_on_syn(
+                    [
+                        FolderModel(id=node.id)
+                        for level in self.folder_tree.levels()[1:]
+                        for node in level
+                    ]
                 )
+            )
 
-        self.create_test_folder_fixed_entities_recursive(
-            max_depth=max_depth - 1,
-            next_levels_test_folder=new_levels_test_folder,
-            remained_entities_to_create=remained_entities_to_create,
-            num_files=num_files,
-            test_folder_path=self.test_folder_path,
-        )
+        return project_id, entity_view_id
+
+
+def use_store_executor(max_workers: int) -> None:
+    """
+    Size the default executor of the running event loop. The async methods of synapseclient.models
+    run their blocking requests in it, so it needs a thread for every store in flight.
+    Args:
+        max_workers (int): number of threads
+    """
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_workers)
+    )
+
+
+async def call_with_backoff(
+    call: Callable[[], Awaitable[T]],
+    description: str,
+    max_retries: int = DEFAULT_MAX_STORE_RETRIES,
+    backoff_s: float = DEFAULT_STORE_BACKOFF_S,
+) -> T:
+    """
+    Run a synapse request, for example a store, retrying it with an exponential backoff while synapse throttles it
+    Args:
+        call (Callable[[], Awaitable[T]]): sends the request. It is called again for every retry.
+        description (str): description of the request, for the logs
+        max_retries (int): maximum number of retries. Defaults to 6.
+        backoff_s (float): seconds to wait before the first retry, doubled for every later retry. Defaults to 1.
+    Returns:
+        T: the result of the request
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except SynapseHTTPError as err:
+            if not is_throttled(err) or attempt == max_retries:
+                raise
+            delay_s = backoff_s * 2**attempt
+            logger.warning(
+                f"{description} was throttled, retrying in {delay_s} seconds"
+            )
+            await asyncio.sleep(delay_s * random.uniform(0.5, 1.5))
+
+
+def is_throttled(err: SynapseHTTPError) -> bool:
+    """
+    Check whether synapse refused a request because of its rate limits
+    Args:
+        err (SynapseHTTPError): error of the request
+    Returns:
+        bool: True if the status code of the response is one of THROTTLED_STATUS_CODES
+    """
+    response = getattr(err, "response", None)
+    return getattr(response, "status_code", None) in THROTTLED_STATUS_CODES
+
+
+def is_conflict(err: SynapseHTTPError) -> bool:
+    """
+    Check whether synapse refused to create an entity because one of the same name already exists under its parent
+    Args:
+        err (SynapseHTTPError): error of the request
+    Returns:
+        bool: True if the status code of the response is CONFLICT_STATUS_CODE
+    """
+    response = getattr(err, "response", None)
+    return getattr(response, "status_code", None) == CONFLICT_STATUS_CODE
 
 
 def clean_up_tests(item: str):
@@ -0,0 +1,414 @@
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from latency_stats import NS_PER_S, ConcurrencyTracker, LatencyHistogram, RunStats
+from result_store import ResultStore
+from utils import (
+    BASE_URL,
+    COLD_CONNECTION,
+    MultiRow,
+    StoreRuntime,
+    return_time_now,
+    save_run_time_result,
+    send_manifest,
+    send_post_request,
+    send_request,
+)
+
+logger = logging.getLogger("traces")
+
+# path prefix of the schematic API in access logs
+DEFAULT_BASE_PATH = "/v1/"
+# number of requests of a replay that can be in flight at the same time
+DEFAULT_MAX_IN_FLIGHT = 256
+
+# "METHOD target HTTP/version", the request line of common, combined and load balancer access logs
+_REQUEST_LINE = re.compile(r'"(?P<method>[A-Z]+) (?P<target>\S+)(?: [^"]*)?"')
+# [10/Oct/2023:13:55:36 -0700] in common and combined logs
+_CLF_TIME = re.compile(r"\[(?P<time>[^\]]+)\]")
+# 2023-10-10T13:55:36.123456Z in load balancer logs
+_ISO_TIME = re.compile(
+    r"(?P<time>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?)"
+)
+
+
+@dataclass
+class TraceEvent:
+    """
+    One recorded request
+
+    Attributes:
+        offset_s (float): arrival time of the request, in seconds after the first request of the trace
+        endpoint (str): endpoint relative to BASE_URL, for example "model/validate"
+        params (dict): parameters of the request
+        method (str): "GET" or "POST"
+        payload (str, optional): file path of the manifest uploaded by a post request
+    """
+
+    offset_s: float
+    endpoint: str
+    params: dict = field(default_factory=dict)
+    method: str = "GET"
+    payload: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    """
+    Requests recorded from real traffic, sorted by arrival time
+
+    Attributes:
+        events (List[TraceEvent]): the requests
+    """
+
+    events: List[TraceEvent] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.events.sort(key=lambda event: event.offset_s)
+
+    @property
+    def duration_s(self) -> float:
+        """time between the first and the last request, in seconds"""
+        return self.events[-1].offset_s if self.events else 0
+
+    def window(self, start_s: float, duration_s: float) -> "Trace":
+        """
+        Cut a slice of the trace, for example its busiest hour
+        Args:
+            start_s (float): start of the slice, in seconds after the first request
+            duration_s (float): length of the slice, in seconds
+        Returns:
+            Trace: the requests of the slice, with offsets relative to the start of the slice
+        """
+        return Trace(
+            [
+                TraceEvent(**{**asdict(event), "offset_s": event.offset_s - start_s})
+                for event in self.events
+                if start_s <= event.offset_s < start_s + duration_s
+            ]
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Save the trace as a capture file, with one json request per line
+        Args:
+            path (str): file path of the capture file
+        """
+        with open(path, "w") as trace_file:
+            for event in self.events:
+                trace_file.write(json.dumps(asdict(event)) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        """
+        Load a capture file, with one json request per line (see TraceEvent)
+        Args:
+            path (str): file path of the capture file
+        Returns:
+            Trace: the trace
+        """
+        with open(path) as trace_file:
+            return cls(
+                [TraceEvent(**json.loads(line)) for line in trace_file if line.strip()]
+            )
+
+    @classmethod
+    def from_access_log(
+        cls,
+        lines: Iterable[str],
+        base_path: str = DEFAULT_BASE_PATH,
+        payloads: Dict[str, str] = None,
+    ) -> "Trace":
+        """
+        Create a trace from an access log export, in common or combined log format or in the format of AWS load balancers.
+        Requests outside of the schematic API and lines that can not be parsed are skipped.
+        Args:
+            lines (Iterable[str]): lines of the access log
+            base_path (str): path prefix of the schematic API. Defaults to "/v1/".
+            payloads (Dict[str, str], optional): file path of the manifest to upload by endpoint, since access logs do not record request bodies.
+                For example {"model/validate": "test_manifests/synapse_storage_manifest_patient.csv"}.
+        Returns:
+            Trace: the trace
+        """
+        payloads = payloads or {}
+        requests = []
+        skipped = 0
+        # POST requests of endpoints without a payload can not be replayed
+        missing_payloads: Dict[str, int] = {}
+        for line in lines:
+            request = _REQUEST_LINE.search(line)
+            timestamp = (
+                None if request is None else _parse_log_time(line, request.end())
+            )
+            if timestamp is None:
+                skipped += bool(line.strip())
+                continue
+            target = urlsplit(request["target"])
+            if not target.path.startswith(base_path):
+                continue
+            endpoint = target.path[len(base_path) :]
+            method = request["method"]
+            if method == "POST" and endpoint not in payloads:
+                missing_payloads[endpoint] = missing_payloads.get(endpoint, 0) + 1
+                continue
+            requests.append(
+                (
+                    timestamp,
+                    TraceEvent(
+                        offset_s=0,
+                        endpoint=endpoint,
+                        params=dict(parse_qsl(target.query)),
+                        method=method,
+                        payload=payloads.get(endpoint) if method == "POST" else None,
+                    ),
+                )
+            )
+        if skipped:
+            logger.warning(f"skipped {skipped} lines that could not be parsed")
+        for endpoint, count in missing_payloads.items():
+            logger.warning(
+                f"skipped {count} POST requests to {endpoint}, which has no payload. Give it a manifest with --payload."
+            )
+        if not requests:
+            return cls()
+        first = min(timestamp for timestamp, _ in requests)
+        for timestamp, event in requests:
+            event.offset_s = (timestamp - first).total_seconds()
+        return cls([event for _, event in requests])
+
+
+def _parse_log_time(line: str, request_end: int) -> Optional[datetime]:
+    match = _CLF_TIME.search(line)
+    if match:
+        try:
+            return datetime.strptime(match["time"], "%d/%b/%Y:%H:%M:%S %z")
+        except ValueError:
+            return None
+    # AWS load balancer logs start with the time the response was sent,
+    # the time the request was received (request_creation_time) comes after the request line
+    match = _ISO_TIME.search(line, request_end) or _ISO_TIME.search(line)
+    if match:
+        return datetime.fromisoformat(match["time"].replace("Z", "+00:00"))
+    return None
+
+
+@dataclass
+class ReplayResult:
+    """
+    Result of replaying a trace
+
+    Attributes:
+        dt_string (str): start time of the replay
+        speed (float): speed factor of the replay
+        wall_time_ns (int): time it took to replay the whole trace, in nanoseconds
+        endpoints (Dict[str, RunStats]): statistics of the requests of every endpoint
+        lag (LatencyHistogram): how late every request was sent compared to its scheduled time, in nanoseconds.
+            A high lag means that the profiler could not keep up with the trace.
+    """
+
+    dt_string: str
+    speed: float
+    wall_time_ns: int = 0
+    endpoints: Dict[str, RunStats] = field(default_factory=dict)
+    lag: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_rows(self, description: str) -> MultiRow:
+        """
+        Create one result row per endpoint
+        Args:
+            description (str): description of the replay. The endpoint and the speed get appended to it.
+        Returns:
+            MultiRow: a row for every endpoint
+        """
+        return [
+            save_run_time_result(
+                endpoint_name=endpoint,
+                description=f"{description} Requests to {endpoint} replayed at {self.speed}x speed.",
+                dt_string=self.dt_string,
+                num_concurrent=run_stats.achieved_concurrency,
+                latency=round(self.wall_time_ns / NS_PER_S, 2),
+                status_code_dict=run_stats.status_code_dict(),
+                run_stats=run_stats,
+            )
+            for endpoint, run_stats in self.endpoints.items()
+        ]
+
+
+def replay_trace(
+    trace: Trace,
+    speed: float = 1.0,
+    headers: dict = None,
+    base_url: str = BASE_URL,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> ReplayResult:
+    """
+    Send the requests of a trace with their original timing, compressed or stretched by a speed factor.
+    Every request is sent with send_request or send_post_request at its scheduled time, whether or not earlier requests have returned.
+    Like the clients of the recorded traffic, every request opens its own connection.
+    Args:
+        trace (Trace): the trace to replay
+        speed (float): speed factor, for example 3 to replay an hour of traffic in 20 minutes or 0.5 to replay it in two hours. Defaults to 1.
+        headers (dict): headers used for API requests. For example, authorization headers.
+        base_url (str): url of the schematic API. Defaults to BASE_URL.
+        max_in_flight (int): maximum number of requests in flight. Requests beyond it wait, which shows up as lag. Defaults to 256.
+    Returns:
+        ReplayResult: statistics of every endpoint and the lag of the replay
+    """
+    if speed <= 0:
+        raise ValueError("speed must be positive")
+    without_payload = sorted(
+        {
+            event.endpoint
+            for event in trace.events
+            if event.method == "POST" and event.payload is None
+        }
+    )
+    if without_payload:
+        raise ValueError(
+            f"POST requests to {without_payload} have no payload to send. Please set the payload of these events."
+        )
+    result = ReplayResult(dt_string=return_time_now(), speed=speed)
+    trackers: Dict[str, ConcurrencyTracker] = {}
+    lock = threading.Lock()
+
+    def send(event: TraceEvent, intended_start: int) -> None:
+        with lock:
+            result.lag.record(max(time.perf_counter_ns() - intended_start, 0))
+            tracker = trackers.setdefault(event.endpoint, ConcurrencyTracker())
+        url = f"{base_url}/{event.endpoint}"
+        with tracker:
+            if event.method == "POST":
+                *_, run_stats = send_post_request(
+                    url,
+                    event.params,
+                    1,
+                    send_manifest,
+                    event.payload,
+                    headers,
+                    COLD_CONNECTION,
+                )
+            else:
+                *_, run_stats = send_request(
+                    url, event.params, 1, headers, COLD_CONNECTION
+                )
+        with lock:
+            result.endpoints.setdefault(
+                event.endpoint, RunStats(connection_mode=run_stats.connection_mode)
+            ).merge(run_stats)
+
+    logger.info(
+        f"replaying {len(trace.events)} requests over {trace.duration_s / speed:.0f} seconds ({speed}x speed)"
+    )
+    start_time = time.perf_counter_ns()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = []
+        for event in trace.events:
+            intended_start = start_time + int(event.offset_s / speed * NS_PER_S)
+            delay_ns = intended_start - time.perf_counter_ns()
+            if delay_ns > 0:
+                time.sleep(delay_ns / NS_PER_S)
+            futures.append(executor.submit(send, event, intended_start))
+        for future in futures:
+            future.result()
+    result.wall_time_ns = time.perf_counter_ns() - start_time
+    for endpoint, run_stats in result.endpoints.items():
+        run_stats.wall_time_ns = result.wall_time_ns
+        run_stats.achieved_concurrency = trackers[endpoint].peak
+        run_stats.arrival_rate = round(
+            sum(event.endpoint == endpoint for event in trace.events)
+            / (result.wall_time_ns / NS_PER_S),
+            3,
+        )
+
+    for endpoint, run_stats in result.endpoints.items():
+        logger.info(
+            f"{endpoint}: {run_stats.latency.count} successful requests, latency (ms): {run_stats.latency.summary()}, outcomes: {run_stats.outcomes}"
+        )
+    logger.info(f"lag behind the trace (ms): {result.lag.summary()}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert access logs to request traces and replay them against the schematic API"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser(
+        "convert", help="convert an access log export to a capture file"
+    )
+    convert.add_argument("access_log", help="file path of the access log")
+    convert.add_argument("trace", help="file path of the capture file to write")
+    convert.add_argument(
+        "--base-path",
+        default=DEFAULT_BASE_PATH,
+        help="path prefix of the schematic API",
+    )
+    convert.add_argument(
+        "--payload",
+        nargs="+",
+        default=[],
+        metavar="ENDPOINT=MANIFEST",
+        help="manifest to upload for post requests to an endpoint, e.g. model/validate=test_manifests/synapse_storage_manifest_patient.csv",
+    )
+    replay = subparsers.add_parser("replay", help="replay a capture file")
+    replay.add_argument("trace", help="file path of the capture file")
+    replay.add_argument(
+        "--speed", type=float, default=1.0, help="speed factor, e.g. 3 for 3x speed"
+    )
+    replay.add_argument(
+        "--start",
+        type=float,
+        default=0,
+        help="start of the slice to replay, in seconds",
+    )
+    replay.add_argument(
+        "--duration", type=float, help="length of the slice to replay, in seconds"
+    )
+    replay.add_argument(
+        "--store",
+        action="store_true",
+        help="store the rows of every endpoint in the local result store",
+    )
+    replay.add_argument(
+        "--synapse",
+        action="store_true",
+        help="also export the new rows of the local result store to synapse",
+    )
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        with open(args.access_log) as log_file:
+            trace = Trace.from_access_log(
+                log_file,
+                args.base_path,
+                dict(payload.split("=", 1) for payload in args.payload),
+            )
+        trace.save(args.trace)
+        print(
+            f"Recorded {len(trace.events)} requests over {trace.duration_s:.0f} seconds"
+        )
+    else:
+        trace = Trace.load(args.trace)
+        if args.start or args.duration:
+            trace = trace.window(args.start, args.duration or trace.duration_s + 1)
+        token = StoreRuntime.get_access_token()
+        replay_result = replay_trace(
+            trace, args.speed, headers={"Authorization": f"Bearer {token}"}
+        )
+        if args.store:
+            with ResultStore() as store:
+                store.append_rows(
+                    replay_result.to_rows(f"Replaying {args.trace}."),
+                    run_stats=list(replay_result.endpoints.values()),
+                )
+                if args.synapse:
+                    store.export_synapse()
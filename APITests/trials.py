@@ -0,0 +1,242 @@
+import logging
+import math
+import random
+import statistics
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from latency_stats import NS_PER_MS, REPORTED_PERCENTILES, RunStats
+
+logger = logging.getLogger("trials")
+
+# a trial sends a batch of requests and returns start time, duration, status codes and statistics, like send_request
+Trial = Callable[[], Tuple[str, float, dict, RunStats]]
+
+DEFAULT_WARMUP = 1
+DEFAULT_TRIALS = 10
+# trials that are further than this many interquartile ranges away from the quartiles are outliers (Tukey's far out values)
+DEFAULT_OUTLIER_IQR_FACTOR = 3.0
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BOOTSTRAP_RESAMPLES = 2000
+# adaptive runs never stop before this many trials
+MIN_TRIALS = 3
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Get a percentile with the nearest rank method, like LatencyHistogram does
+    Args:
+        values (Sequence[float]): values, in any order
+        p (float): percentile between 0 and 100
+    Returns:
+        float: the value at the given percentile
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def split_outliers(
+    values: Sequence[float], iqr_factor: float = DEFAULT_OUTLIER_IQR_FACTOR
+) -> Tuple[List[float], List[float]]:
+    """
+    Separate outliers with Tukey's fences
+    Args:
+        values (Sequence[float]): values to check
+        iqr_factor (float): how many interquartile ranges below the first quartile or above the third quartile a value must be to be an outlier. Defaults to 3.
+    Returns:
+        Tuple[List[float], List[float]]: values to keep and outliers
+    """
+    if len(values) < 4:
+        return list(values), []
+    q1, q3 = percentile(values, 25), percentile(values, 75)
+    low, high = q1 - iqr_factor * (q3 - q1), q3 + iqr_factor * (q3 - q1)
+    kept = [value for value in values if low <= value <= high]
+    outliers = [value for value in values if not low <= value <= high]
+    return kept, outliers
+
+
+def bootstrap_interval(
+    values: Sequence[float],
+    statistic: Callable[[Sequence[float]], float],
+    confidence: float = DEFAULT_CONFIDENCE,
+    resamples: int = DEFAULT_BOOTSTRAP_RESAMPLES,
+    seed: int = 0,
+) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Estimate a confidence interval of a statistic with the percentile bootstrap
+    Args:
+        values (Sequence[float]): observed values
+        statistic (Callable): function computing the statistic of a sample, for example statistics.fmean
+        confidence (float): confidence level of the interval. Defaults to 0.95.
+        resamples (int): number of bootstrap resamples. Defaults to 2000.
+        seed (int): seed of the random generator, so that the interval is reproducible. Defaults to 0.
+    Returns:
+        Tuple[Optional[float], Optional[float]]: lower and upper bound, or None if there are fewer than two values
+    """
+    if len(values) < 2:
+        return None, None
+    rng = random.Random(seed)
+    estimates = sorted(
+        statistic(rng.choices(values, k=len(values))) for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2 * 100
+    return percentile(estimates, tail), percentile(estimates, 100 - tail)
+
+
+@dataclass
+class TrialResults:
+    """
+    Results of running the same batch of requests several times
+
+    Attributes:
+        samples (List[float]): median request latency of every measured trial, in milliseconds, outliers excluded
+        outliers (List[float]): median request latency of the trials that were left out as outliers, in milliseconds
+        trial_percentiles (Dict[int, List[float]]): every reported percentile of the request latency of every measured trial,
+            in milliseconds, outliers excluded
+        failed_trials (int): number of measured trials without any successful request
+        dt_string (str): start time of the first measured trial
+        time_diff (float): mean duration of the measured trials, in seconds
+        status_code_dict (dict): status codes of all measured trials added up, outliers included
+        run_stats (RunStats): statistics of the measured trials, merged. Outliers are left out, failed trials are kept.
+        confidence (float): confidence level of the intervals
+    """
+
+    samples: List[float] = field(default_factory=list)
+    outliers: List[float] = field(default_factory=list)
+    trial_percentiles: Dict[int, List[float]] = field(default_factory=dict)
+    failed_trials: int = 0
+    dt_string: Optional[str] = None
+    time_diff: Optional[float] = None
+    status_code_dict: dict = field(default_factory=dict)
+    run_stats: RunStats = field(default_factory=RunStats)
+    confidence: float = DEFAULT_CONFIDENCE
+
+    @property
+    def mean(self) -> Optional[float]:
+        return statistics.fmean(self.samples) if self.samples else None
+
+    def mean_interval(self) -> Tuple[Optional[float], Optional[float]]:
+        """bootstrap confidence interval of the mean trial latency"""
+        return bootstrap_interval(self.samples, statistics.fmean, self.confidence)
+
+    def summary(self) -> Dict[str, object]:
+        """
+        Summarize the trials in milliseconds
+        Returns:
+            Dict[str, object]: number of trials, outliers and failed trials, the mean of the trial latencies and,
+                for every reported percentile of the request latency, its mean over the trials. Each comes with a bootstrap
+                confidence interval across trials.
+        """
+
+        def rounded(values: Tuple[Optional[float], ...]) -> List[Optional[float]]:
+            return [None if value is None else round(value, 2) for value in values]
+
+        summary = {
+            "trials": len(self.samples),
+            "outliers": len(self.outliers),
+            "failed_trials": self.failed_trials,
+            "confidence": self.confidence,
+        }
+        if not self.samples:
+            return summary
+        summary["mean"] = round(self.mean, 2)
+        summary["mean_ci"] = rounded(self.mean_interval())
+        for p, values in self.trial_percentiles.items():
+            summary[f"p{p}"] = round(statistics.fmean(values), 2)
+            summary[f"p{p}_ci"] = rounded(
+                bootstrap_interval(values, statistics.fmean, self.confidence)
+            )
+        return summary
+
+
+def _relative_half_width(results: TrialResults) -> Optional[float]:
+    low, high = results.mean_interval()
+    if low is None or not results.mean:
+        return None
+    return (high - low) / 2 / results.mean
+
+
+def run_trials(
+    trial: Trial,
+    trials: int = DEFAULT_TRIALS,
+    warmup: int = DEFAULT_WARMUP,
+    outlier_iqr_factor: Optional[float] = DEFAULT_OUTLIER_IQR_FACTOR,
+    confidence: float = DEFAULT_CONFIDENCE,
+    target_relative_ci: Optional[float] = None,
+) -> TrialResults:
+    """
+    Run a batch of requests several times: warmup trials are discarded, then the measured trials are recorded
+    Args:
+        trial (Trial): function that runs one trial, for example functools.partial(send_request, url, params, 1)
+        trials (int): maximum number of measured trials. Defaults to 10.
+        warmup (int): number of trials run first and discarded, to warm up caches and connections. Defaults to 1.
+        outlier_iqr_factor (Optional[float]): trials further than this many interquartile ranges away from the quartiles
+            are left out as outliers. Defaults to 3. Set to None to keep all trials.
+        confidence (float): confidence level of the intervals. Defaults to 0.95.
+        target_relative_ci (Optional[float]): if provided, stop as soon as the confidence interval of the mean is narrower
+            than +/- this fraction of the mean (for example 0.05), after at least 3 trials. Defaults to None.
+    Returns:
+        TrialResults: latency of every trial, outliers, confidence intervals and merged statistics
+    """
+    if trials < 1 or warmup < 0:
+        raise ValueError("trials must be at least 1 and warmup can not be negative")
+    for i in range(warmup):
+        logger.info(f"running warmup trial {i + 1} of {warmup}")
+        trial()
+
+    results = TrialResults(confidence=confidence)
+    measured: List[float] = []
+    durations: List[float] = []
+    # statistics and median latency of every measured trial, merged once the outliers are known
+    trial_stats: List[Tuple[RunStats, Optional[float]]] = []
+    for i in range(trials):
+        dt_string, time_diff, status_code_dict, run_stats = trial()
+        results.dt_string = results.dt_string or dt_string
+        durations.append(time_diff)
+        for status_code, count in status_code_dict.items():
+            results.status_code_dict[status_code] = (
+                results.status_code_dict.get(status_code, 0) + count
+            )
+        if i == 0:
+            results.run_stats.connection_mode = run_stats.connection_mode
+
+        median_ns = run_stats.latency.percentile(50)
+        if median_ns is None:
+            results.failed_trials += 1
+            trial_stats.append((run_stats, None))
+        else:
+            measured.append(median_ns / NS_PER_MS)
+            trial_stats.append((run_stats, median_ns / NS_PER_MS))
+
+        # one outlier trial must not keep an adaptive run going until the maximum number of trials
+        results.samples = (
+            measured
+            if outlier_iqr_factor is None
+            else split_outliers(measured, outlier_iqr_factor)[0]
+        )
+        if target_relative_ci is not None and len(measured) >= MIN_TRIALS:
+            half_width = _relative_half_width(results)
+            if half_width is not None and half_width <= target_relative_ci:
+                logger.info(
+                    f"stopping after {i + 1} trials, the mean is known within +/- {half_width:.1%}"
+                )
+                break
+
+    results.samples = measured
+    if outlier_iqr_factor is not None:
+        results.samples, results.outliers = split_outliers(measured, outlier_iqr_factor)
+    # outliers are decided by value, so trials with the same median are all kept or all left out
+    outliers = set(results.outliers)
+    for run_stats, median_ms in trial_stats:
+        if median_ms in outliers:
+            continue
+        results.run_stats.merge(run_stats, sequential=True)
+        if median_ms is not None:
+            for p in REPORTED_PERCENTILES:
+                results.trial_percentiles.setdefault(p, []).append(
+                    run_stats.latency.percentile(p) / NS_PER_MS
+                )
+    results.time_diff = round(statistics.fmean(durations), 2)
+    logger.info(f"trial latency (ms): {results.summary()}")
+    return results
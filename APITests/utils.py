@@ -1,17 +1,44 @@
 import concurrent.futures
+import functools
+import json
 import logging
 import os
+import socket
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Callable, Tuple, List, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Tuple, List, Sequence, Union
 
 import pytz
 import requests
-import synapseclient
-from requests import Response
-from requests.exceptions import InvalidSchema
-from synapseclient import Table
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (
+    ChunkedEncodingError,
+    InvalidHeader,
+    InvalidSchema,
+    InvalidURL,
+    MissingSchema,
+    RequestException,
+    SSLError,
+    Timeout,
+)
+from urllib3.exceptions import HTTPError as Urllib3HTTPError, ReadTimeoutError
+from urllib3.filepost import encode_multipart_formdata
+
+from latency_stats import (
+    CONNECTION_ERROR,
+    NS_PER_S,
+    TIMEOUT,
+    TLS_ERROR,
+    ConcurrencyTracker,
+    RunStats,
+)
+
+if TYPE_CHECKING:
+    import synapseclient
 
 
 # Create a custom formatter with colors
@@ -54,53 +81,397 @@ HTAN_SCHEMA_URL = (
 
 DATA_FLOW_SCHEMA_URL = "https://raw.githubusercontent.com/Sage-Bionetworks/data_flow/main/inst/data_model/dataflow_component.csv"
 
-BASE_URL = "https://schematic-dev.api.sagebionetworks.org/v1"
+# set SCHEMATIC_API_URL to profile another schematic instance, for example the mock server of mock_server.py
+BASE_URL = os.environ.get(
+    "SCHEMATIC_API_URL", "https://schematic-dev.api.sagebionetworks.org/v1"
+)
 
 # define type Row
 Row = List[Union[str, int, dict, bool]]
 MultiRow = List[Row]
 
+# names of the columns of a Row, in order
+# columns of every row (see save_run_time_result)
+BASE_ROW_COLUMNS = (
+    "endpoint",
+    "description",
+    "data_schema",
+    "num_rows",
+    "data_type",
+    "output_format",
+    "restrict_rules",
+    "asset_view",
+    "start_time",
+    "manifest_record_type",
+    "num_concurrent",
+    "latency",
+    "num_status_200",
+    "num_status_500",
+    "num_status_504",
+    "num_status_503",
+)
+# columns added when the statistics of the run are provided
+RUN_STATS_COLUMNS = (
+    "min_ms",
+    "mean_ms",
+    "p50_ms",
+    "p90_ms",
+    "p95_ms",
+    "p99_ms",
+    "max_ms",
+    "throughput",
+    "connection_mode",
+    "achieved_concurrency",
+    "arrival_rate",
+    "service_time",
+    "phases",
+    "transfer",
+    "outcomes",
+    "failure_time",
+)
+# columns added by run_scenario (trials) and by run_schedule (schedule_mode and overlapping)
+SCENARIO_COLUMNS = ("trials", "schedule_mode", "overlapping")
+ROW_COLUMNS = BASE_ROW_COLUMNS + RUN_STATS_COLUMNS + SCENARIO_COLUMNS
+
+# synapse table of the results. It was created with the BASE_ROW_COLUMNS, StoreRuntime.migrate_synapse_table adds the others.
+SYNAPSE_RESULT_TABLE = "syn51385540"
+# synapse type of every column added to the result table, matching the type of its values in a row.
+# Dicts and lists, such as the outcomes or the overlapping scenarios of a run, are uploaded as json text.
+SYNAPSE_EXTRA_COLUMN_TYPES = {
+    "min_ms": "DOUBLE",
+    "mean_ms": "DOUBLE",
+    "p50_ms": "DOUBLE",
+    "p90_ms": "DOUBLE",
+    "p95_ms": "DOUBLE",
+    "p99_ms": "DOUBLE",
+    "max_ms": "DOUBLE",
+    "throughput": "DOUBLE",
+    "connection_mode": "STRING",
+    "achieved_concurrency": "INTEGER",
+    "arrival_rate": "DOUBLE",
+    "service_time": "LARGETEXT",
+    "phases": "LARGETEXT",
+    "transfer": "LARGETEXT",
+    "outcomes": "LARGETEXT",
+    "failure_time": "LARGETEXT",
+    "trials": "LARGETEXT",
+    "schedule_mode": "STRING",
+    "overlapping": "LARGETEXT",
+}
+
+
+def row_to_dict(row: Row) -> Dict[str, Any]:
+    """
+    Name the values of a row
+    Args:
+        row (Row): a result row
+    Returns:
+        Dict[str, Any]: the values of the row by column name. Columns that the row does not have are left out.
+    """
+    if len(row) > len(ROW_COLUMNS):
+        raise ValueError(
+            f"a row has at most {len(ROW_COLUMNS)} columns, got {len(row)}"
+        )
+    return dict(zip(ROW_COLUMNS, row))
+
+
+def synapse_table_row(row: Row, columns: Sequence[str]) -> list:
+    """
+    Project a row onto the columns of a synapse table
+    Args:
+        row (Row): a result row
+        columns (Sequence[str]): names of the columns of the table, in order
+    Returns:
+        list: the value of every column. Dicts and lists are encoded as json, columns the row does not have are None.
+    """
+    values = row_to_dict(row)
+    return [
+        (
+            json.dumps(values[column])
+            if isinstance(values.get(column), (dict, list))
+            else values.get(column)
+        )
+        for column in columns
+    ]
+
+
+# connection modes
+# cold: every request opens a new connection and pays for the TCP and TLS handshake
+# warm: requests reuse keep-alive connections from a shared connection pool
+COLD_CONNECTION = "cold"
+WARM_POOLED = "warm"
+CONNECTION_MODES = (COLD_CONNECTION, WARM_POOLED)
+
+# load engines
+# threads: one thread per concurrent request, using the requests library
+# async: all requests are sent from a single asyncio event loop, see async_engine.py
+THREAD_ENGINE = "threads"
+ASYNC_ENGINE = "async"
+ENGINES = (THREAD_ENGINE, ASYNC_ENGINE)
+
+# errors of requests that mean that the caller asked for an invalid request, raised instead of being recorded as an outcome
+CALLER_ERRORS = (InvalidSchema, InvalidURL, MissingSchema, InvalidHeader)
+
+# size of the chunks streamed response bodies are read in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# default deadline of every request, in seconds
+DEFAULT_TIMEOUT_S = 600
+# number of encoded manifests kept in memory (see load_manifest_payload)
+MANIFEST_CACHE_SIZE = 8
+
+# sessions shared by all threads, keyed by the size of their connection pool
+_pooled_sessions: Dict[int, Session] = {}
+_pooled_sessions_lock = threading.Lock()
+# synapse clients shared by all threads, keyed by access token and process id
+_synapse_clients: Dict[Tuple[str, int], "synapseclient.Synapse"] = {}
+_synapse_clients_lock = threading.Lock()
+
+
+def get_pooled_session(pool_size: int) -> Session:
+    """
+    Get a session that keeps connections alive and shares them across threads.
+    Sessions are created once per pool size and reused afterwards, so connections opened by a run are still warm for the next run.
+    Args:
+        pool_size (int): maximum number of connections kept per host. Should be the number of concurrent requests.
+    Returns:
+        Session: a requests session backed by a connection pool
+    """
+    with _pooled_sessions_lock:
+        session = _pooled_sessions.get(pool_size)
+        if session is None:
+            session = Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _pooled_sessions[pool_size] = session
+        return session
+
+
+def get_session(connection_mode: str, pool_size: int) -> Union[Session, None]:
+    """
+    Get the session to send requests with for a given connection mode
+    Args:
+        connection_mode (str): either "cold" or "warm"
+        pool_size (int): number of concurrent requests
+    Returns:
+        Union[Session, None]: a pooled session in warm mode, None in cold mode
+    """
+    if connection_mode not in CONNECTION_MODES:
+        raise ValueError(
+            f"Unknown connection mode {connection_mode}. Please use one of {CONNECTION_MODES}"
+        )
+    if connection_mode == WARM_POOLED:
+        return get_pooled_session(pool_size)
+    return None
+
+
+def check_engine(engine: str) -> None:
+    """
+    Make sure that a load engine exists
+    Args:
+        engine (str): name of the load engine
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}. Please use one of {ENGINES}")
+
+
+class DeadlineExceeded(Timeout):
+    """the response was not received before the deadline of the request"""
+
+
+def _shutdown(sock: socket.socket) -> None:
+    # shutting the socket down, unlike closing it, wakes up a thread blocked reading from it
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def read_before_deadline(response: Response, deadline_ns: int, stream: bool) -> None:
+    """
+    Read the body of a response sent with stream=True, and give up once the deadline of the request has passed.
+    The timeout of requests only bounds the wait for every byte, so a server that keeps sending a few bytes at a time
+    would never time out. The connection is shut down at the deadline instead, like the async engine cancels the request.
+    Args:
+        response (Response): the response, whose body was not read yet
+        deadline_ns (int): time (time.perf_counter_ns) by which the whole response must be received
+        stream (bool): if True, the body is counted and discarded (see response_size). Otherwise it is kept as the content of the response.
+    """
+    remaining_s = (deadline_ns - time.perf_counter_ns()) / NS_PER_S
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if remaining_s <= 0:
+        response.close()
+        raise DeadlineExceeded(f"no response from {response.url} before the deadline")
+    timer = None
+    if sock is not None:
+        timer = threading.Timer(remaining_s, _shutdown, [sock])
+        timer.daemon = True
+        timer.start()
+    try:
+        if stream:
+            # count the bytes received over the network, without decompressing them
+            response.streamed_size = sum(
+                len(chunk)
+                for chunk in response.raw.stream(
+                    STREAM_CHUNK_SIZE, decode_content=False
+                )
+            )
+        else:
+            response.content
+    except (RequestException, Urllib3HTTPError, OSError) as err:
+        if time.perf_counter_ns() >= deadline_ns:
+            raise DeadlineExceeded(
+                f"the body of {response.url} was not received before the deadline"
+            ) from err
+        if isinstance(err, ReadTimeoutError):
+            raise Timeout(err) from err
+        if isinstance(err, Urllib3HTTPError):
+            raise ChunkedEncodingError(err) from err
+        raise
+    finally:
+        # stop the timer before the connection goes back to the pool
+        if timer is not None:
+            timer.cancel()
+        response.close()
+    # a socket shut down at the deadline may end the body early, without an error
+    if time.perf_counter_ns() >= deadline_ns:
+        raise DeadlineExceeded(
+            f"the body of {response.url} was not received before the deadline"
+        )
+
 
-def fetch(url: str, params: dict, headers: dict = None) -> Response:
+def fetch(
+    url: str,
+    params: dict,
+    headers: dict = None,
+    session: Session = None,
+    stream: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Response:
     """
     Trigger a get request
     Args:
         url (str): the url to run a given api request
         params (dict): parameter of running a given api request
         headers (dict): headers used for API requests. For example, authorization headers.
+        session (Session): session to send the request with. If None, a new connection gets opened for the request.
+        stream (bool): if True, the response body is read in chunks and discarded instead of being kept in memory,
+            so that large responses do not grow the memory of the profiler. Defaults to False.
+        timeout (float): deadline of the request, in seconds (see read_before_deadline). Defaults to 600.
     Returns:
-        Response: a response object
+        Response: a response object. If streamed, its content is not available.
     """
-    response = requests.get(url, params=params, headers=headers)
+    deadline_ns = time.perf_counter_ns() + int(timeout * NS_PER_S)
+    response = (session or requests).get(
+        url, params=params, headers=headers, stream=True, timeout=timeout
+    )
+    read_before_deadline(response, deadline_ns, stream)
     return response
 
 
+def response_size(response: Response) -> int:
+    """
+    Get the number of bytes of a response body
+    Args:
+        response (Response): a response whose body was read, with or without streaming
+    Returns:
+        int: size of the body received over the network. For chunked responses that were not streamed, size of the decoded body.
+    """
+    streamed_size = getattr(response, "streamed_size", None)
+    if streamed_size is not None:
+        return streamed_size
+    # urllib3 does not count the bytes of chunked bodies
+    return response.raw.tell() or len(response.content)
+
+
+@dataclass(frozen=True)
+class ManifestPayload:
+    """
+    A manifest encoded once as a multipart form, ready to be sent by any number of requests
+
+    Attributes:
+        path (str): absolute file path of the manifest
+        body (bytes): multipart body. The same immutable object is shared by all requests, so sending it does not copy the manifest.
+        content_type (str): content type of the body, including the multipart boundary
+    """
+
+    path: str
+    body: bytes
+    content_type: str
+
+    @property
+    def num_rows(self) -> int:
+        """number of rows of the manifest, not counting the header"""
+        with open(self.path, "rb") as manifest:
+            return max(sum(1 for _ in manifest) - 1, 0)
+
+
+def load_manifest_payload(manifest_path: str) -> ManifestPayload:
+    """
+    Read a manifest and encode it as the "file_name" field of a multipart form. The file is only read the first time a path is requested,
+    as long as it is one of the MANIFEST_CACHE_SIZE manifests used last.
+    Args:
+        manifest_path (str): file path of a manifest, relative to the current working directory
+    Returns:
+        ManifestPayload: the encoded manifest
+    """
+    # the same manifest is cached once, however its path is written and whatever the working directory is
+    return _encode_manifest(os.path.abspath(manifest_path))
+
+
+@functools.lru_cache(maxsize=MANIFEST_CACHE_SIZE)
+def _encode_manifest(test_manifest_path: str) -> ManifestPayload:
+    if not os.path.exists(test_manifest_path):
+        logger.error(
+            "the manifest does not exist. Please provide a valid manifest file path"
+        )
+        raise FileNotFoundError(test_manifest_path)
+
+    with open(test_manifest_path, "rb") as manifest:
+        fields = {"file_name": (os.path.basename(test_manifest_path), manifest.read())}
+    body, content_type = encode_multipart_formdata(fields)
+    return ManifestPayload(test_manifest_path, body, content_type)
+
+
+# drops every cached manifest, for example after sending large synthetic manifests
+load_manifest_payload.cache_clear = _encode_manifest.cache_clear
+
+
 def send_manifest(
-    url: str, params: dict, headers: dict = None, manifest_path=None
+    url: str,
+    params: dict,
+    headers: dict = None,
+    manifest_path=None,
+    session: Session = None,
+    timeout: float = DEFAULT_TIMEOUT_S,
 ) -> Response:
     """Send an API request to an endpoint
     Args:
         url (str): the url to run a given api request
         params (dict): parameters of running the post request
         headers (dict): headers used for API requests. For example, authorization headers.
-        manifest_path (str): file path of a manifest
+        manifest_path (str): file path of a manifest. The manifest is only read and encoded the first time it is sent.
+        session (Session): session to send the request with. If None, a new connection gets opened for the request.
+        timeout (float): deadline of the request, in seconds (see read_before_deadline). Defaults to 600.
     Returns:
         Response: a response object
     """
-    wd = os.getcwd()
-    test_manifest_path = os.path.join(wd, manifest_path)
-
-    if not os.path.exists(test_manifest_path):
-        logger.error(
-            "the manifest does not exist. Please provide a valid manifest file path"
-        )
+    deadline_ns = time.perf_counter_ns() + int(timeout * NS_PER_S)
+    payload = load_manifest_payload(manifest_path)
 
-    return requests.post(
+    response = (session or requests).post(
         url,
         params=params,
-        headers=headers,
-        files={"file_name": open(test_manifest_path, "rb")},
+        headers={**(headers or {}), "Content-Type": payload.content_type},
+        data=payload.body,
+        stream=True,
+        timeout=timeout,
     )
+    read_before_deadline(response, deadline_ns, stream=False)
+    return response
 
 
 def send_post_request(
@@ -110,7 +481,11 @@ def send_post_request(
     manifest_to_send_func: Callable[[str, dict], Response],
     file_path_manifest: str,
     headers: dict = None,
-) -> Tuple[str, float, dict]:
+    connection_mode: str = WARM_POOLED,
+    engine: str = THREAD_ENGINE,
+    processes: int = 1,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
     """
     sending post requests
     Args:
@@ -119,35 +494,94 @@ def send_post_request(
         concurrent_threads (int): number of concurrent threads
         manifest_to_send_func (Callable): a function that sends a post request that upload a manifest to be sent
         headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        engine (str): "threads" to send each request from its own thread or "async" to send all requests from one asyncio event loop. Defaults to "threads". The async engine uploads the manifest the same way send_manifest does.
+        processes (int): number of processes to spread the concurrent requests across. Each process runs the given engine. Defaults to 1.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
 
     Returns:
         dt_string (str): start time of running the API endpoints.
         time_diff (float): time of finish running all requests.
         all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
     Todo:
         specify exception
     """
+    check_engine(engine)
     try:
         # send request and calculate run time
-        dt_string, time_diff, status_code_dict = cal_time_api_call_post_request(
-            base_url,
-            params,
-            concurrent_threads,
-            manifest_to_send_func,
-            file_path_manifest=file_path_manifest,
-            headers=headers,
-        )
+        if processes > 1:
+            from process_engine import cal_time_api_call_post_request_multiprocess
+
+            (
+                dt_string,
+                time_diff,
+                status_code_dict,
+                run_stats,
+            ) = cal_time_api_call_post_request_multiprocess(
+                base_url,
+                params,
+                concurrent_threads,
+                manifest_to_send_func,
+                file_path_manifest=file_path_manifest,
+                headers=headers,
+                connection_mode=connection_mode,
+                engine=engine,
+                num_processes=processes,
+                timeout=timeout,
+            )
+        elif engine == ASYNC_ENGINE:
+            from async_engine import cal_time_api_call_post_request_async
+
+            (
+                dt_string,
+                time_diff,
+                status_code_dict,
+                run_stats,
+            ) = cal_time_api_call_post_request_async(
+                base_url,
+                params,
+                concurrent_threads,
+                file_path_manifest=file_path_manifest,
+                headers=headers,
+                connection_mode=connection_mode,
+                timeout=timeout,
+            )
+        else:
+            (
+                dt_string,
+                time_diff,
+                status_code_dict,
+                run_stats,
+            ) = cal_time_api_call_post_request(
+                base_url,
+                params,
+                concurrent_threads,
+                manifest_to_send_func,
+                file_path_manifest=file_path_manifest,
+                headers=headers,
+                connection_mode=connection_mode,
+                timeout=timeout,
+            )
     # TO DO: add more details about raising different exception
     # Should exception based on response type?
     except Exception as err:
         print(f"Unexpected {err=}, {type(err)=}")
         raise
-    return dt_string, time_diff, status_code_dict
+    return dt_string, time_diff, status_code_dict, run_stats
 
 
 def send_request(
-    base_url: str, params: dict, concurrent_threads: int, headers: dict = None
-) -> Tuple[str, float, dict]:
+    base_url: str,
+    params: dict,
+    concurrent_threads: int,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    engine: str = THREAD_ENGINE,
+    processes: int = 1,
+    stream: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
     """
     sending requests to different endpoint
     Args:
@@ -155,23 +589,169 @@ def send_request(
         base_url (str): url of endpoint
         concurrent_threads (int): number of concurrent threads
         headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        engine (str): "threads" to send each request from its own thread or "async" to send all requests from one asyncio event loop. Defaults to "threads".
+        processes (int): number of processes to spread the concurrent requests across. Each process runs the given engine. Defaults to 1.
+        stream (bool): if True, response bodies are read in chunks and discarded instead of being kept in memory,
+            so that many concurrent large responses (e.g. asset views) do not grow the memory of the profiler. Defaults to False.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
     Returns:
         dt_string (str): start time of running the API endpoints.
         time_diff (float): time of finish running all requests.
         all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
     """
-
+    check_engine(engine)
     try:
         # send request and calculate run time
-        dt_string, time_diff, status_code_dict = cal_time_api_call(
-            base_url, params, concurrent_threads, headers
-        )
+        if processes > 1:
+            from process_engine import cal_time_api_call_multiprocess
+
+            (
+                dt_string,
+                time_diff,
+                status_code_dict,
+                run_stats,
+            ) = cal_time_api_call_multiprocess(
+                base_url,
+                params,
+                concurrent_threads,
+                headers,
+                connection_mode,
+                engine=engine,
+                num_processes=processes,
+                stream=stream,
+                timeout=timeout,
+            )
+        elif engine == ASYNC_ENGINE:
+            from async_engine import cal_time_api_call_async
+
+            (
+                dt_string,
+                time_diff,
+                status_code_dict,
+                run_stats,
+            ) = cal_time_api_call_async(
+                base_url,
+                params,
+                concurrent_threads,
+                headers,
+                connection_mode,
+                stream=stream,
+                timeout=timeout,
+            )
+        else:
+            dt_string, time_diff, status_code_dict, run_stats = cal_time_api_call(
+                base_url,
+                params,
+                concurrent_threads,
+                headers,
+                connection_mode,
+                stream,
+                timeout,
+            )
     # TO DO: add more details about raising different exception
     # Should exception based on response type?
     except Exception as err:
         print(f"Unexpected {err=}, {type(err)=}")
         raise
-    return dt_string, time_diff, status_code_dict
+    return dt_string, time_diff, status_code_dict, run_stats
+
+
+def send_request_open_loop(
+    base_url: str,
+    params: dict,
+    arrival_rate: float,
+    duration_s: float,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    sending get requests at a constant arrival rate (open loop), whether or not earlier requests have returned.
+    Latency is measured from the time each request was scheduled to be sent.
+    Args:
+        base_url (str): url of endpoint
+        params (dict): a dictionary of parameters to send
+        arrival_rate (float): number of requests to send per second
+        duration_s (float): how long to keep sending requests, in seconds
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request, service time and throughput of the run.
+    """
+    from async_engine import cal_time_api_call_open_loop
+
+    try:
+        dt_string, time_diff, status_code_dict, run_stats = cal_time_api_call_open_loop(
+            base_url,
+            params,
+            arrival_rate,
+            duration_s,
+            headers,
+            connection_mode,
+            timeout,
+        )
+    except Exception as err:
+        print(f"Unexpected {err=}, {type(err)=}")
+        raise
+    return dt_string, time_diff, status_code_dict, run_stats
+
+
+def send_post_request_open_loop(
+    base_url: str,
+    params: dict,
+    arrival_rate: float,
+    duration_s: float,
+    file_path_manifest: str,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
+    """
+    uploading a manifest at a constant arrival rate (open loop), whether or not earlier requests have returned.
+    Latency is measured from the time each request was scheduled to be sent.
+    Args:
+        base_url (str): url of endpoint
+        params (dict): a dictionary of parameters to send
+        arrival_rate (float): number of requests to send per second
+        duration_s (float): how long to keep sending requests, in seconds
+        file_path_manifest (str): file path of the manifest to upload
+        headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
+    Returns:
+        dt_string (str): start time of running the API endpoints.
+        time_diff (float): time of finish running all requests.
+        all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request, service time and throughput of the run.
+    """
+    from async_engine import cal_time_api_call_post_request_open_loop
+
+    try:
+        (
+            dt_string,
+            time_diff,
+            status_code_dict,
+            run_stats,
+        ) = cal_time_api_call_post_request_open_loop(
+            base_url,
+            params,
+            arrival_rate,
+            duration_s,
+            file_path_manifest,
+            headers,
+            connection_mode,
+            timeout,
+        )
+    except Exception as err:
+        print(f"Unexpected {err=}, {type(err)=}")
+        raise
+    return dt_string, time_diff, status_code_dict, run_stats
 
 
 def return_time_now(name_funct_call: Callable = None) -> str:
@@ -193,9 +773,110 @@ def return_time_now(name_funct_call: Callable = None) -> str:
     return dt_string
 
 
+def timed_call(
+    func: Callable[..., Any], *args, tracker: ConcurrencyTracker = None
+) -> Tuple[Any, int]:
+    """
+    Call a function and measure how long it takes
+    Args:
+        func (Callable): function to call, for example a function that sends a request
+        *args: arguments passed to the function
+        tracker (ConcurrencyTracker, optional): if provided, the call is counted as in flight while it runs
+    Returns:
+        Tuple[Any, int]: the return value of the function and the elapsed time in nanoseconds
+    """
+    if tracker is None:
+        tracker = ConcurrencyTracker()
+    with tracker:
+        start = time.perf_counter_ns()
+        result = func(*args)
+        return result, time.perf_counter_ns() - start
+
+
+def classify_request_error(err: RequestException) -> str:
+    """
+    Get the outcome of a request that failed without a response. Errors of the caller (CALLER_ERRORS) are raised again.
+    Args:
+        err (RequestException): the error raised by requests
+    Returns:
+        str: "timeout", "tls_error" or "connection_error". Any other failure, for example a body that can not be decoded
+            or too many redirects, counts as a connection error, so that it does not abort the other requests of the run.
+    """
+    if isinstance(err, CALLER_ERRORS):
+        raise err
+    if isinstance(err, Timeout):
+        return TIMEOUT
+    if isinstance(err, SSLError):
+        return TLS_ERROR
+    return CONNECTION_ERROR
+
+
+def send_or_fail(func: Callable[..., Response], *args) -> Union[Response, str]:
+    """
+    Call a function that sends a request. If the request fails without a response, return its outcome instead of raising.
+    Args:
+        func (Callable): function that sends a request, for example fetch or send_manifest
+        *args: arguments passed to the function
+    Returns:
+        Union[Response, str]: the response, or "timeout", "tls_error" or "connection_error"
+    """
+    try:
+        return func(*args)
+    except RequestException as err:
+        return classify_request_error(err)
+
+
+def record_result(
+    run_stats: RunStats,
+    result: Union[Response, str],
+    elapsed_ns: int,
+    url: str,
+    params: dict,
+) -> None:
+    """
+    Record the outcome and latency of a request sent with requests
+    Args:
+        run_stats (RunStats): statistics of the run
+        result (Union[Response, str]): the response, or the outcome of a request that failed without a response
+        elapsed_ns (int): time from sending the request to its outcome, in nanoseconds
+        url (str): the url that users want to access (for logging purposes)
+        params (dict): the parameters used for the request (for logging purposes)
+    """
+    if isinstance(result, str):
+        run_stats.record_outcome(result, elapsed_ns)
+        logger.error(f"{result} running: {url} with using params {params}")
+        return
+    if not run_stats.record_outcome(str(result.status_code), elapsed_ns):
+        logger.error(
+            f"{result.status_code} error running: {url} with using params {params}"
+        )
+    run_stats.record_phases(response_phases(result, elapsed_ns))
+    run_stats.record_transfer(response_size(result), elapsed_ns)
+
+
+def response_phases(response: Response, elapsed_ns: int) -> Dict[str, int]:
+    """
+    Split the latency of a request sent with requests into phases.
+    requests does not expose DNS, connect and TLS times, so they are part of the time to first byte.
+    Args:
+        response (Response): the response
+        elapsed_ns (int): latency of the request, in nanoseconds
+    Returns:
+        Dict[str, int]: time to first byte (until the response headers were parsed) and time to download the body, in nanoseconds
+    """
+    ttfb_ns = min(int(response.elapsed.total_seconds() * NS_PER_S), elapsed_ns)
+    return {"ttfb": ttfb_ns, "body": elapsed_ns - ttfb_ns}
+
+
 def cal_time_api_call(
-    url: str, params: dict, concurrent_threads: int, headers: dict = None
-) -> Tuple[str, float, dict]:
+    url: str,
+    params: dict,
+    concurrent_threads: int,
+    headers: dict = None,
+    connection_mode: str = WARM_POOLED,
+    stream: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
     """
     calculate the latency of api calls by sending get requests.
     Args:
@@ -203,39 +884,56 @@ def cal_time_api_call(
         params (dict): the parameters need to use for the request
         concurrent_threads (int): number of concurrent threads requested by users
         headers (dict): a header of dictionary
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        stream (bool): if True, response bodies are read in chunks and discarded instead of being kept in memory. Defaults to False.
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
     Returns:
         dt_string (str): start time of running the API endpoints.
         time_diff (float): time of finish running all requests.
         all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
     """
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     # get time of running the api endpoint
     dt_string = return_time_now()
+    run_stats = RunStats(connection_mode=connection_mode)
+    session = get_session(connection_mode, concurrent_threads)
+    tracker = ConcurrencyTracker()
 
     # execute concurrent requests
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=concurrent_threads) as executor:
         futures = [
-            executor.submit(fetch, url, params, headers)
+            executor.submit(
+                timed_call,
+                send_or_fail,
+                fetch,
+                url,
+                params,
+                headers,
+                session,
+                stream,
+                timeout,
+                tracker=tracker,
+            )
             for x in range(concurrent_threads)
         ]
-        all_status_code = {"200": 0, "500": 0, "503": 0, "504": 0}
         for f in concurrent.futures.as_completed(futures):
             try:
-                status_code = f.result().status_code
-                status_code_str = str(status_code)
-                if status_code_str != "200":
-                    logger.error(
-                        f"{status_code} error running: {url} with using params {params}"
-                    )
-                all_status_code[status_code_str] = all_status_code[status_code_str] + 1
+                result, elapsed_ns = f.result()
+                record_result(run_stats, result, elapsed_ns, url, params)
             except InvalidSchema:
                 raise InvalidSchema(
                     f"No connection adapters were found for {url}. Please make sure that your URL is correct. "
                 )
 
-    time_diff = round(time.time() - start_time, 2)
-    logger.info(f"duration time of running {url}: {time_diff}")
-    return dt_string, time_diff, all_status_code
+    run_stats.wall_time_ns = time.perf_counter_ns() - start_time
+    run_stats.achieved_concurrency = tracker.peak
+    time_diff = round(run_stats.wall_time_ns / NS_PER_S, 2)
+    logger.info(
+        f"duration time of running {url}: {time_diff}, per request latency (ms): {run_stats.latency.summary()}, "
+        f"p50/p95/p99 of every phase (ms): {run_stats.phase_summary()}, outcomes: {run_stats.outcomes}"
+    )
+    return dt_string, time_diff, run_stats.status_code_dict(), run_stats
 
 
 def cal_time_api_call_post_request(
@@ -245,7 +943,9 @@ def cal_time_api_call_post_request(
     manifest_to_send_func: Callable[[str, dict], Response],
     file_path_manifest: str,
     headers: dict = None,
-) -> Tuple[str, float, dict]:
+    connection_mode: str = WARM_POOLED,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Tuple[str, float, dict, RunStats]:
     """
     calculate the latency of api calls by sending post.
     Args:
@@ -254,41 +954,57 @@ def cal_time_api_call_post_request(
         concurrent_threads (int): number of concurrent threads requested by users
         manifest_to_send_func (Callable): a function that sends a post request that upload a manifest to be sent
         headers (dict): headers used for API requests. For example, authorization headers.
+        connection_mode (str): "warm" to reuse pooled keep-alive connections or "cold" to open a new connection for every request. Defaults to "warm".
+        timeout (float): deadline of every request, in seconds. Requests that take longer are counted as "timeout". Defaults to 600.
     Returns:
         dt_string (str): start time of running the API endpoints.
         time_diff (float): time of finish running all requests.
         all_status_code (dict): dict; a dictionary that records the status code of run.
+        run_stats (RunStats): latency of each request and throughput of the run.
     """
-    start_time = time.time()
+    # read and encode the manifest before the timed region
+    load_manifest_payload(file_path_manifest)
+    start_time = time.perf_counter_ns()
     # get time of running the api endpoint
     dt_string = return_time_now()
+    run_stats = RunStats(connection_mode=connection_mode)
+    session = get_session(connection_mode, concurrent_threads)
+    tracker = ConcurrencyTracker()
 
     # execute concurrent requests
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=concurrent_threads) as executor:
         futures = [
             executor.submit(
-                manifest_to_send_func, url, params, headers, file_path_manifest
+                timed_call,
+                send_or_fail,
+                manifest_to_send_func,
+                url,
+                params,
+                headers,
+                file_path_manifest,
+                session,
+                timeout,
+                tracker=tracker,
             )
             for x in range(concurrent_threads)
         ]
-        all_status_code = {"200": 0, "500": 0, "503": 0, "504": 0}
         for f in concurrent.futures.as_completed(futures):
             try:
-                status_code = f.result().status_code
-                status_code_str = str(status_code)
-                if status_code_str != "200":
-                    logger.error(
-                        f"Encountered error {status_code_str} while running: {url} using params {params}"
-                    )
-                all_status_code[status_code_str] = all_status_code[status_code_str] + 1
+                result, elapsed_ns = f.result()
+                record_result(run_stats, result, elapsed_ns, url, params)
             except InvalidSchema:
                 raise InvalidSchema(
                     f"No connection adapters were found for {url}. Please make sure that your URL is correct. "
                 )
 
-    time_diff = round(time.time() - start_time, 2)
-    logger.info(f"duration time of running {url}: {time_diff}")
-    return dt_string, time_diff, all_status_code
+    run_stats.wall_time_ns = time.perf_counter_ns() - start_time
+    run_stats.achieved_concurrency = tracker.peak
+    time_diff = round(run_stats.wall_time_ns / NS_PER_S, 2)
+    logger.info(
+        f"duration time of running {url}: {time_diff}, per request latency (ms): {run_stats.latency.summary()}, "
+        f"p50/p95/p99 of every phase (ms): {run_stats.phase_summary()}, outcomes: {run_stats.outcomes}"
+    )
+    return dt_string, time_diff, run_stats.status_code_dict(), run_stats
 
 
 def save_run_time_result(
@@ -305,6 +1021,7 @@ def save_run_time_result(
     restrict_rules: bool = None,
     manifest_record_type: str = None,
     asset_view: str = None,
+    run_stats: RunStats = None,
 ) -> Row:
     """
     Record the result of running an endpoint as a dataframe
@@ -322,12 +1039,23 @@ def save_run_time_result(
         restrict_rules (bool, optional): default to None. if restrict_rules parameter gets set to true
         manifest_record_type (str, optional): default to None. Manifest storage type. Four options: file only, file+entities, table+file, table+file+entities
         asset view (str, optional): default to None. asset view of the asset store.
+        run_stats (RunStats, optional): default to None. statistics of the run. If provided, the RUN_STATS_COLUMNS get added to the row:
+            min_ms, mean_ms, p50_ms, p90_ms, p95_ms, p99_ms and max_ms: latency of the requests, in milliseconds
+            throughput: requests per second
+            connection_mode: "cold" or "warm"
+            achieved_concurrency: highest number of requests in flight at the same time
+            arrival_rate: requests scheduled per second, in open-loop runs
+            service_time: summary of the service time, in open-loop runs
+            phases: p50, p95 and p99 of every request phase (dns, connect, tls, ttfb, body)
+            transfer: summary of the response sizes and transfer rates (MB/s)
+            outcomes: count of every outcome (any status code, timeout, connection_error, tls_error)
+            failure_time: summary of the time to failure of failed requests
     """
     # get specific number of status code
-    num_status_200 = status_code_dict["200"]
-    num_status_500 = status_code_dict["500"]
-    num_status_504 = status_code_dict["504"]
-    num_status_503 = status_code_dict["503"]
+    num_status_200 = status_code_dict.get("200", 0)
+    num_status_500 = status_code_dict.get("500", 0)
+    num_status_504 = status_code_dict.get("504", 0)
+    num_status_503 = status_code_dict.get("503", 0)
 
     new_row = [
         endpoint_name,
@@ -348,9 +1076,59 @@ def save_run_time_result(
         num_status_503,
     ]
 
+    if run_stats:
+        latency_summary = run_stats.latency.summary()
+        new_row.extend(
+            [
+                latency_summary["min"],
+                latency_summary["mean"],
+                latency_summary["p50"],
+                latency_summary["p90"],
+                latency_summary["p95"],
+                latency_summary["p99"],
+                latency_summary["max"],
+                run_stats.throughput,
+                run_stats.connection_mode,
+                run_stats.achieved_concurrency,
+                run_stats.arrival_rate,
+                run_stats.service_time.summary() if run_stats.service_time else None,
+                run_stats.phase_summary(),
+                run_stats.transfer_summary(),
+                status_code_dict,
+                run_stats.failure_time.summary(),
+            ]
+        )
+
     return new_row
 
 
+def get_synapse_client(token: str = None) -> "synapseclient.Synapse":
+    """
+    Get a synapse client logged in with an access token.
+    Clients are logged in on first use and shared by all threads of a process afterwards, so that only the first caller pays for the login.
+    Worker processes (see process_engine.py) log in with their own client instead of reusing the connections of their parent.
+    The client is also set as the default client of synapseclient.models, used by asyncio code such as File.store_async.
+    Args:
+        token (str, optional): synapse access token. Defaults to StoreRuntime.get_access_token().
+    Returns:
+        synapseclient.Synapse: a logged in synapse client
+    """
+    # imported here, so that runs that do not touch synapse do not pay for importing the client
+    import synapseclient
+
+    token = token or StoreRuntime.get_access_token()
+    key = (token, os.getpid())
+    with _synapse_clients_lock:
+        syn = _synapse_clients.get(key)
+        if syn is None:
+            # skip the version check and the profile lookup, two round trips that are not needed to use the token
+            syn = synapseclient.Synapse(skip_checks=True)
+            syn.login(authToken=token, silent=True)
+            logger.debug("Logged in to synapse")
+            _synapse_clients[key] = syn
+        return syn
+
+
 class StoreRuntime:
     # store run time result
     @staticmethod
@@ -370,31 +1148,67 @@ class StoreRuntime:
 
         return token
 
-    def login_synapse(self) -> synapseclient.Synapse:
+    def login_synapse(self) -> "synapseclient.Synapse":
         """
-        Login to synapse using the token provided
+        Login to synapse using the token provided. The client is shared with the rest of the process (see get_synapse_client).
         Returns:
             synapse object
         """
-        auth_token = self.get_access_token()
-        try:
-            syn = synapseclient.Synapse()
-            syn.login(authToken=auth_token)
-        except (
-            synapseclient.core.exceptions.SynapseNoCredentialsError,
-            synapseclient.core.exceptions.SynapseHTTPError,
-        ) as e:
-            raise e
-        return syn
+        return get_synapse_client(self.get_access_token())
 
     def record_run_time_result_synapse(self, rows: MultiRow) -> None:
+        """
+        Upload rows to the synapse result table. Every row is projected onto the columns of the table (see synapse_table_row),
+        so that the columns the table does not have yet are left out (see migrate_synapse_table).
+        Args:
+            rows (MultiRow): result rows
+        """
+        from synapseclient import Table
+
         # Load existing data from synapse
         syn = self.login_synapse()
 
         # get existing table from synapse
-        existing_table_schema = syn.get("syn51385540")
+        existing_table_schema = syn.get(SYNAPSE_RESULT_TABLE)
+        columns = [
+            column["name"] for column in syn.getTableColumns(existing_table_schema)
+        ]
 
         # add new row to table
-        syn.store(Table(existing_table_schema, rows))
+        syn.store(
+            Table(
+                existing_table_schema,
+                [synapse_table_row(row, columns) for row in rows],
+            )
+        )
 
         logger.info("Finish uploading result to synapse. ")
+
+    def migrate_synapse_table(self) -> List[str]:
+        """
+        Add the columns of SYNAPSE_EXTRA_COLUMN_TYPES that the synapse result table does not have yet
+        Returns:
+            List[str]: names of the added columns
+        """
+        from synapseclient import Column
+
+        syn = self.login_synapse()
+        schema = syn.get(SYNAPSE_RESULT_TABLE)
+        existing = {
+            column["name"]: column["columnType"]
+            for column in syn.getTableColumns(schema)
+        }
+        for name, column_type in SYNAPSE_EXTRA_COLUMN_TYPES.items():
+            if name in existing and existing[name] != column_type:
+                logger.error(
+                    f"Column {name} of {SYNAPSE_RESULT_TABLE} is a {existing[name]} column, rows need a {column_type} column. Please change its type on synapse."
+                )
+        missing = [name for name in SYNAPSE_EXTRA_COLUMN_TYPES if name not in existing]
+        for name in missing:
+            schema.addColumn(
+                Column(name=name, columnType=SYNAPSE_EXTRA_COLUMN_TYPES[name])
+            )
+        if missing:
+            syn.store(schema)
+            logger.info(f"Added columns {missing} to {SYNAPSE_RESULT_TABLE}")
+        return missing